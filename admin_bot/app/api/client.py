@@ -7,6 +7,7 @@ from urllib.parse import urlparse
 from remnawave_api import RemnawaveSDK
 from app.config.settings import settings
 from app.api.errors import APIError, handle_api_error
+from app.scheduler.metrics import count_api_call
 
 
 class RemnawaveClient:
@@ -56,6 +57,7 @@ class RemnawaveClient:
         **kwargs
     ) -> Dict[str, Any]:
         """Make an API request."""
+        count_api_call()
         try:
             response = await self.client.request(method, endpoint, **kwargs)
             response.raise_for_status()
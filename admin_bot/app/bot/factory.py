@@ -5,14 +5,24 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 
 from app.config.settings import settings
+from app.services.outbound import create_outbound_middleware
 
 
 def create_bot() -> Bot:
     """Create and configure Bot instance."""
-    return Bot(
+    bot = Bot(
         token=settings.admin_bot_token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    bot.session.middleware(create_outbound_middleware())
+    return bot
+
+
+def create_user_bot() -> Bot:
+    """Bot for sending to users through user_bot's token (no default parse mode)."""
+    bot = Bot(token=settings.user_bot_token.strip())
+    bot.session.middleware(create_outbound_middleware())
+    return bot
 
 
 def create_dp() -> Dispatcher:
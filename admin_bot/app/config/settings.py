@@ -22,6 +22,22 @@ class Settings(BaseSettings):
     # Token user_bot для рассылки (пользователи общаются с user_bot, не с админ-ботом)
     user_bot_token: str = Field("", validation_alias="USER_BOT_TOKEN")
 
+    # Broadcast delivery: global rate (Telegram allows ~30 msg/s per bot),
+    # parallel senders and RetryAfter requeue attempts per recipient.
+    broadcast_concurrency: int = Field(8, validation_alias="BROADCAST_CONCURRENCY")
+    broadcast_max_retries: int = Field(3, validation_alias="BROADCAST_MAX_RETRIES")
+    # Recipients per checkpoint of a persistent broadcast job.
+    broadcast_chunk_size: int = Field(200, validation_alias="BROADCAST_CHUNK_SIZE")
+    # Minimum delay between edits of the live progress message.
+    broadcast_progress_interval_seconds: float = Field(5.0, validation_alias="BROADCAST_PROGRESS_INTERVAL_SECONDS")
+    # Per-process limit of message-sending API calls per bot token; user_bot
+    # reads the same variables, flood-wait pauses are shared via the DB.
+    outbound_rate_per_second: float = Field(25.0, validation_alias="OUTBOUND_RATE_PER_SECOND")
+    outbound_max_retries: int = Field(2, validation_alias="OUTBOUND_MAX_RETRIES")
+    # Chats that blocked the bot are skipped by bulk senders until re-probed;
+    # the probe backoff (REACHABILITY_PROBE_BASE/MAX_DAYS) is read by user_bot's db_utils.
+    reachability_probe_batch: int = Field(200, validation_alias="REACHABILITY_PROBE_BATCH")
+
     # API Configuration
     remnawave_api_url: str = Field("https://api.remnawave.com", validation_alias="REMNAWAVE_BASE_URL")
     remnawave_api_key: str = Field(
@@ -30,6 +46,10 @@ class Settings(BaseSettings):
     )
     remnawave_timeout_seconds: int = Field(5, validation_alias="REMNAWAVE_TIMEOUT_SECONDS")
 
+    # Trial length granted on signup (same TRIAL_DAYS as user_bot); used to
+    # tell trial users from paying ones in broadcast segments.
+    trial_days: int = Field(30, validation_alias="TRIAL_DAYS")
+
     # Database
     user_bot_db_path: str = ""
 
@@ -41,6 +61,14 @@ class Settings(BaseSettings):
 
     # Monitoring
     monitor_interval_minutes: int = 5
+    # Offset between first runs of interval monitors and random per-run delay.
+    scheduler_stagger_seconds: int = Field(60, validation_alias="SCHEDULER_STAGGER_SECONDS")
+    scheduler_jitter_seconds: int = Field(15, validation_alias="SCHEDULER_JITTER_SECONDS")
+    scheduler_misfire_grace_seconds: int = Field(60, validation_alias="SCHEDULER_MISFIRE_GRACE_SECONDS")
+    # Sliced reconciliation: LTE and subscription monitors handle 1/K of users
+    # per tick; users whose subscription ended recently are handled every tick.
+    reconcile_slices: int = Field(1, validation_alias="RECONCILE_SLICES")
+    reconcile_priority_window_minutes: int = Field(60, validation_alias="RECONCILE_PRIORITY_WINDOW_MINUTES")
     node_ram_max_percent: int = 70
     internal_squad_max_users: int = 30
     internal_squad_prefix: str = "internal"
@@ -53,6 +81,15 @@ class Settings(BaseSettings):
         default_factory=lambda: ["LTE"],
         validation_alias="LTE_LIMITED_NODE_NAME_KEYWORDS",
     )
+    # Adaptive LTE polling: users far from their limit are re-checked rarely,
+    # near-limit users on every monitor tick.
+    lte_adaptive_polling_enabled: bool = Field(True, validation_alias="LTE_ADAPTIVE_POLLING_ENABLED")
+    lte_poll_max_interval_minutes: int = Field(360, validation_alias="LTE_POLL_MAX_INTERVAL_MINUTES")
+    lte_poll_safety_factor: float = Field(0.5, validation_alias="LTE_POLL_SAFETY_FACTOR")
+    # LTE usage source: "per_user" (one request per user), "per_node" (one
+    # request per LTE node) or "auto" (per_node, falling back to per_user).
+    lte_usage_ingestion: str = Field("per_user", validation_alias="LTE_USAGE_INGESTION")
+    lte_usage_daily_retention_days: int = Field(90, validation_alias="LTE_USAGE_DAILY_RETENTION_DAYS")
 
     # Free squad / infinite-expire model. When a user's subscription ends locally
     # we strip paid squads, demote them to FREE_SQUAD_NAME (limited servers) and
@@ -104,6 +141,14 @@ class Settings(BaseSettings):
             return value.strip()
         return "LTE"
 
+    @field_validator("lte_usage_ingestion", mode="before")
+    @classmethod
+    def normalize_lte_usage_ingestion(cls, value):
+        """Lower-case ingestion mode; unknown values fall back to per_user."""
+        if isinstance(value, str) and value.strip().lower() in ("per_user", "per_node", "auto"):
+            return value.strip().lower()
+        return "per_user"
+
     @field_validator("free_squad_name", mode="before")
     @classmethod
     def normalize_free_squad_name(cls, value):
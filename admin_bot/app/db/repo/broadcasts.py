@@ -0,0 +1,155 @@
+"""Persistence for broadcast jobs and per-recipient deliveries."""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Optional
+
+from app.db.sqlite import db
+
+JOB_RUNNING = "running"
+JOB_PAUSED = "paused"
+JOB_CANCELLED = "cancelled"
+JOB_DONE = "done"
+ACTIVE_JOB_STATUSES = (JOB_RUNNING, JOB_PAUSED)
+
+DELIVERY_PENDING = "pending"
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+
+
+class BroadcastJobsRepository:
+    """Repository for `broadcast_jobs` / `broadcast_deliveries`."""
+
+    async def create(self, kind: str, payload: dict, tg_ids: list[int], created_by: int) -> int:
+        """Create a running job with one pending delivery per unique recipient."""
+        now = int(time.time())
+        unique_ids = list(dict.fromkeys(int(tg_id) for tg_id in tg_ids))
+        cursor = await db.execute(
+            """
+            INSERT INTO broadcast_jobs (kind, payload, status, total, created_by, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (kind, json.dumps(payload, ensure_ascii=False), JOB_RUNNING, len(unique_ids), created_by, now, now),
+        )
+        job_id = int(cursor.lastrowid)
+        await db.execute_many(
+            "INSERT OR IGNORE INTO broadcast_deliveries (job_id, tg_id, status, updated_at) VALUES (?, ?, ?, ?)",
+            [(job_id, tg_id, DELIVERY_PENDING, now) for tg_id in unique_ids],
+        )
+        await db.commit()
+        return job_id
+
+    async def get(self, job_id: int) -> Optional[dict]:
+        row = await db.fetch_one("SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,))
+        if not row:
+            return None
+        job = dict(row)
+        try:
+            job["payload"] = json.loads(job.get("payload") or "{}")
+        except ValueError:
+            job["payload"] = {}
+        return job
+
+    async def list_recent(self, limit: int = 10) -> list[dict]:
+        rows = await db.fetch_all(
+            "SELECT id, kind, status, total, sent, failed, created_at FROM broadcast_jobs ORDER BY id DESC LIMIT ?",
+            (limit,),
+        )
+        return [dict(row) for row in rows]
+
+    async def list_by_status(self, status: str) -> list[int]:
+        rows = await db.fetch_all("SELECT id FROM broadcast_jobs WHERE status = ?", (status,))
+        return [int(row["id"]) for row in rows]
+
+    async def set_status(self, job_id: int, status: str, *, only_from: tuple[str, ...] = ()) -> bool:
+        """Change job status; with `only_from`, only if the current status is one of them."""
+        now = int(time.time())
+        finished_at = now if status in (JOB_CANCELLED, JOB_DONE) else 0
+        query = "UPDATE broadcast_jobs SET status = ?, updated_at = ?, finished_at = ? WHERE id = ?"
+        params: tuple = (status, now, finished_at, job_id)
+        if only_from:
+            query += f" AND status IN ({', '.join('?' for _ in only_from)})"
+            params += tuple(only_from)
+        cursor = await db.execute(query, params)
+        await db.commit()
+        return (cursor.rowcount or 0) > 0
+
+    async def set_media_file_id(self, job_id: int, file_id: str) -> None:
+        await db.execute(
+            "UPDATE broadcast_jobs SET media_file_id = ?, updated_at = ? WHERE id = ?",
+            (file_id, int(time.time()), job_id),
+        )
+        await db.commit()
+
+    async def set_progress_message(self, job_id: int, chat_id: int, message_id: int) -> None:
+        """Remember the admin message that shows live progress of the job."""
+        await db.execute(
+            "UPDATE broadcast_jobs SET progress_chat_id = ?, progress_message_id = ?, updated_at = ? WHERE id = ?",
+            (chat_id, message_id, int(time.time()), job_id),
+        )
+        await db.commit()
+
+    async def failure_reasons(self, job_id: int, limit: int = 10) -> list[tuple[str, int]]:
+        """Failed deliveries grouped by reason, most frequent first."""
+        rows = await db.fetch_all(
+            """
+            SELECT error, COUNT(*) AS cnt FROM broadcast_deliveries
+            WHERE job_id = ? AND status = ?
+            GROUP BY error
+            ORDER BY cnt DESC
+            LIMIT ?
+            """,
+            (job_id, DELIVERY_FAILED, limit),
+        )
+        return [(str(row["error"] or "неизвестно"), int(row["cnt"])) for row in rows]
+
+    async def pending_chunk(self, job_id: int, limit: int) -> list[int]:
+        rows = await db.fetch_all(
+            """
+            SELECT tg_id FROM broadcast_deliveries
+            WHERE job_id = ? AND status = ?
+            ORDER BY tg_id
+            LIMIT ?
+            """,
+            (job_id, DELIVERY_PENDING, limit),
+        )
+        return [int(row["tg_id"]) for row in rows]
+
+    async def checkpoint(
+        self,
+        job_id: int,
+        sent_ids: list[int],
+        failures: list[tuple[int, str]],
+        running_seconds: float = 0.0,
+    ) -> None:
+        """
+        Persist results of a processed chunk and refresh job counters in one
+        transaction. `running_seconds` (time spent sending the chunk) adds up
+        to the job's running time, which leaves out pauses.
+        """
+        now = int(time.time())
+        if sent_ids:
+            await db.execute_many(
+                "UPDATE broadcast_deliveries SET status = ?, error = '', updated_at = ? WHERE job_id = ? AND tg_id = ?",
+                [(DELIVERY_SENT, now, job_id, tg_id) for tg_id in sent_ids],
+            )
+        if failures:
+            await db.execute_many(
+                "UPDATE broadcast_deliveries SET status = ?, error = ?, updated_at = ? WHERE job_id = ? AND tg_id = ?",
+                [(DELIVERY_FAILED, reason[:200], now, job_id, tg_id) for tg_id, reason in failures],
+            )
+        await db.execute(
+            """
+            UPDATE broadcast_jobs
+            SET sent = sent + ?, failed = failed + ?,
+                running_seconds = running_seconds + ?, updated_at = ?
+            WHERE id = ?
+            """,
+            (len(sent_ids), len(failures), max(0.0, running_seconds), now, job_id),
+        )
+        await db.commit()
+
+
+broadcast_jobs_repo = BroadcastJobsRepository()
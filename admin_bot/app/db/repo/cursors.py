@@ -0,0 +1,32 @@
+"""Persistence for named scheduler job cursors."""
+
+from __future__ import annotations
+
+from app.db.sqlite import db
+
+
+class MonitorCursorsRepository:
+    """Key/value store for job progress markers."""
+
+    async def get(self, name: str, default: str = "") -> str:
+        row = await db.fetch_one(
+            "SELECT value FROM monitor_cursors WHERE name = ?",
+            (name,),
+        )
+        return str(row["value"]) if row else default
+
+    async def set(self, name: str, value: str) -> None:
+        await db.execute(
+            """
+            INSERT INTO monitor_cursors (name, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(name) DO UPDATE SET
+                value = excluded.value,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (name, str(value)),
+        )
+        await db.commit()
+
+
+cursors_repo = MonitorCursorsRepository()
@@ -0,0 +1,75 @@
+"""Persistence for scheduler job run metrics."""
+
+from __future__ import annotations
+
+from app.db.sqlite import db
+
+
+class JobRunsRepository:
+    """Repository for `job_runs` (one row per run or skipped run)."""
+
+    async def add(
+        self,
+        job_id: str,
+        started_at: int,
+        duration_ms: int,
+        status: str,
+        items: int = 0,
+        api_calls: int = 0,
+        error: str = "",
+    ) -> None:
+        await db.execute(
+            """
+            INSERT INTO job_runs (job_id, started_at, duration_ms, status, items, api_calls, error)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                job_id,
+                int(started_at),
+                max(0, int(duration_ms)),
+                status,
+                max(0, int(items)),
+                max(0, int(api_calls)),
+                (error or "")[:500],
+            ),
+        )
+        await db.commit()
+
+    async def summary_since(self, since_ts: int) -> list[dict]:
+        """Per-job aggregates since `since_ts`, plus the latest run of each job."""
+        rows = await db.fetch_all(
+            """
+            SELECT
+                job_id,
+                COUNT(*) AS runs,
+                SUM(CASE WHEN status = 'ok' THEN 1 ELSE 0 END) AS ok_runs,
+                SUM(CASE WHEN status = 'error' THEN 1 ELSE 0 END) AS error_runs,
+                SUM(CASE WHEN status IN ('skipped', 'missed') THEN 1 ELSE 0 END) AS skipped_runs,
+                AVG(CASE WHEN status IN ('ok', 'error') THEN duration_ms END) AS avg_ms,
+                MAX(duration_ms) AS max_ms,
+                SUM(items) AS items,
+                SUM(api_calls) AS api_calls,
+                MAX(started_at) AS last_started_at
+            FROM job_runs
+            WHERE started_at >= ?
+            GROUP BY job_id
+            ORDER BY job_id
+            """,
+            (int(since_ts),),
+        )
+        return [dict(row) for row in rows]
+
+    async def latest(self, job_id: str) -> dict | None:
+        row = await db.fetch_one(
+            "SELECT * FROM job_runs WHERE job_id = ? ORDER BY started_at DESC, id DESC LIMIT 1",
+            (job_id,),
+        )
+        return dict(row) if row else None
+
+    async def prune_before(self, ts: int) -> int:
+        cursor = await db.execute("DELETE FROM job_runs WHERE started_at < ?", (int(ts),))
+        await db.commit()
+        return cursor.rowcount or 0
+
+
+job_runs_repo = JobRunsRepository()
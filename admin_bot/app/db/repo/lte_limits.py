@@ -17,6 +17,32 @@ class LTETrafficLimitsRepository:
         )
         return dict(row) if row else None
 
+    async def blocked_with_balance(self) -> set[int]:
+        """Blocked users that have paid GB left, i.e. bought traffic since the block."""
+        rows = await db.fetch_all(
+            "SELECT tg_id FROM lte_traffic_limits "
+            "WHERE COALESCE(is_blocked, 0) = 1 AND COALESCE(paid_balance_bytes, 0) > 0",
+        )
+        return {int(row["tg_id"]) for row in rows}
+
+    async def due_for_check(self, now: int, period_seconds: int) -> set[int]:
+        """
+        Users that must not wait for their slice: unblocked users whose planned
+        check is due (near-limit users are planned for the next tick) and
+        users whose 30-day cycle has rolled over.
+        """
+        rows = await db.fetch_all(
+            """
+            SELECT tg_id FROM lte_traffic_limits
+            WHERE (COALESCE(is_blocked, 0) = 0
+                   AND COALESCE(last_checked_ts, 0) > 0
+                   AND COALESCE(next_check_ts, 0) <= ?)
+               OR COALESCE(cycle_start_ts, 0) + ? <= ?
+            """,
+            (now, period_seconds, now),
+        )
+        return {int(row["tg_id"]) for row in rows}
+
     async def create_if_missing(self, tg_id: int, cycle_start_ts: int) -> dict:
         await db.execute(
             """
@@ -45,13 +71,18 @@ class LTETrafficLimitsRepository:
         is_blocked: bool,
         last_total_usage_bytes: int,
         last_remaining_bytes: int,
+        last_checked_ts: int = 0,
+        burn_rate_bps: float = 0.0,
+        next_check_ts: int = 0,
+        usage_closed_through: str = "",
     ) -> None:
         await db.execute(
             """
             INSERT INTO lte_traffic_limits (
                 tg_id, cycle_start_ts, paid_balance_bytes, cycle_paid_spent_bytes, is_blocked,
-                last_total_usage_bytes, last_remaining_bytes, updated_at
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                last_total_usage_bytes, last_remaining_bytes,
+                last_checked_ts, burn_rate_bps, next_check_ts, usage_closed_through, updated_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
             ON CONFLICT(tg_id) DO UPDATE SET
                 cycle_start_ts = excluded.cycle_start_ts,
                 paid_balance_bytes = excluded.paid_balance_bytes,
@@ -59,6 +90,10 @@ class LTETrafficLimitsRepository:
                 is_blocked = excluded.is_blocked,
                 last_total_usage_bytes = excluded.last_total_usage_bytes,
                 last_remaining_bytes = excluded.last_remaining_bytes,
+                last_checked_ts = excluded.last_checked_ts,
+                burn_rate_bps = excluded.burn_rate_bps,
+                next_check_ts = excluded.next_check_ts,
+                usage_closed_through = excluded.usage_closed_through,
                 updated_at = CURRENT_TIMESTAMP
             """,
             (
@@ -69,6 +104,10 @@ class LTETrafficLimitsRepository:
                 1 if is_blocked else 0,
                 max(0, int(last_total_usage_bytes)),
                 max(0, int(last_remaining_bytes)),
+                max(0, int(last_checked_ts)),
+                max(0.0, float(burn_rate_bps)),
+                max(0, int(next_check_ts)),
+                str(usage_closed_through or ""),
             ),
         )
         await db.commit()
@@ -0,0 +1,92 @@
+"""Persistence for the per-day LTE usage rollup."""
+
+from __future__ import annotations
+
+from app.db.sqlite import db
+
+
+class LTEUsageDailyRepository:
+    """Repository for `lte_usage_daily` (tg_id, day, node_uuid) -> bytes."""
+
+    async def replace_days(
+        self,
+        tg_id: int,
+        start_day: str,
+        end_day: str,
+        buckets: dict[tuple[str, str], int],
+    ) -> None:
+        """Replace all rows of a user in [start_day, end_day] with `buckets`."""
+        await db.execute(
+            "DELETE FROM lte_usage_daily WHERE tg_id = ? AND day >= ? AND day <= ?",
+            (tg_id, start_day, end_day),
+        )
+        rows = [
+            (tg_id, day, node_uuid, max(0, int(value)))
+            for (day, node_uuid), value in buckets.items()
+            if start_day <= day <= end_day
+        ]
+        if rows:
+            await db.execute_many(
+                """
+                INSERT INTO lte_usage_daily (tg_id, day, node_uuid, bytes, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                rows,
+            )
+        await db.commit()
+
+    async def replace_days_all_users(
+        self,
+        start_day: str,
+        end_day: str,
+        rows: list[tuple[int, str, str, int]],
+    ) -> None:
+        """Replace every user's rows in [start_day, end_day] with `rows`."""
+        await db.execute(
+            "DELETE FROM lte_usage_daily WHERE day >= ? AND day <= ?",
+            (start_day, end_day),
+        )
+        if rows:
+            await db.execute_many(
+                """
+                INSERT INTO lte_usage_daily (tg_id, day, node_uuid, bytes, updated_at)
+                VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+                """,
+                rows,
+            )
+        await db.commit()
+
+    async def daily_totals_since(self, start_day: str) -> dict[int, list[tuple[str, int]]]:
+        """Return {tg_id: [(day, bytes), ...]} for all users since `start_day`."""
+        rows = await db.fetch_all(
+            """
+            SELECT tg_id, day, SUM(bytes) AS total
+            FROM lte_usage_daily
+            WHERE day >= ?
+            GROUP BY tg_id, day
+            """,
+            (start_day,),
+        )
+        totals: dict[int, list[tuple[str, int]]] = {}
+        for row in rows:
+            totals.setdefault(int(row["tg_id"]), []).append((str(row["day"]), int(row["total"] or 0)))
+        return totals
+
+    async def sum_window(self, tg_id: int, start_day: str, end_day: str) -> int:
+        row = await db.fetch_one(
+            """
+            SELECT COALESCE(SUM(bytes), 0) AS total
+            FROM lte_usage_daily
+            WHERE tg_id = ? AND day >= ? AND day <= ?
+            """,
+            (tg_id, start_day, end_day),
+        )
+        return int(row["total"] or 0) if row else 0
+
+    async def prune_before(self, day: str) -> int:
+        cursor = await db.execute("DELETE FROM lte_usage_daily WHERE day < ?", (day,))
+        await db.commit()
+        return cursor.rowcount or 0
+
+
+lte_usage_repo = LTEUsageDailyRepository()
@@ -0,0 +1,52 @@
+"""Gateway state shared by every process sending through a bot token."""
+
+from __future__ import annotations
+
+import time
+
+from app.db.sqlite import db
+
+
+class OutboundPausesRepository:
+    """Repository for `outbound_pauses` and `outbound_peers` (also written by user_bot)."""
+
+    async def sync(self, bot_id: int, peer: str, now: float, active_since: float) -> tuple[float, int]:
+        """Heartbeat `peer`; return (paused_until, number of active peers)."""
+        await db.execute(
+            """
+            INSERT INTO outbound_peers (bot_id, peer, seen_at) VALUES (?, ?, ?)
+            ON CONFLICT(bot_id, peer) DO UPDATE SET seen_at = excluded.seen_at
+            """,
+            (bot_id, peer, now),
+        )
+        await db.execute(
+            "DELETE FROM outbound_peers WHERE bot_id = ? AND seen_at < ?",
+            (bot_id, active_since),
+        )
+        await db.commit()
+        peers = await db.fetch_one(
+            "SELECT COUNT(*) AS n FROM outbound_peers WHERE bot_id = ?",
+            (bot_id,),
+        )
+        row = await db.fetch_one(
+            "SELECT paused_until FROM outbound_pauses WHERE bot_id = ?",
+            (bot_id,),
+        )
+        paused_until = float(row["paused_until"] or 0) if row else 0.0
+        return paused_until, int(peers["n"] if peers else 0)
+
+    async def set(self, bot_id: int, paused_until: float) -> None:
+        await db.execute(
+            """
+            INSERT INTO outbound_pauses (bot_id, paused_until, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(bot_id) DO UPDATE SET
+                paused_until = MAX(paused_until, excluded.paused_until),
+                updated_at = excluded.updated_at
+            """,
+            (bot_id, paused_until, int(time.time())),
+        )
+        await db.commit()
+
+
+outbound_pauses_repo = OutboundPausesRepository()
@@ -0,0 +1,50 @@
+"""Persistence for chats that can no longer receive messages."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Iterable
+
+from app.db.sqlite import db
+from app.services.user_bot import db_utils
+
+
+class ReachabilityRepository:
+    """
+    `unreachable_chats` holds one row per chat that blocked the bot or was
+    deleted. Bulk senders skip a chat until `next_probe_at`; the delay doubles
+    with every failed probe. A successful delivery removes the row.
+    """
+
+    async def mark_unreachable(self, failures: Iterable[tuple[int, str]], now: int | None = None) -> None:
+        # Same backoff as user_bot's own sends: one implementation in db_utils.
+        await asyncio.to_thread(db_utils.mark_chats_unreachable, list(failures), now)
+
+    async def mark_reachable(self, tg_ids: Iterable[int]) -> None:
+        params = [(int(tg_id),) for tg_id in tg_ids]
+        if not params:
+            return
+        await db.execute_many("DELETE FROM unreachable_chats WHERE tg_id = ?", params)
+        await db.commit()
+
+    async def due_for_probe(self, now: int, limit: int) -> list[int]:
+        rows = await db.fetch_all(
+            """
+            SELECT tg_id FROM unreachable_chats
+            WHERE next_probe_at <= ?
+            ORDER BY next_probe_at
+            LIMIT ?
+            """,
+            (int(now), max(1, int(limit))),
+        )
+        return [int(row["tg_id"]) for row in rows]
+
+    async def count_skipped(self, now: int) -> int:
+        row = await db.fetch_one(
+            "SELECT COUNT(*) AS cnt FROM unreachable_chats WHERE next_probe_at > ?",
+            (int(now),),
+        )
+        return int(row["cnt"] or 0) if row else 0
+
+
+reachability_repo = ReachabilityRepository()
@@ -0,0 +1,40 @@
+"""Read access to the daily revenue rollups kept by user_bot."""
+
+from __future__ import annotations
+
+from app.db.sqlite import db
+
+
+class RevenueRepository:
+    """Repository for `revenue_daily` (one row per Moscow day and purchase type)."""
+
+    async def totals_since(self, since_day: str) -> list[dict]:
+        """Per purchase type totals for days >= `since_day` (YYYY-MM-DD)."""
+        rows = await db.fetch_all(
+            """
+            SELECT purchase_type, SUM(payments) AS payments, SUM(amount_kopecks) AS amount_kopecks
+            FROM revenue_daily
+            WHERE day >= ?
+            GROUP BY purchase_type
+            ORDER BY purchase_type
+            """,
+            (since_day,),
+        )
+        return [dict(row) for row in rows]
+
+    async def daily_since(self, since_day: str) -> list[dict]:
+        """Per-day totals over all purchase types, newest first."""
+        rows = await db.fetch_all(
+            """
+            SELECT day, SUM(payments) AS payments, SUM(amount_kopecks) AS amount_kopecks
+            FROM revenue_daily
+            WHERE day >= ?
+            GROUP BY day
+            ORDER BY day DESC
+            """,
+            (since_day,),
+        )
+        return [dict(row) for row in rows]
+
+
+revenue_repo = RevenueRepository()
@@ -76,6 +76,10 @@ class Database:
                 is_blocked INTEGER NOT NULL DEFAULT 0,
                 last_total_usage_bytes INTEGER NOT NULL DEFAULT 0,
                 last_remaining_bytes INTEGER NOT NULL DEFAULT 0,
+                last_checked_ts INTEGER NOT NULL DEFAULT 0,
+                burn_rate_bps REAL NOT NULL DEFAULT 0,
+                next_check_ts INTEGER NOT NULL DEFAULT 0,
+                usage_closed_through TEXT NOT NULL DEFAULT '',
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
@@ -89,6 +93,169 @@ class Database:
             await self.execute(
                 "ALTER TABLE lte_traffic_limits ADD COLUMN last_remaining_bytes INTEGER NOT NULL DEFAULT 0"
             )
+        if "last_checked_ts" not in existing:
+            await self.execute(
+                "ALTER TABLE lte_traffic_limits ADD COLUMN last_checked_ts INTEGER NOT NULL DEFAULT 0"
+            )
+        if "burn_rate_bps" not in existing:
+            await self.execute(
+                "ALTER TABLE lte_traffic_limits ADD COLUMN burn_rate_bps REAL NOT NULL DEFAULT 0"
+            )
+        if "next_check_ts" not in existing:
+            await self.execute(
+                "ALTER TABLE lte_traffic_limits ADD COLUMN next_check_ts INTEGER NOT NULL DEFAULT 0"
+            )
+        if "usage_closed_through" not in existing:
+            await self.execute(
+                "ALTER TABLE lte_traffic_limits ADD COLUMN usage_closed_through TEXT NOT NULL DEFAULT ''"
+            )
+        # Per-day LTE usage rollup. Closed (past) days are written once; only
+        # the current day is refetched on each monitor tick.
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS lte_usage_daily (
+                tg_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                node_uuid TEXT NOT NULL DEFAULT '',
+                bytes INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        await self.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_lte_usage_daily_key "
+            "ON lte_usage_daily(tg_id, day, node_uuid)"
+        )
+        await self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_lte_usage_daily_day ON lte_usage_daily(day)"
+        )
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS job_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL,
+                started_at INTEGER NOT NULL,
+                duration_ms INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                items INTEGER NOT NULL DEFAULT 0,
+                api_calls INTEGER NOT NULL DEFAULT 0,
+                error TEXT NOT NULL DEFAULT ''
+            )
+        """)
+        await self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_job_runs_job_started ON job_runs(job_id, started_at)"
+        )
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL DEFAULT '{}',
+                status TEXT NOT NULL DEFAULT 'running',
+                total INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                media_file_id TEXT NOT NULL DEFAULT '',
+                created_by INTEGER NOT NULL DEFAULT 0,
+                progress_chat_id INTEGER NOT NULL DEFAULT 0,
+                progress_message_id INTEGER NOT NULL DEFAULT 0,
+                created_at INTEGER NOT NULL DEFAULT 0,
+                updated_at INTEGER NOT NULL DEFAULT 0,
+                finished_at INTEGER NOT NULL DEFAULT 0,
+                running_seconds REAL NOT NULL DEFAULT 0
+            )
+        """)
+        columns = await self.fetch_all("PRAGMA table_info(broadcast_jobs)")
+        existing = {str(col["name"]) for col in columns}
+        if "progress_chat_id" not in existing:
+            await self.execute(
+                "ALTER TABLE broadcast_jobs ADD COLUMN progress_chat_id INTEGER NOT NULL DEFAULT 0"
+            )
+        if "progress_message_id" not in existing:
+            await self.execute(
+                "ALTER TABLE broadcast_jobs ADD COLUMN progress_message_id INTEGER NOT NULL DEFAULT 0"
+            )
+        if "running_seconds" not in existing:
+            await self.execute(
+                "ALTER TABLE broadcast_jobs ADD COLUMN running_seconds REAL NOT NULL DEFAULT 0"
+            )
+        await self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status)"
+        )
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_deliveries (
+                job_id INTEGER NOT NULL,
+                tg_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                error TEXT NOT NULL DEFAULT '',
+                updated_at INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, tg_id)
+            )
+        """)
+        await self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_broadcast_deliveries_job_status "
+            "ON broadcast_deliveries(job_id, status)"
+        )
+        # Chats that failed with "blocked"/"chat not found"; shared with user_bot.
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS unreachable_chats (
+                tg_id INTEGER PRIMARY KEY,
+                reason TEXT NOT NULL DEFAULT '',
+                failures INTEGER NOT NULL DEFAULT 0,
+                first_failed_at INTEGER NOT NULL DEFAULT 0,
+                last_failed_at INTEGER NOT NULL DEFAULT 0,
+                next_probe_at INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        await self.execute(
+            "CREATE INDEX IF NOT EXISTS idx_unreachable_chats_next_probe "
+            "ON unreachable_chats(next_probe_at)"
+        )
+        # Flood-wait pauses per bot token, shared with user_bot.
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS outbound_pauses (
+                bot_id INTEGER PRIMARY KEY,
+                paused_until REAL NOT NULL DEFAULT 0,
+                updated_at INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        # Processes currently sending through a bot token; they split its rate.
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS outbound_peers (
+                bot_id INTEGER NOT NULL,
+                peer TEXT NOT NULL,
+                seen_at REAL NOT NULL DEFAULT 0
+            )
+        """)
+        await self.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbound_peers_bot_peer "
+            "ON outbound_peers(bot_id, peer)"
+        )
+        # Named progress markers for scheduler jobs (e.g. last ingested day).
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS monitor_cursors (
+                name TEXT PRIMARY KEY,
+                value TEXT NOT NULL DEFAULT '',
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Daily revenue rollups (Moscow days) written by user_bot payment paths.
+        await self.execute("""
+            CREATE TABLE IF NOT EXISTS revenue_daily (
+                day TEXT NOT NULL,
+                purchase_type TEXT NOT NULL,
+                payments INTEGER NOT NULL DEFAULT 0,
+                amount_kopecks INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        await self.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_revenue_daily_key "
+            "ON revenue_daily(day, purchase_type)"
+        )
+        # Audience segment filters (broadcasts) on user_bot's table, if it exists yet.
+        if await self.fetch_one(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'subscription'"
+        ):
+            for column in ("telegram_id", "subscription_ends", "referred_people"):
+                await self.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_subscription_{column} ON subscription({column})"
+                )
         await self.commit()
 
 
@@ -1,27 +1,34 @@
 """Admin broadcast handlers."""
 
-import asyncio
-import io
 import logging
 from urllib.parse import urlparse
 
-from aiogram import Bot, Router, F
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.types.input_file import BufferedInputFile
 from aiogram.fsm.context import FSMContext
 
 from app.config.settings import settings
 from app.services.access import check_admin_access
-from app.services.subscription_db import get_all_telegram_ids
+from app.db.repo.broadcasts import (
+    ACTIVE_JOB_STATUSES,
+    JOB_CANCELLED,
+    JOB_PAUSED,
+    JOB_RUNNING,
+    broadcast_jobs_repo,
+)
+from app.services.broadcast_jobs import (
+    JOB_STATUS_TITLES,
+    broadcast_runner,
+    job_keyboard,
+    job_status_text,
+)
+from app.services.subscription_db import AUDIENCE_SEGMENTS, count_segment, get_segment_telegram_ids
 from app.states.admin import BroadcastState
 
 router = Router(name="admin_broadcast")
 logger = logging.getLogger(__name__)
 
-BATCH_SIZE = 25
-PAUSE_BETWEEN_BATCHES = 1.0  # seconds
-PAUSE_BETWEEN_MESSAGES = 0.05
-MAX_FAIL_REPORT = 10  # сколько ошибок показать админу в сообщении
 MAX_BROADCAST_BUTTONS = 6
 
 # Эти callback_data должны обрабатываться user_bot.
@@ -57,6 +64,15 @@ def _confirm_keyboard() -> InlineKeyboardMarkup:
     )
 
 
+def _segment_keyboard() -> InlineKeyboardMarkup:
+    rows = [
+        [InlineKeyboardButton(text=title, callback_data=f"admin:broadcast:segment:{key}")]
+        for key, title in AUDIENCE_SEGMENTS.items()
+    ]
+    rows.append([InlineKeyboardButton(text="◀️ В меню", callback_data="admin:menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
 def _buttons_prompt_text() -> str:
     menu_lines = "\n".join(
         [f"• {title} -> `{cb}`" for cb, title in ALLOWED_USER_BOT_MENU_CALLBACKS.items()]
@@ -122,18 +138,6 @@ def _parse_broadcast_buttons(raw_text: str) -> tuple[list[dict], str | None]:
     return buttons, None
 
 
-def _build_broadcast_reply_markup(buttons: list[dict] | None) -> InlineKeyboardMarkup | None:
-    if not buttons:
-        return None
-    rows: list[list[InlineKeyboardButton]] = []
-    for item in buttons:
-        if item.get("type") == "url":
-            rows.append([InlineKeyboardButton(text=item["text"], url=item["value"])])
-        else:
-            rows.append([InlineKeyboardButton(text=item["text"], callback_data=item["value"])])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
-
-
 @router.callback_query(F.data == "admin:broadcast")
 async def start_broadcast(callback: CallbackQuery, state: FSMContext):
     """Start broadcast flow."""
@@ -146,7 +150,12 @@ async def start_broadcast(callback: CallbackQuery, state: FSMContext):
     await callback.message.answer(
         "Отправьте сообщение для рассылки.\n"
         "Можно текст или фото/видео с подписью.",
-        reply_markup=_menu_keyboard(),
+        reply_markup=InlineKeyboardMarkup(
+            inline_keyboard=[
+                [InlineKeyboardButton(text="📋 Последние рассылки", callback_data="admin:broadcast:jobs")],
+                [InlineKeyboardButton(text="◀️ В меню", callback_data="admin:menu")],
+            ]
+        ),
     )
     await callback.answer()
 
@@ -201,13 +210,45 @@ async def capture_broadcast_buttons(message: Message, state: FSMContext):
         return
 
     await state.update_data(buttons=buttons)
-    await state.set_state(BroadcastState.confirm)
+    await state.set_state(BroadcastState.segment)
     if buttons:
         preview = "\n".join([f"• {b['text']} ({b['type']}: {b['value']})" for b in buttons])
-        text = f"Готово. Кнопки настроены:\n{preview}\n\nЗапустить рассылку?"
+        text = f"Готово. Кнопки настроены:\n{preview}\n\nВыберите аудиторию рассылки:"
     else:
-        text = "Готово. Рассылка будет без кнопок.\n\nЗапустить рассылку?"
-    await message.answer(text, reply_markup=_confirm_keyboard())
+        text = "Готово. Рассылка будет без кнопок.\n\nВыберите аудиторию рассылки:"
+    await message.answer(text, reply_markup=_segment_keyboard())
+
+
+@router.callback_query(BroadcastState.segment, F.data.startswith("admin:broadcast:segment:"))
+async def choose_broadcast_segment(callback: CallbackQuery, state: FSMContext):
+    """Pick the audience segment and show its size before confirmation."""
+    if not await check_admin_access(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен.", show_alert=True)
+        return
+
+    segment = callback.data.rsplit(":", 1)[-1]
+    if segment not in AUDIENCE_SEGMENTS:
+        await callback.answer("Неизвестный сегмент.", show_alert=True)
+        return
+
+    audience = await count_segment(segment)
+    if not audience:
+        await callback.message.answer(
+            f"❌ В сегменте «{AUDIENCE_SEGMENTS[segment]}» нет пользователей. Выберите другой:",
+            reply_markup=_segment_keyboard(),
+        )
+        await callback.answer()
+        return
+
+    await state.update_data(segment=segment)
+    await state.set_state(BroadcastState.confirm)
+    await callback.message.answer(
+        f"Аудитория: {AUDIENCE_SEGMENTS[segment]}\n"
+        f"Получателей: {audience}\n\n"
+        "Запустить рассылку?",
+        reply_markup=_confirm_keyboard(),
+    )
+    await callback.answer()
 
 
 @router.callback_query(F.data == "admin:broadcast:cancel")
@@ -218,151 +259,118 @@ async def cancel_broadcast(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-def _short_reason(exc: Exception) -> str:
-    """Краткое описание ошибки для отчёта админу."""
-    s = str(exc).strip()
-    if "blocked" in s.lower() or "deactivated" in s.lower():
-        return "заблокировал бота"
-    if "chat not found" in s.lower() or "user not found" in s.lower():
-        return "чат не найден"
-    if "bot can't initiate" in s.lower() or "have no rights" in s.lower():
-        return "пользователь не начинал диалог с ботом"
-    if len(s) > 60:
-        return s[:57] + "..."
-    return s or type(exc).__name__
+def _parse_job_id(data: str) -> int | None:
+    suffix = data.rsplit(":", 1)[-1]
+    return int(suffix) if suffix.isdigit() else None
 
 
-@router.callback_query(F.data == "admin:broadcast:send")
+@router.callback_query(BroadcastState.confirm, F.data == "admin:broadcast:send")
 async def send_broadcast(callback: CallbackQuery, state: FSMContext):
-    """Send broadcast to all telegram_id from DB. Uses user_bot token if set (пользователи общаются с user_bot)."""
+    """Create a persistent broadcast job for the chosen segment and start it in the background."""
     if not await check_admin_access(callback.from_user.id):
         await callback.answer("❌ Доступ запрещен.", show_alert=True)
         return
-    # Acknowledge callback immediately to avoid "query is too old" on long broadcasts.
-    await callback.answer("⏳ Запускаю рассылку...")
-
     data = await state.get_data()
+    # Leave the confirm state before any await, so a double click starts one job.
+    await state.clear()
     kind = data.get("kind")
-    ids = await get_all_telegram_ids()
+    if not kind:
+        await callback.answer("Рассылка не найдена, начните заново.", show_alert=True)
+        return
+    await callback.answer("⏳ Запускаю рассылку...")
+
+    segment = data.get("segment") or "all"
+    ids = await get_segment_telegram_ids(segment)
 
     if not ids:
-        await callback.message.answer("❌ В базе нет пользователей.", reply_markup=_menu_keyboard())
-        await state.clear()
+        await callback.message.answer("❌ В сегменте нет пользователей.", reply_markup=_menu_keyboard())
         return
 
+    # Users talk to user_bot, so broadcasts go through its token when set.
     use_user_bot = bool(settings.user_bot_token and settings.user_bot_token.strip())
-    admin_bot = callback.bot
-    if use_user_bot:
-        send_bot = Bot(token=settings.user_bot_token.strip())
-        try:
-            await _do_broadcast(callback, state, data, kind, ids, send_bot, admin_bot, from_user_bot=True)
-        finally:
-            await send_bot.session.close()
-    else:
+    if not use_user_bot:
         logger.warning(
             "USER_BOT_TOKEN не задан: рассылка идёт от админ-бота. "
             "Доставка только тем, кто начинал диалог с админ-ботом. Задайте USER_BOT_TOKEN в .env."
         )
-        await _do_broadcast(callback, state, data, kind, ids, admin_bot, admin_bot, from_user_bot=False)
-
-
-async def _do_broadcast(
-    callback: CallbackQuery,
-    state: FSMContext,
-    data: dict,
-    kind: str,
-    ids: list[int],
-    send_bot: Bot,
-    admin_bot: Bot,
-    *,
-    from_user_bot: bool,
-) -> None:
-    sent = 0
-    failed_list: list[tuple[int, str]] = []
-    reply_markup = _build_broadcast_reply_markup(data.get("buttons"))
-
-    photo_file: BufferedInputFile | None = None
-    video_file: BufferedInputFile | None = None
-    use_user_bot_for_media = send_bot is not admin_bot and kind in ("photo", "video")
-    if use_user_bot_for_media:
-        file_id = data.get("file_id")
-        if file_id:
-            try:
-                bio = await admin_bot.download(file_id)
-                if bio and isinstance(bio, io.BytesIO):
-                    bio.seek(0)
-                    inp = BufferedInputFile(bio.read(), filename="broadcast.jpg" if kind == "photo" else "broadcast.mp4")
-                    if kind == "photo":
-                        photo_file = inp
-                    else:
-                        video_file = inp
-            except Exception as e:
-                logger.exception("Не удалось скачать файл рассылки с админ-бота: %s", e)
-                await callback.message.answer(
-                    "❌ Не удалось подготовить медиа для рассылки (скачать файл).",
-                    reply_markup=_menu_keyboard(),
-                )
-                return
-
-    for start in range(0, len(ids), BATCH_SIZE):
-        batch = ids[start : start + BATCH_SIZE]
-        for tg_id in batch:
-            try:
-                if kind == "text":
-                    await send_bot.send_message(tg_id, data.get("text", ""), reply_markup=reply_markup)
-                elif kind == "photo":
-                    if photo_file is not None:
-                        await send_bot.send_photo(
-                            tg_id,
-                            photo_file,
-                            caption=data.get("caption"),
-                            reply_markup=reply_markup,
-                        )
-                    else:
-                        await send_bot.send_photo(
-                            tg_id,
-                            data.get("file_id"),
-                            caption=data.get("caption"),
-                            reply_markup=reply_markup,
-                        )
-                elif kind == "video":
-                    if video_file is not None:
-                        await send_bot.send_video(
-                            tg_id,
-                            video_file,
-                            caption=data.get("caption"),
-                            reply_markup=reply_markup,
-                        )
-                    else:
-                        await send_bot.send_video(
-                            tg_id,
-                            data.get("file_id"),
-                            caption=data.get("caption"),
-                            reply_markup=reply_markup,
-                        )
-                else:
-                    failed_list.append((tg_id, "неизвестный тип рассылки"))
-                    continue
-                sent += 1
-                await asyncio.sleep(PAUSE_BETWEEN_MESSAGES)
-            except Exception as e:
-                reason = _short_reason(e)
-                failed_list.append((tg_id, reason))
-                logger.warning("Рассылка tg_id=%s: %s", tg_id, e, exc_info=False)
-        await asyncio.sleep(PAUSE_BETWEEN_BATCHES)
-
-    failed = len(failed_list)
-    report_lines = [
-        f"✅ Рассылка завершена.",
-        f"Отправлено от: {'user_bot' if from_user_bot else 'админ-бот'}",
-        f"Доставлено: {sent}",
-        f"Ошибки: {failed}",
+    payload = {
+        "text": data.get("text", ""),
+        "file_id": data.get("file_id"),
+        "caption": data.get("caption"),
+        "buttons": data.get("buttons") or [],
+        "from_user_bot": use_user_bot,
+        "segment": segment,
+    }
+    job_id = await broadcast_jobs_repo.create(kind, payload, ids, created_by=callback.from_user.id)
+
+    # This message is edited with live progress while the job runs.
+    job = await broadcast_jobs_repo.get(job_id)
+    status_message = await callback.message.answer(job_status_text(job), reply_markup=job_keyboard(job))
+    await broadcast_jobs_repo.set_progress_message(job_id, status_message.chat.id, status_message.message_id)
+    broadcast_runner.start(job_id, callback.bot)
+
+
+@router.callback_query(F.data == "admin:broadcast:send")
+async def send_broadcast_stale(callback: CallbackQuery):
+    """The confirm button of a broadcast that was already started or cancelled."""
+    await callback.answer("Эта рассылка уже запущена или отменена.", show_alert=True)
+
+
+@router.callback_query(F.data == "admin:broadcast:jobs")
+async def list_broadcast_jobs(callback: CallbackQuery):
+    """Show recent broadcast jobs."""
+    if not await check_admin_access(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен.", show_alert=True)
+        return
+    jobs = await broadcast_jobs_repo.list_recent()
+    if not jobs:
+        await callback.message.answer("📭 Рассылок ещё не было.", reply_markup=_menu_keyboard())
+        await callback.answer()
+        return
+    rows = [
+        [
+            InlineKeyboardButton(
+                text=f"#{job['id']} {JOB_STATUS_TITLES.get(job['status'], job['status'])} "
+                f"({job['sent'] + job['failed']}/{job['total']})",
+                callback_data=f"admin:bcast:status:{job['id']}",
+            )
+        ]
+        for job in jobs
     ]
-    if failed_list:
-        for tg_id, reason in failed_list[:MAX_FAIL_REPORT]:
-            report_lines.append(f"  • {tg_id}: {reason}")
-        if failed > MAX_FAIL_REPORT:
-            report_lines.append(f"  … и ещё {failed - MAX_FAIL_REPORT} (см. лог)")
+    rows.append([InlineKeyboardButton(text="◀️ В меню", callback_data="admin:menu")])
+    await callback.message.answer("Последние рассылки:", reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+    await callback.answer()
 
-    await callback.message.answer("\n".join(report_lines), reply_markup=_menu_keyboard())
-    await state.clear()
+
+@router.callback_query(F.data.startswith("admin:bcast:"))
+async def manage_broadcast_job(callback: CallbackQuery):
+    """Status / pause / resume / cancel of a broadcast job."""
+    if not await check_admin_access(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен.", show_alert=True)
+        return
+    action = callback.data.split(":")[2]
+    job_id = _parse_job_id(callback.data)
+    job = await broadcast_jobs_repo.get(job_id) if job_id is not None else None
+    if not job:
+        await callback.answer("Рассылка не найдена.", show_alert=True)
+        return
+
+    notice = None
+    if action == "pause":
+        if await broadcast_jobs_repo.set_status(job_id, JOB_PAUSED, only_from=(JOB_RUNNING,)):
+            notice = "Пауза после текущей пачки сообщений."
+    elif action == "resume":
+        if await broadcast_jobs_repo.set_status(job_id, JOB_RUNNING, only_from=(JOB_PAUSED,)):
+            broadcast_runner.start(job_id, callback.bot)
+            notice = "Рассылка продолжена."
+    elif action == "stop":
+        if await broadcast_jobs_repo.set_status(job_id, JOB_CANCELLED, only_from=ACTIVE_JOB_STATUSES):
+            notice = "Рассылка отменена."
+
+    job = await broadcast_jobs_repo.get(job_id)
+    try:
+        await callback.message.edit_text(job_status_text(job), reply_markup=job_keyboard(job))
+    except TelegramBadRequest:
+        # "message is not modified" when nothing changed since the last refresh.
+        pass
+    await callback.answer(notice or "")
@@ -0,0 +1,72 @@
+"""Admin view of scheduler job run metrics."""
+
+import html
+import time
+from datetime import datetime, timezone
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+
+from app.db.repo.job_runs import job_runs_repo
+from app.services.access import check_admin_access
+
+router = Router(name="admin_jobs")
+
+SUMMARY_WINDOW_SECONDS = 24 * 3600
+
+
+def _jobs_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin:jobs")],
+            [InlineKeyboardButton(text="◀️ В меню", callback_data="admin:menu")],
+        ]
+    )
+
+
+def _format_ts(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime("%d.%m %H:%M UTC")
+
+
+async def _render_jobs_summary() -> str:
+    summary = await job_runs_repo.summary_since(int(time.time()) - SUMMARY_WINDOW_SECONDS)
+    if not summary:
+        return "⏱ Фоновые задачи: за последние 24 ч запусков нет."
+
+    lines = ["⏱ Фоновые задачи (24 ч):", ""]
+    for row in summary:
+        latest = await job_runs_repo.latest(row["job_id"]) or {}
+        avg_s = (row["avg_ms"] or 0) / 1000
+        max_s = (row["max_ms"] or 0) / 1000
+        lines.append(row["job_id"])
+        lines.append(
+            f"  запусков: {row['runs']} (ok {row['ok_runs']}, ошибок {row['error_runs']}, "
+            f"пропущено {row['skipped_runs']})"
+        )
+        lines.append(f"  длительность: ср. {avg_s:.1f} с, макс. {max_s:.1f} с")
+        lines.append(f"  объектов: {row['items'] or 0}, API-запросов: {row['api_calls'] or 0}")
+        if latest:
+            last_line = (
+                f"  последний: {_format_ts(latest['started_at'])}, {latest['status']}, "
+                f"{latest['duration_ms'] / 1000:.1f} с"
+            )
+            lines.append(last_line)
+            if latest.get("error"):
+                lines.append(f"  ошибка: {latest['error'][:200]}")
+        lines.append("")
+    return "\n".join(lines).rstrip()
+
+
+@router.callback_query(F.data == "admin:jobs")
+async def callback_jobs(callback: CallbackQuery):
+    """Show scheduler job run metrics."""
+    if not await check_admin_access(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен.", show_alert=True)
+        return
+
+    text = await _render_jobs_summary()
+    await callback.message.answer(
+        f"<pre>{html.escape(text)}</pre>",
+        reply_markup=_jobs_keyboard(),
+    )
+    await callback.answer()
@@ -0,0 +1,75 @@
+"""Admin revenue report built from daily rollups."""
+
+import html
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
+
+from app.db.repo.revenue import revenue_repo
+from app.services.access import check_admin_access
+
+router = Router(name="admin_revenue")
+
+MOSCOW_TZ = ZoneInfo("Europe/Moscow")
+PURCHASE_TYPE_TITLES = {
+    "subscription": "Подписки",
+    "gift": "Подарки",
+    "lte_gb": "LTE пакеты",
+}
+DAILY_ROWS = 7
+
+
+def _revenue_keyboard() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin:revenue")],
+            [InlineKeyboardButton(text="◀️ В меню", callback_data="admin:menu")],
+        ]
+    )
+
+
+def _rub(kopecks: int | None) -> str:
+    return f"{(kopecks or 0) / 100:,.0f} ₽".replace(",", " ")
+
+
+async def _render_period(title: str, since_day: str) -> list[str]:
+    totals = await revenue_repo.totals_since(since_day)
+    count = sum(int(row["payments"] or 0) for row in totals)
+    amount = sum(int(row["amount_kopecks"] or 0) for row in totals)
+    lines = [f"{title}: {_rub(amount)} ({count} оплат)"]
+    for row in totals:
+        name = PURCHASE_TYPE_TITLES.get(row["purchase_type"], row["purchase_type"])
+        lines.append(f"  {name}: {_rub(row['amount_kopecks'])} ({row['payments']})")
+    return lines
+
+
+async def _render_revenue() -> str:
+    today = datetime.now(MOSCOW_TZ).date()
+    lines = ["💰 Выручка (дни по МСК)", ""]
+    for title, days in (("Сегодня", 0), ("7 дней", 6), ("30 дней", 29)):
+        lines.extend(await _render_period(title, (today - timedelta(days=days)).isoformat()))
+        lines.append("")
+
+    daily = await revenue_repo.daily_since((today - timedelta(days=DAILY_ROWS - 1)).isoformat())
+    if daily:
+        lines.append("По дням:")
+        for row in daily:
+            lines.append(f"  {row['day']}: {_rub(row['amount_kopecks'])} ({row['payments']})")
+    return "\n".join(lines).rstrip()
+
+
+@router.callback_query(F.data == "admin:revenue")
+async def callback_revenue(callback: CallbackQuery):
+    """Show revenue totals from the daily rollups."""
+    if not await check_admin_access(callback.from_user.id):
+        await callback.answer("❌ Доступ запрещен.", show_alert=True)
+        return
+
+    text = await _render_revenue()
+    await callback.message.answer(
+        f"<pre>{html.escape(text)}</pre>",
+        reply_markup=_revenue_keyboard(),
+    )
+    await callback.answer()
@@ -1,7 +1,7 @@
 """Admin router aggregation."""
 
 from aiogram import Router
-from app.handlers.admin import menu, users, promo, broadcast, hosts_quick
+from app.handlers.admin import menu, users, promo, broadcast, hosts_quick, jobs, revenue
 
 # Import feature routers here as they are created
 # from app.features.admin.nodes import router as nodes_router
@@ -14,6 +14,8 @@ router.include_router(users.router)
 router.include_router(promo.router)
 router.include_router(broadcast.router)
 router.include_router(hosts_quick.router)
+router.include_router(jobs.router)
+router.include_router(revenue.router)
 
 # Include feature routers
 # router.include_router(nodes_router)
@@ -16,7 +16,9 @@ def get_admin_menu_keyboard() -> InlineKeyboardMarkup:
             [InlineKeyboardButton(text="📣 Рассылка", callback_data="admin:broadcast")],
             [InlineKeyboardButton(text="➕ Добавить хост", callback_data="admin:host_quick_add")],
             [InlineKeyboardButton(text="🗑️ Удалить хост", callback_data="admin:host_delete")],
-            [InlineKeyboardButton(text="📊 Статистика", callback_data="admin:stats")]
+            [InlineKeyboardButton(text="📊 Статистика", callback_data="admin:stats")],
+            [InlineKeyboardButton(text="💰 Выручка", callback_data="admin:revenue")],
+            [InlineKeyboardButton(text="⏱ Фоновые задачи", callback_data="admin:jobs")]
         ]
     )
     return keyboard
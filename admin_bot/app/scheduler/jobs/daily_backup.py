@@ -1,6 +1,7 @@
 """Daily backup job."""
 
 import logging
+from app.scheduler.metrics import mark_error
 from app.services.backups import backup_service
 
 logger = logging.getLogger(__name__)
@@ -14,3 +15,4 @@ async def run_backup() -> None:
         logger.info("Daily backup job completed successfully")
     except Exception as e:
         logger.error(f"Daily backup job failed: {e}", exc_info=True)
+        mark_error(e)
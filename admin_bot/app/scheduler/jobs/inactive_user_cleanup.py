@@ -4,6 +4,7 @@ import logging
 import time
 
 from app.notify.admin import send_admin_message
+from app.scheduler.metrics import add_items, mark_error
 from app.services.subscription_db import get_inactive_telegram_ids_for_cleanup
 from app.services.users import user_service
 
@@ -29,6 +30,7 @@ async def run_inactive_user_cleanup() -> None:
             logger.info("Inactive cleanup: no users to process.")
             return
 
+        add_items(len(inactive_ids))
         for telegram_id in inactive_ids:
             username = str(telegram_id)
             try:
@@ -60,6 +62,7 @@ async def run_inactive_user_cleanup() -> None:
             await send_admin_message("\n".join(lines))
     except Exception as exc:
         logger.error("Inactive cleanup failed: %s", exc, exc_info=True)
+        mark_error(exc)
         now = time.time()
         global _last_error_ts
         if _last_error_ts is None or now - _last_error_ts >= ERROR_THROTTLE_SECONDS:
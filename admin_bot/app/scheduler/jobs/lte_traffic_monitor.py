@@ -4,17 +4,28 @@ from __future__ import annotations
 
 import logging
 import time
-from datetime import datetime, timezone
-from typing import Any
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
 
 from app.config.settings import settings
+from app.db.repo.cursors import cursors_repo
 from app.db.repo.lte_limits import lte_limits_repo
+from app.db.repo.lte_usage import lte_usage_repo
 from app.notify.admin import send_admin_message
+from app.scheduler.metrics import add_items, mark_error
+from app.scheduler.slicing import begin_slice, finish_slice
 from app.services.subscription_db import get_subscription_ends_map
 from app.services.users import user_service
 
 logger = logging.getLogger(__name__)
 
+# Weight of the newest sample in the exponentially smoothed burn rate.
+BURN_RATE_SMOOTHING = 0.5
+# Users whose headroom would be gone within this many ticks are polled every tick.
+NEAR_LIMIT_TICKS = 2
+# Cursor with the last closed day ingested by node-level (bulk) usage mode.
+NODE_USAGE_CURSOR = "lte_usage_daily_closed_through"
+
 
 def _iso_date(ts: int) -> str:
     return datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
@@ -52,7 +63,7 @@ def _extract_usage_rows(raw: dict[str, Any]) -> list[dict[str, Any]]:
     if isinstance(response, list):
         return [row for row in response if isinstance(row, dict)]
     if isinstance(response, dict):
-        for key in ("items", "rows", "usage", "stats"):
+        for key in ("items", "rows", "usage", "stats", "users", "topUsers"):
             value = response.get(key)
             if isinstance(value, list):
                 return [row for row in value if isinstance(row, dict)]
@@ -103,16 +114,68 @@ def _resolve_lte_node_uuids(nodes: list[dict[str, Any]]) -> set[str]:
     return selected
 
 
-async def _fetch_user_lte_usage_bytes(user_uuid: str, from_ts: int, to_ts: int, lte_nodes: set[str]) -> int:
+def _extract_row_day(row: dict[str, Any]) -> str | None:
+    for key in ("date", "day", "usageDate", "usage_date"):
+        value = row.get(key)
+        if isinstance(value, str) and len(value) >= 10:
+            return value[:10]
+    return None
+
+
+def _bucket_lte_usage_rows(
+    rows: list[dict[str, Any]],
+    lte_nodes: set[str],
+    default_day: str,
+) -> dict[tuple[str, str], int]:
     """
-    Fetch user usage and aggregate only LTE nodes.
+    Group usage rows into {(day, node_uuid): bytes}, keeping only LTE nodes.
 
-    Tries both old and new Remnawave endpoints.
+    Rows without a node id are counted as LTE (same as before the rollup);
+    rows without a date are attributed to `default_day`, so callers only pass
+    undated rows from single-day requests (see `_fetch_usage_spans`).
     """
-    if not lte_nodes:
-        return 0
+    buckets: dict[tuple[str, str], int] = {}
+    for row in rows:
+        node_uuid = _extract_node_uuid(row) or ""
+        if node_uuid and node_uuid not in lte_nodes:
+            continue
+        key = (_extract_row_day(row) or default_day, node_uuid)
+        buckets[key] = buckets.get(key, 0) + max(0, _extract_total_bytes(row))
+    return buckets
 
-    params = {"start": _iso_date(from_ts), "end": _iso_date(to_ts)}
+
+async def _fetch_usage_spans(
+    fetch: Callable[[str, str, str], Awaitable[list[dict[str, Any]]]],
+    owner_uuid: str,
+    start_day: str,
+    end_day: str,
+) -> list[tuple[str, str, list[dict[str, Any]]]]:
+    """
+    Fetch usage rows for an inclusive date range as (start, end, rows) spans.
+
+    Panels that answer a multi-day range with undated totals are asked again
+    one day at a time: booking such totals to one day would lose them as soon
+    as that day is re-read and replaced.
+    """
+    rows = await fetch(owner_uuid, start_day, end_day)
+    if start_day == end_day or all(_extract_row_day(row) for row in rows):
+        return [(start_day, end_day, rows)]
+    spans: list[tuple[str, str, list[dict[str, Any]]]] = []
+    day, last = date.fromisoformat(start_day), date.fromisoformat(end_day)
+    while day <= last:
+        iso = day.isoformat()
+        spans.append((iso, iso, await fetch(owner_uuid, iso, iso)))
+        day += timedelta(days=1)
+    return spans
+
+
+async def _fetch_user_usage_rows(user_uuid: str, start_day: str, end_day: str) -> list[dict[str, Any]]:
+    """
+    Fetch per-node usage rows of a user for an inclusive date range.
+
+    Tries both old and new Remnawave endpoints.
+    """
+    params = {"start": start_day, "end": end_day}
     endpoints = [
         f"/users/stats/usage/{user_uuid}/range",
         f"/users/stats/usage/range/{user_uuid}",
@@ -123,22 +186,240 @@ async def _fetch_user_lte_usage_bytes(user_uuid: str, from_ts: int, to_ts: int,
     for endpoint in endpoints:
         try:
             raw = await user_service.client.request("GET", endpoint, params=params)
-            rows = _extract_usage_rows(raw)
-            if not rows:
-                return 0
-            total = 0
-            for row in rows:
-                node_uuid = _extract_node_uuid(row)
-                if node_uuid and node_uuid not in lte_nodes:
-                    continue
-                total += max(0, _extract_total_bytes(row))
-            return total
+            return _extract_usage_rows(raw)
+        except Exception as exc:
+            last_error = exc
+            continue
+    if last_error:
+        raise last_error
+    return []
+
+
+async def _sync_user_lte_usage(
+    tg_id: int,
+    user_uuid: str,
+    cycle_start_ts: int,
+    now: int,
+    closed_through: str,
+    lte_nodes: set[str],
+) -> tuple[int, str]:
+    """
+    Bring the daily rollup of a user up to date and return the window usage.
+
+    One range request covers the days not yet stored and today. The last
+    closed day is part of that range as well: the panel may still add
+    traffic to it after midnight, so it is re-read until the next day closes.
+    Returns (usage bytes in [cycle start, today], new closed-through day).
+    """
+    if not lte_nodes:
+        return 0, closed_through
+
+    today = datetime.fromtimestamp(now, tz=timezone.utc).date()
+    window_start = datetime.fromtimestamp(cycle_start_ts, tz=timezone.utc).date()
+
+    first_day = window_start
+    if closed_through:
+        try:
+            first_day = max(first_day, min(date.fromisoformat(closed_through), today))
+        except ValueError:
+            pass
+
+    start, end = first_day.isoformat(), today.isoformat()
+    buckets: dict[tuple[str, str], int] = {}
+    for span_start, span_end, rows in await _fetch_usage_spans(_fetch_user_usage_rows, user_uuid, start, end):
+        for (day, node_uuid), value in _bucket_lte_usage_rows(rows, lte_nodes, span_end).items():
+            # Keep rows dated just outside the range (panel time zone) inside it.
+            key = (min(max(day, span_start), span_end), node_uuid)
+            buckets[key] = buckets.get(key, 0) + value
+    await lte_usage_repo.replace_days(tg_id, start, end, buckets)
+    closed_through = (today - timedelta(days=1)).isoformat()
+
+    usage_bytes = await lte_usage_repo.sum_window(tg_id, window_start.isoformat(), today.isoformat())
+    return usage_bytes, closed_through
+
+
+def _first_present_key(rows: list[dict[str, Any]], keys: tuple[str, ...]) -> str | None:
+    for row in rows[:20]:
+        for key in keys:
+            if row.get(key) is not None:
+                return key
+    return None
+
+
+def _node_usage_columns(
+    rows: list[dict[str, Any]],
+    default_day: str,
+) -> tuple[list[str], list[str], list[int]]:
+    """
+    Convert node-level per-user rows into parallel (user_key, day, bytes) columns.
+
+    Field names are resolved once per response instead of probing every key
+    on every row, so large node responses are flattened in a single pass.
+    """
+    if not rows:
+        return [], [], []
+    user_key = _first_present_key(rows, ("userUuid", "user_uuid", "uuid", "username"))
+    if user_key is None:
+        raise ValueError("node usage rows have no user identifier")
+    day_key = _first_present_key(rows, ("date", "day", "usageDate", "usage_date"))
+    total_key = _first_present_key(rows, ("total", "totalBytes", "total_bytes", "bytes"))
+    down_key = _first_present_key(rows, ("totalDownload", "download"))
+    up_key = _first_present_key(rows, ("totalUpload", "upload"))
+
+    user_col: list[str] = []
+    day_col: list[str] = []
+    bytes_col: list[int] = []
+    for row in rows:
+        user = row.get(user_key)
+        if user is None:
+            continue
+        if total_key is not None:
+            value = _to_int(row.get(total_key))
+        else:
+            value = (_to_int(row.get(down_key)) if down_key else 0) + (_to_int(row.get(up_key)) if up_key else 0)
+        if value <= 0:
+            continue
+        day = row.get(day_key) if day_key else None
+        user_col.append(str(user))
+        day_col.append(day[:10] if isinstance(day, str) and len(day) >= 10 else default_day)
+        bytes_col.append(value)
+    return user_col, day_col, bytes_col
+
+
+async def _fetch_node_user_usage_rows(node_uuid: str, start_day: str, end_day: str) -> list[dict[str, Any]]:
+    """
+    Fetch per-user usage rows of one node for an inclusive date range.
+
+    Raises when no known endpoint answers, so the caller can fall back to
+    per-user requests on older panel versions.
+    """
+    params = {"start": start_day, "end": end_day}
+    endpoints = [
+        f"/nodes/usage/{node_uuid}/users/range",
+        f"/bandwidth-stats/nodes/{node_uuid}/users/legacy",
+        f"/bandwidth-stats/nodes/{node_uuid}/users",
+    ]
+    last_error: Exception | None = None
+    for endpoint in endpoints:
+        try:
+            raw = await user_service.client.request("GET", endpoint, params=params)
+            return _extract_usage_rows(raw)
         except Exception as exc:
             last_error = exc
             continue
     if last_error:
         raise last_error
-    return 0
+    return []
+
+
+async def _ingest_lte_usage_by_node(
+    users: list[dict[str, Any]],
+    lte_nodes: set[str],
+    now: int,
+) -> tuple[dict[int, list[tuple[str, int]]], str]:
+    """
+    Refresh the daily rollup for all users with one request per LTE node and range
+    (per day if the panel only returns undated range totals).
+
+    Not-yet-ingested closed days (tracked by a global cursor) and the last
+    closed day, which may still receive late traffic, are fetched in one range;
+    today is refetched on every call. Returns ({tg_id: [(day, bytes)]}, closed-through day).
+    """
+    today = datetime.fromtimestamp(now, tz=timezone.utc).date()
+    yesterday = today - timedelta(days=1)
+    history_start = today - timedelta(days=max(1, int(settings.lte_period_days)))
+
+    user_key_to_tg: dict[str, int] = {}
+    for user in users:
+        tg_id = _extract_tg_id(user)
+        if tg_id is None:
+            continue
+        if user.get("uuid"):
+            user_key_to_tg[str(user["uuid"])] = tg_id
+        if user.get("username"):
+            user_key_to_tg[str(user["username"])] = tg_id
+
+    closed_through = await cursors_repo.get(NODE_USAGE_CURSOR)
+    first_day = history_start
+    if closed_through:
+        try:
+            first_day = max(first_day, date.fromisoformat(closed_through))
+        except ValueError:
+            pass
+
+    ranges: list[tuple[str, str]] = []
+    if first_day <= yesterday:
+        ranges.append((first_day.isoformat(), yesterday.isoformat()))
+    ranges.append((today.isoformat(), today.isoformat()))
+
+    for start_day, end_day in ranges:
+        totals: dict[tuple[int, str, str], int] = {}
+        for node_uuid in sorted(lte_nodes):
+            spans = await _fetch_usage_spans(_fetch_node_user_usage_rows, node_uuid, start_day, end_day)
+            for span_start, span_end, rows in spans:
+                user_col, day_col, bytes_col = _node_usage_columns(rows, span_end)
+                for user_key, day, value in zip(user_col, day_col, bytes_col):
+                    tg_id = user_key_to_tg.get(user_key)
+                    if tg_id is None:
+                        if not user_key.isdigit():
+                            continue
+                        tg_id = int(user_key)
+                    key = (tg_id, min(max(day, span_start), span_end), node_uuid)
+                    totals[key] = totals.get(key, 0) + value
+        await lte_usage_repo.replace_days_all_users(
+            start_day,
+            end_day,
+            [(tg_id, day, node_uuid, value) for (tg_id, day, node_uuid), value in totals.items()],
+        )
+        if end_day == yesterday.isoformat():
+            closed_through = end_day
+            await cursors_repo.set(NODE_USAGE_CURSOR, closed_through)
+
+    return await lte_usage_repo.daily_totals_since(history_start.isoformat()), closed_through
+
+
+def _window_sum(daily: list[tuple[str, int]], start_day: str) -> int:
+    return sum(value for day, value in daily if day >= start_day)
+
+
+def _estimate_burn_rate(
+    usage_bytes: int,
+    prev_usage_bytes: int,
+    prev_checked_ts: int,
+    prev_rate_bps: float,
+    now: int,
+) -> float:
+    """Smoothed LTE consumption rate in bytes/second since the previous check."""
+    elapsed = now - prev_checked_ts
+    if prev_checked_ts <= 0 or elapsed <= 0 or usage_bytes < prev_usage_bytes:
+        return max(0.0, prev_rate_bps)
+    sample = (usage_bytes - prev_usage_bytes) / elapsed
+    if prev_rate_bps <= 0:
+        return sample
+    return BURN_RATE_SMOOTHING * sample + (1 - BURN_RATE_SMOOTHING) * prev_rate_bps
+
+
+def _plan_next_check(now: int, remaining_bytes: int, rate_bps: float, should_block: bool) -> int:
+    """
+    Return the timestamp of the next usage fetch for a user.
+
+    Blocked and near-limit users are due on the next tick; everyone else is
+    scheduled at a fraction of the estimated time until their headroom runs
+    out, capped by LTE_POLL_MAX_INTERVAL_MINUTES.
+    """
+    tick_seconds = max(1, int(settings.monitor_interval_minutes)) * 60
+    max_delay = max(tick_seconds, int(settings.lte_poll_max_interval_minutes) * 60)
+    if should_block or remaining_bytes <= 0:
+        return now
+    if rate_bps <= 0:
+        return now + max_delay
+    seconds_to_limit = remaining_bytes / rate_bps
+    if seconds_to_limit <= tick_seconds * NEAR_LIMIT_TICKS:
+        return now
+    delay = int(seconds_to_limit * max(0.0, float(settings.lte_poll_safety_factor)))
+    if delay < tick_seconds:
+        return now
+    return now + min(delay, max_delay)
 
 
 async def _list_all_users() -> list[dict[str, Any]]:
@@ -169,6 +450,8 @@ async def run_lte_traffic_monitor() -> None:
     free_bytes = max(0, int(settings.lte_free_gb_per_30d)) * 1024 * 1024 * 1024
     blocked_now = 0
     unblocked_now = 0
+    fetched = 0
+    skipped = 0
 
     try:
         lte_squad = await user_service._find_internal_squad_by_name(settings.lte_squad_name)
@@ -190,6 +473,33 @@ async def run_lte_traffic_monitor() -> None:
         ends_map = await get_subscription_ends_map()
 
         users = await _list_all_users()
+        # A GB purchase must lift the block on the next tick, whatever the shard.
+        paid_while_blocked = {
+            tg_id
+            for tg_id in await lte_limits_repo.blocked_with_balance()
+            if int(ends_map.get(tg_id, 0)) > now
+        }
+        # Near-limit users are planned for every tick and must not wait for
+        # their shard, or adaptive polling would only run every K ticks.
+        due_now = await lte_limits_repo.due_for_check(now, period_seconds)
+        current_slice = await begin_slice(
+            "lte_traffic_monitor", now, priority_ids=paid_while_blocked | due_now
+        )
+
+        # Bulk mode: one usage request per LTE node instead of one per user.
+        node_daily: dict[int, list[tuple[str, int]]] | None = None
+        node_closed_through = ""
+        mode = settings.lte_usage_ingestion
+        if mode != "per_user" and lte_nodes:
+            try:
+                node_daily, node_closed_through = await _ingest_lte_usage_by_node(users, lte_nodes, now)
+            except Exception as exc:
+                if mode == "per_node":
+                    raise
+                logger.warning(
+                    "Node-level LTE usage unavailable, falling back to per-user requests: %s", exc
+                )
+
         for user in users:
             user_uuid = user.get("uuid")
             if not user_uuid:
@@ -197,6 +507,9 @@ async def run_lte_traffic_monitor() -> None:
             tg_id = _extract_tg_id(user)
             if tg_id is None:
                 continue
+            if not current_slice.includes(tg_id, int(ends_map.get(tg_id, 0))):
+                continue
+            add_items()
 
             initial_cycle_start = _extract_created_ts(user, now)
             state = await lte_limits_repo.create_if_missing(
@@ -206,18 +519,53 @@ async def run_lte_traffic_monitor() -> None:
             cycle_start_ts = int(state.get("cycle_start_ts") or now)
             paid_balance = max(0, int(state.get("paid_balance_bytes") or 0))
             cycle_paid_spent = max(0, int(state.get("cycle_paid_spent_bytes") or 0))
+            prev_usage = max(0, int(state.get("last_total_usage_bytes") or 0))
+            prev_checked_ts = int(state.get("last_checked_ts") or 0)
+            prev_rate = float(state.get("burn_rate_bps") or 0.0)
+            next_check_ts = int(state.get("next_check_ts") or 0)
+            usage_closed_through = str(state.get("usage_closed_through") or "")
 
             # Move cycle window by 30-day chunks; purchased balance is carried over.
+            cycle_rolled = False
             while now >= cycle_start_ts + period_seconds:
                 cycle_start_ts += period_seconds
                 cycle_paid_spent = 0
-
-            usage_bytes = await _fetch_user_lte_usage_bytes(
-                user_uuid=str(user_uuid),
-                from_ts=cycle_start_ts,
-                to_ts=now,
-                lte_nodes=lte_nodes,
+                cycle_rolled = True
+
+            # Blocked users are always re-checked: a GB purchase must lift the
+            # block on the next tick, not after the back-off expires.
+            is_due = (
+                node_daily is not None
+                or not settings.lte_adaptive_polling_enabled
+                or cycle_rolled
+                or bool(state.get("is_blocked"))
+                or prev_checked_ts <= 0
+                or next_check_ts <= now
             )
+            if node_daily is not None:
+                window_start = datetime.fromtimestamp(cycle_start_ts, tz=timezone.utc).date().isoformat()
+                usage_bytes = _window_sum(node_daily.get(tg_id, []), window_start)
+                usage_closed_through = node_closed_through or usage_closed_through
+            elif is_due:
+                usage_bytes, usage_closed_through = await _sync_user_lte_usage(
+                    tg_id=tg_id,
+                    user_uuid=str(user_uuid),
+                    cycle_start_ts=cycle_start_ts,
+                    now=now,
+                    closed_through=usage_closed_through,
+                    lte_nodes=lte_nodes,
+                )
+            if is_due:
+                burn_rate = 0.0 if cycle_rolled else _estimate_burn_rate(
+                    usage_bytes, prev_usage, prev_checked_ts, prev_rate, now
+                )
+                checked_ts = now
+                fetched += 1
+            else:
+                usage_bytes = prev_usage
+                burn_rate = prev_rate
+                checked_ts = prev_checked_ts
+                skipped += 1
 
             paid_needed = max(0, usage_bytes - free_bytes)
             if paid_needed > cycle_paid_spent:
@@ -260,6 +608,9 @@ async def run_lte_traffic_monitor() -> None:
                 await user_service._update_user_internal_squads(str(user_uuid), desired_squads)
                 unblocked_now += 1
 
+            if is_due or should_block:
+                next_check_ts = _plan_next_check(now, remaining_bytes, burn_rate, should_block)
+
             await lte_limits_repo.save_state(
                 tg_id=tg_id,
                 cycle_start_ts=cycle_start_ts,
@@ -268,8 +619,23 @@ async def run_lte_traffic_monitor() -> None:
                 is_blocked=should_block,
                 last_total_usage_bytes=usage_bytes,
                 last_remaining_bytes=remaining_bytes,
+                last_checked_ts=checked_ts,
+                burn_rate_bps=burn_rate,
+                next_check_ts=next_check_ts,
+                usage_closed_through=usage_closed_through,
             )
 
+        await finish_slice(current_slice)
+
+        retention_days = max(int(settings.lte_period_days), int(settings.lte_usage_daily_retention_days))
+        await lte_usage_repo.prune_before(_iso_date(now - retention_days * 86400))
+
+        logger.info(
+            "LTE traffic monitor: usage fetched for %s users, %s skipped by adaptive polling",
+            fetched,
+            skipped,
+        )
+
         if blocked_now or unblocked_now:
             await send_admin_message(
                 "📶 LTE лимит-монитор:\n"
@@ -280,6 +646,7 @@ async def run_lte_traffic_monitor() -> None:
             )
     except Exception as exc:
         logger.error("LTE traffic monitor failed: %s", exc, exc_info=True)
+        mark_error(exc)
         await send_admin_message(
             "❌ Ошибка LTE лимит-монитора.\n"
             f"Причина: {exc}"
@@ -9,6 +9,7 @@ from app.api.client import RemnawaveClient
 from app.api.errors import APIError
 from app.config.settings import settings
 from app.notify.admin import send_admin_message
+from app.scheduler.metrics import add_items, mark_error
 
 logger = logging.getLogger(__name__)
 _last_alert_ts: float | None = None
@@ -92,6 +93,7 @@ async def run_node_monitor() -> None:
 
         nodes_resp = await _request_with_retry("/nodes")
         nodes = nodes_resp.get("response", [])
+        add_items(len(nodes))
         for node in nodes:
             name = node.get("name") or node.get("uuid", "unknown")
 
@@ -144,6 +146,7 @@ async def run_node_monitor() -> None:
             logger.warning("Node monitor skipped due to Remnawave connect timeout: %s", e)
         else:
             logger.error("Node monitor failed: %s", e, exc_info=True)
+        mark_error(e)
         now = time.time()
         global _last_error_ts
         if _last_error_ts is None or now - _last_error_ts >= ERROR_THROTTLE_SECONDS:
@@ -0,0 +1,61 @@
+"""Re-probe chats marked unreachable once their backoff has expired."""
+
+import logging
+import time
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from app.bot.factory import create_user_bot
+from app.config.settings import settings
+from app.db.repo.reachability import reachability_repo
+from app.scheduler.metrics import add_items, mark_error
+from app.services.reachability import unreachable_reason
+
+logger = logging.getLogger(__name__)
+
+
+async def run_reachability_probe() -> None:
+    """
+    Look up due chats with `get_chat` through user_bot.
+
+    The lookup is invisible to the user and fails with the same errors as a
+    message for deleted or deactivated accounts. Reachable chats are cleared,
+    the rest get a longer backoff; a chat that still blocks the bot is marked
+    again by the next send that fails.
+    """
+    token = settings.user_bot_token.strip()
+    if not token:
+        return
+    now = int(time.time())
+    tg_ids = await reachability_repo.due_for_probe(now, settings.reachability_probe_batch)
+    if not tg_ids:
+        return
+
+    bot = create_user_bot()
+    reachable: list[int] = []
+    failed: list[tuple[int, str]] = []
+    try:
+        for tg_id in tg_ids:
+            try:
+                await bot.get_chat(tg_id)
+                reachable.append(tg_id)
+            except TelegramRetryAfter as exc:
+                # Leave the rest for the next run instead of competing with broadcasts.
+                logger.info("Reachability probe hit flood wait (%ss), stopping early", exc.retry_after)
+                break
+            except Exception as exc:
+                reason = unreachable_reason(exc)
+                if reason:
+                    failed.append((tg_id, reason))
+                else:
+                    logger.warning("Reachability probe tg_id=%s: %s", tg_id, exc)
+    except Exception as exc:
+        logger.exception("Reachability probe failed: %s", exc)
+        mark_error(exc)
+    finally:
+        await bot.session.close()
+
+    await reachability_repo.mark_reachable(reachable)
+    await reachability_repo.mark_unreachable(failed, now)
+    add_items(len(reachable) + len(failed))
+    logger.info("Reachability probe: %s reachable again, %s still unreachable", len(reachable), len(failed))
@@ -9,6 +9,7 @@ from aiogram.types import FSInputFile
 
 from app.bot.factory import create_bot
 from app.config.settings import settings
+from app.scheduler.metrics import mark_error
 
 logger = logging.getLogger(__name__)
 
@@ -64,3 +65,4 @@ async def run_subscription_db_backup() -> None:
             await bot.session.close()
     except Exception as e:
         logger.error("Subscription DB backup failed: %s", e, exc_info=True)
+        mark_error(e)
@@ -17,7 +17,8 @@ DB once per cycle:
       with capacity. LTE squad membership is left to the LTE traffic monitor.
 
 The job is idempotent: if the user is already in the desired state nothing is
-sent to the API.
+sent to the API. With RECONCILE_SLICES > 1 each tick covers one shard of users
+plus recently expired ones (see `app.scheduler.slicing`).
 """
 
 from __future__ import annotations
@@ -28,6 +29,8 @@ from typing import Any
 
 from app.config.settings import settings
 from app.notify.admin import send_admin_message
+from app.scheduler.metrics import add_items, mark_error
+from app.scheduler.slicing import begin_slice, finish_slice
 from app.services.subscription_db import get_subscription_ends_map
 from app.services.users import user_service
 
@@ -124,6 +127,7 @@ async def run_subscription_expire_monitor() -> None:
 
         ends_map = await get_subscription_ends_map()
         users = await _list_all_users()
+        current_slice = await begin_slice("subscription_expire_monitor", now)
 
         for user in users:
             user_uuid = user.get("uuid")
@@ -132,8 +136,11 @@ async def run_subscription_expire_monitor() -> None:
             tg_id = _extract_tg_id(user)
             if tg_id is None:
                 continue
-
             sub_ends_ts = ends_map.get(tg_id, 0)
+            if not current_slice.includes(tg_id, sub_ends_ts):
+                continue
+            add_items()
+
             current_squads = _extract_user_squad_uuids(user)
             current_set = set(current_squads)
             in_free = free_squad_uuid in current_set
@@ -192,6 +199,8 @@ async def run_subscription_expire_monitor() -> None:
                 failures.append(f"{tg_id}: {exc}")
                 logger.warning("Failed to reconcile tg_id=%s: %s", tg_id, exc)
 
+        await finish_slice(current_slice)
+
         if demoted or promoted or failures:
             lines = [
                 "🛡 Подписка-монитор:",
@@ -207,6 +216,7 @@ async def run_subscription_expire_monitor() -> None:
             await send_admin_message("\n".join(lines))
     except Exception as exc:
         logger.error("Subscription expire monitor failed: %s", exc, exc_info=True)
+        mark_error(exc)
         await send_admin_message(
             "❌ Ошибка subscription-monitor.\n"
             f"Причина: {exc}"
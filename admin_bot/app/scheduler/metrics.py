@@ -0,0 +1,111 @@
+"""Per-run metrics for scheduler jobs: duration, items processed, API calls."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED, JobEvent
+
+from app.db.repo.job_runs import job_runs_repo
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNS_RETENTION_SECONDS = 14 * 86400
+
+
+@dataclass
+class JobRunStats:
+    """Counters collected while a job is running."""
+
+    items: int = 0
+    api_calls: int = 0
+    error: str = ""
+
+
+_current_run: ContextVar[JobRunStats | None] = ContextVar("job_run_stats", default=None)
+
+
+def count_api_call() -> None:
+    """Count one upstream API request against the current job run (if any)."""
+    stats = _current_run.get()
+    if stats is not None:
+        stats.api_calls += 1
+
+
+def add_items(count: int = 1) -> None:
+    """Add processed items to the current job run (if any)."""
+    stats = _current_run.get()
+    if stats is not None:
+        stats.items += max(0, int(count))
+
+
+def mark_error(exc: BaseException | str) -> None:
+    """Flag the current job run as failed; for jobs that swallow their errors."""
+    stats = _current_run.get()
+    if stats is not None:
+        stats.error = str(exc) or type(exc).__name__
+
+
+def tracked(job_id: str, func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Wrap a job coroutine so every run is recorded in `job_runs`."""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        stats = JobRunStats()
+        token = _current_run.set(stats)
+        started_at = int(time.time())
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as exc:
+            stats.error = str(exc) or type(exc).__name__
+            raise
+        finally:
+            _current_run.reset(token)
+            duration_ms = int((time.perf_counter() - started) * 1000)
+            try:
+                await job_runs_repo.add(
+                    job_id=job_id,
+                    started_at=started_at,
+                    duration_ms=duration_ms,
+                    status="error" if stats.error else "ok",
+                    items=stats.items,
+                    api_calls=stats.api_calls,
+                    error=stats.error,
+                )
+                await job_runs_repo.prune_before(started_at - JOB_RUNS_RETENTION_SECONDS)
+            except Exception as exc:
+                logger.warning("Failed to record job run %s: %s", job_id, exc)
+
+    return wrapper
+
+
+async def _record_skipped(job_id: str, status: str, started_at: int) -> None:
+    try:
+        await job_runs_repo.add(job_id=job_id, started_at=started_at, duration_ms=0, status=status)
+    except Exception as exc:
+        logger.warning("Failed to record %s run of %s: %s", status, job_id, exc)
+
+
+def on_job_event(event: JobEvent) -> None:
+    """
+    Scheduler listener for runs that never started.
+
+    APScheduler only logs these at WARNING level; recording them makes
+    overruns visible in the admin jobs view.
+    """
+    if event.code == EVENT_JOB_MAX_INSTANCES:
+        status = "skipped"
+        logger.warning("Job %s skipped: previous run is still in progress", event.job_id)
+    elif event.code == EVENT_JOB_MISSED:
+        status = "missed"
+        logger.warning("Job %s missed its run time (misfire grace exceeded)", event.job_id)
+    else:
+        return
+    asyncio.ensure_future(_record_skipped(event.job_id, status, int(time.time())))
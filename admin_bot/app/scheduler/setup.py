@@ -1,7 +1,10 @@
 """APScheduler setup and configuration."""
 
 import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any
 
+from apscheduler.events import EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -11,21 +14,56 @@ from app.scheduler.jobs import (
     subscription_db_backup,
     inactive_user_cleanup,
     lte_traffic_monitor,
+    reachability_probe,
     subscription_expire_monitor,
 )
 from app.config.settings import settings
+from app.scheduler.metrics import on_job_event, tracked
 
 logger = logging.getLogger(__name__)
 
 
+def _interval_options(slot: int) -> dict[str, Any]:
+    """
+    Interval trigger options for the `slot`-th monitor job.
+
+    Monitors share one interval; their first runs are offset by
+    SCHEDULER_STAGGER_SECONDS each and every run gets up to
+    SCHEDULER_JITTER_SECONDS of random delay, so they don't hit the panel
+    in the same second. As with a plain interval trigger, nothing runs at
+    startup: the first run is one interval plus the offset away (an interval
+    trigger fires at `start_date` itself).
+    """
+    stagger = max(0, int(settings.scheduler_stagger_seconds)) * slot
+    jitter = max(0, int(settings.scheduler_jitter_seconds))
+    first_run = datetime.now(timezone.utc) + timedelta(
+        minutes=settings.monitor_interval_minutes, seconds=stagger
+    )
+    return {
+        "trigger": "interval",
+        "minutes": settings.monitor_interval_minutes,
+        "start_date": first_run,
+        "jitter": jitter or None,
+    }
+
+
 def create_scheduler() -> AsyncIOScheduler:
     """Create and configure scheduler with jobs."""
-    scheduler = AsyncIOScheduler()
+    # A run that overruns its interval makes the next one skip (max_instances)
+    # and runs missed while the loop was busy collapse into one (coalesce).
+    scheduler = AsyncIOScheduler(
+        job_defaults={
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": max(1, int(settings.scheduler_misfire_grace_seconds)),
+        }
+    )
+    scheduler.add_listener(on_job_event, EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED)
 
     # Add daily backup job (runs at 3:00 AM every day), if enabled.
     if settings.remnawave_backup_enabled:
         scheduler.add_job(
-            daily_backup.run_backup,
+            tracked("daily_backup", daily_backup.run_backup),
             trigger=CronTrigger(hour=3, minute=0),
             id="daily_backup",
             name="Daily Remnawave DB Backup",
@@ -35,7 +73,7 @@ def create_scheduler() -> AsyncIOScheduler:
         logger.info("Remnawave backup job is disabled by REMNAWAVE_BACKUP_ENABLED=false")
 
     scheduler.add_job(
-        subscription_db_backup.run_subscription_db_backup,
+        tracked("subscription_db_backup", subscription_db_backup.run_subscription_db_backup),
         trigger=CronTrigger(hour=17, minute=0, timezone="Europe/Moscow"),
         id="subscription_db_backup",
         name="Daily Subscription DB Backup",
@@ -43,16 +81,15 @@ def create_scheduler() -> AsyncIOScheduler:
     )
 
     scheduler.add_job(
-        node_monitor.run_node_monitor,
-        trigger="interval",
-        minutes=settings.monitor_interval_minutes,
+        tracked("node_monitor", node_monitor.run_node_monitor),
+        **_interval_options(0),
         id="node_monitor",
         name="Node and Squad Monitor",
         replace_existing=True
     )
 
     scheduler.add_job(
-        inactive_user_cleanup.run_inactive_user_cleanup,
+        tracked("inactive_user_cleanup", inactive_user_cleanup.run_inactive_user_cleanup),
         trigger=CronTrigger(hour=4, minute=30, timezone="Europe/Moscow"),
         id="inactive_user_cleanup",
         name="Inactive Remnawave User Cleanup",
@@ -60,9 +97,16 @@ def create_scheduler() -> AsyncIOScheduler:
     )
 
     scheduler.add_job(
-        lte_traffic_monitor.run_lte_traffic_monitor,
-        trigger="interval",
-        minutes=settings.monitor_interval_minutes,
+        tracked("reachability_probe", reachability_probe.run_reachability_probe),
+        trigger=CronTrigger(hour=5, minute=30, timezone="Europe/Moscow"),
+        id="reachability_probe",
+        name="Unreachable Chats Re-probe",
+        replace_existing=True,
+    )
+
+    scheduler.add_job(
+        tracked("lte_traffic_monitor", lte_traffic_monitor.run_lte_traffic_monitor),
+        **_interval_options(1),
         id="lte_traffic_monitor",
         name="LTE Traffic Limit Monitor",
         replace_existing=True,
@@ -70,9 +114,11 @@ def create_scheduler() -> AsyncIOScheduler:
 
     if settings.subscription_expire_monitor_enabled:
         scheduler.add_job(
-            subscription_expire_monitor.run_subscription_expire_monitor,
-            trigger="interval",
-            minutes=settings.monitor_interval_minutes,
+            tracked(
+                "subscription_expire_monitor",
+                subscription_expire_monitor.run_subscription_expire_monitor,
+            ),
+            **_interval_options(2),
             id="subscription_expire_monitor",
             name="Subscription Expire Monitor (FREE squad demotion/promotion)",
             replace_existing=True,
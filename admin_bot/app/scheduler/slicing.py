@@ -0,0 +1,70 @@
+"""Sliced (rolling) reconciliation for per-user monitors.
+
+With RECONCILE_SLICES=K > 1 a monitor handles only users with
+`tg_id % K == shard` on each tick and then moves the persisted shard cursor
+forward, so every user is visited within K ticks. Users whose subscription
+ended within the priority window, and any ids the monitor passes as
+`priority_ids` (e.g. blocked users that just paid), are handled on every
+tick regardless of shard, so neither demotions nor unblocks wait for slicing.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from app.config.settings import settings
+from app.db.repo.cursors import cursors_repo
+
+
+@dataclass
+class ReconcileSlice:
+    """Shard selected for the current tick of a monitor."""
+
+    job_id: str
+    shard: int
+    slices: int
+    priority_since_ts: int
+    now: int
+    priority_ids: frozenset[int] = field(default_factory=frozenset)
+
+    def includes(self, tg_id: int, sub_ends_ts: int) -> bool:
+        if self.slices <= 1:
+            return True
+        if tg_id % self.slices == self.shard or tg_id in self.priority_ids:
+            return True
+        return self.priority_since_ts <= sub_ends_ts <= self.now
+
+
+def _cursor_name(job_id: str) -> str:
+    return f"{job_id}:slice"
+
+
+async def begin_slice(job_id: str, now: int, priority_ids: Iterable[int] = ()) -> ReconcileSlice:
+    """Load the shard to process on this tick."""
+    slices = max(1, int(settings.reconcile_slices))
+    shard = 0
+    if slices > 1:
+        raw = await cursors_repo.get(_cursor_name(job_id), "0")
+        shard = int(raw) % slices if raw.isdigit() else 0
+    # The lane must cover at least two ticks, otherwise an expiry that falls
+    # between ticks could wait for its shard.
+    window_minutes = max(
+        int(settings.reconcile_priority_window_minutes),
+        2 * int(settings.monitor_interval_minutes),
+    )
+    return ReconcileSlice(
+        job_id=job_id,
+        shard=shard,
+        slices=slices,
+        priority_since_ts=now - window_minutes * 60,
+        now=now,
+        priority_ids=frozenset(priority_ids),
+    )
+
+
+async def finish_slice(current: ReconcileSlice) -> None:
+    """Advance the persisted cursor to the next shard."""
+    if current.slices <= 1:
+        return
+    await cursors_repo.set(_cursor_name(current.job_id), str((current.shard + 1) % current.slices))
@@ -0,0 +1,392 @@
+"""Persistent, resumable broadcast jobs.
+
+A broadcast is stored as a `broadcast_jobs` row plus one `broadcast_deliveries`
+row per recipient. A background task per running job sends pending deliveries
+in chunks and checkpoints every chunk, so a restart of the admin bot resumes
+from the last checkpoint instead of re-sending to users who already got the
+message. Pause/cancel take effect after the current chunk. While a job runs,
+its status message in the admin chat is edited with live progress.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import html
+import io
+import logging
+import time
+from typing import Awaitable, Callable
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+from aiogram.types.input_file import BufferedInputFile
+
+from app.bot.factory import create_user_bot
+from app.config.settings import settings
+from app.db.repo.broadcasts import (
+    JOB_CANCELLED,
+    JOB_DONE,
+    JOB_PAUSED,
+    JOB_RUNNING,
+    broadcast_jobs_repo,
+)
+from app.db.repo.reachability import reachability_repo
+from app.services.broadcast_sender import BroadcastSender
+from app.services.outbound import Priority, outbound_priority
+from app.services.reachability import unreachable_reason
+
+logger = logging.getLogger(__name__)
+
+
+def short_reason(exc: Exception) -> str:
+    """Краткое описание ошибки для отчёта админу."""
+    s = str(exc).strip()
+    if "blocked" in s.lower() or "deactivated" in s.lower():
+        return "заблокировал бота"
+    if "chat not found" in s.lower() or "user not found" in s.lower():
+        return "чат не найден"
+    if "bot can't initiate" in s.lower() or "have no rights" in s.lower():
+        return "пользователь не начинал диалог с ботом"
+    if len(s) > 60:
+        return s[:57] + "..."
+    return s or type(exc).__name__
+
+
+def build_reply_markup(buttons: list[dict] | None) -> InlineKeyboardMarkup | None:
+    if not buttons:
+        return None
+    rows: list[list[InlineKeyboardButton]] = []
+    for item in buttons:
+        if item.get("type") == "url":
+            rows.append([InlineKeyboardButton(text=item["text"], url=item["value"])])
+        else:
+            rows.append([InlineKeyboardButton(text=item["text"], callback_data=item["value"])])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+JOB_STATUS_TITLES = {
+    JOB_RUNNING: "⏳ идёт",
+    JOB_PAUSED: "⏸ на паузе",
+    JOB_CANCELLED: "🚫 отменена",
+    JOB_DONE: "✅ завершена",
+}
+
+
+def job_keyboard(job: dict) -> InlineKeyboardMarkup:
+    job_id = job["id"]
+    rows: list[list[InlineKeyboardButton]] = []
+    if job["status"] == JOB_RUNNING:
+        rows.append([
+            InlineKeyboardButton(text="⏸ Пауза", callback_data=f"admin:bcast:pause:{job_id}"),
+            InlineKeyboardButton(text="🚫 Отменить", callback_data=f"admin:bcast:stop:{job_id}"),
+        ])
+    elif job["status"] == JOB_PAUSED:
+        rows.append([
+            InlineKeyboardButton(text="▶️ Продолжить", callback_data=f"admin:bcast:resume:{job_id}"),
+            InlineKeyboardButton(text="🚫 Отменить", callback_data=f"admin:bcast:stop:{job_id}"),
+        ])
+    rows.append([InlineKeyboardButton(text="🔄 Обновить", callback_data=f"admin:bcast:status:{job_id}")])
+    rows.append([InlineKeyboardButton(text="◀️ В меню", callback_data="admin:menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _format_duration(seconds: float) -> str:
+    seconds = max(0, int(seconds))
+    if seconds < 60:
+        return f"{seconds} с"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes} мин {seconds} с"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours} ч {minutes} мин"
+
+
+def job_status_text(job: dict, *, rate: float | None = None) -> str:
+    """Status of a job; with `rate` (msg/s) also the current speed and ETA."""
+    done = int(job["sent"]) + int(job["failed"])
+    total = int(job["total"])
+    remaining = max(0, total - done)
+    percent = (done / total * 100) if total else 100.0
+    lines = [
+        f"📣 Рассылка #{job['id']}: {JOB_STATUS_TITLES.get(job['status'], job['status'])}",
+        f"Прогресс: {done}/{total} ({percent:.0f}%)",
+        f"Доставлено: {job['sent']}",
+        f"Ошибки: {job['failed']}",
+        f"Осталось: {remaining}",
+    ]
+    if rate is not None and job["status"] == JOB_RUNNING:
+        lines.append(f"Скорость: {rate:.1f} сообщ./с")
+        if rate > 0 and remaining:
+            lines.append(f"Осталось времени: ~{_format_duration(remaining / rate)}")
+    return "\n".join(lines)
+
+
+class _ProgressMessage:
+    """
+    Throttled live edits of a job's status message.
+
+    Counters are the checkpointed job row plus the in-flight stats of the
+    chunk being sent; `lock` keeps a refresh from counting a chunk twice
+    while it is being checkpointed.
+    """
+
+    def __init__(self, admin_bot: Bot, job: dict):
+        self.bot = admin_bot
+        self.job_id = int(job["id"])
+        self.chat_id = int(job.get("progress_chat_id") or 0)
+        self.message_id = int(job.get("progress_message_id") or 0)
+        self.sender: BroadcastSender | None = None
+        self.lock = asyncio.Lock()
+        self._started = time.monotonic()
+        self._done_at_start = int(job["sent"]) + int(job["failed"])
+        self._last_text = ""
+
+    async def refresh(self) -> None:
+        if not self.chat_id or not self.message_id:
+            return
+        async with self.lock:
+            job = await broadcast_jobs_repo.get(self.job_id)
+            if not job:
+                return
+            if self.sender is not None:
+                job["sent"] += self.sender.stats.sent
+                job["failed"] += self.sender.stats.failed
+        elapsed = time.monotonic() - self._started
+        done = int(job["sent"]) + int(job["failed"])
+        rate = (done - self._done_at_start) / elapsed if elapsed > 0 else 0.0
+        text = job_status_text(job, rate=rate)
+        if text == self._last_text:
+            return
+        try:
+            await self.bot.edit_message_text(
+                text,
+                chat_id=self.chat_id,
+                message_id=self.message_id,
+                reply_markup=job_keyboard(job),
+            )
+            self._last_text = text
+        except (TelegramBadRequest, TelegramRetryAfter) as exc:
+            # Not modified / message deleted / edit flood: skip this tick.
+            logger.debug("Broadcast #%s progress edit skipped: %s", self.job_id, exc)
+
+    async def run(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(max(1.0, interval))
+            try:
+                await self.refresh()
+            except Exception as exc:
+                logger.warning("Broadcast #%s progress update failed: %s", self.job_id, exc)
+
+
+class UploadOnce:
+    """
+    Media source that is uploaded on the first successful send only.
+
+    Sending a BufferedInputFile re-uploads the whole file for every
+    recipient; after the first send we switch to the file_id Telegram
+    returned for the sending bot. Until then sends are serialized so that
+    concurrent workers don't upload the same file in parallel.
+    """
+
+    def __init__(
+        self,
+        file: BufferedInputFile | str | None,
+        on_file_id: Callable[[str], Awaitable[None]] | None = None,
+    ):
+        self._file = file
+        self._file_id: str | None = file if isinstance(file, str) else None
+        self._on_file_id = on_file_id
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def _extract_file_id(message: Message) -> str | None:
+        if message.photo:
+            return message.photo[-1].file_id
+        if message.video:
+            return message.video.file_id
+        return None
+
+    async def send(self, send: Callable[[BufferedInputFile | str | None], Awaitable[Message]]) -> None:
+        if self._file_id is None:
+            async with self._lock:
+                if self._file_id is None:
+                    message = await send(self._file)
+                    self._file_id = self._extract_file_id(message)
+                    if self._file_id and self._on_file_id is not None:
+                        await self._on_file_id(self._file_id)
+                    return
+        await send(self._file_id)
+
+
+class BroadcastJobRunner:
+    """Owns the background tasks of running broadcast jobs."""
+
+    def __init__(self):
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def is_active(self, job_id: int) -> bool:
+        task = self._tasks.get(job_id)
+        return task is not None and not task.done()
+
+    def start(self, job_id: int, admin_bot: Bot) -> None:
+        """Start (or keep) the worker of a job whose status is `running`."""
+        if self.is_active(job_id):
+            return
+        self._tasks[job_id] = asyncio.create_task(self._run(job_id, admin_bot))
+
+    async def resume_all(self, admin_bot: Bot) -> int:
+        """Restart workers for jobs that were running when the bot stopped."""
+        job_ids = await broadcast_jobs_repo.list_by_status(JOB_RUNNING)
+        for job_id in job_ids:
+            logger.info("Resuming broadcast job #%s", job_id)
+            self.start(job_id, admin_bot)
+        return len(job_ids)
+
+    async def _prepare_media(self, job: dict, send_bot: Bot, admin_bot: Bot) -> UploadOnce | None:
+        kind = job["kind"]
+        if kind not in ("photo", "video"):
+            return None
+        if job.get("media_file_id"):
+            return UploadOnce(job["media_file_id"])
+        file_id = job["payload"].get("file_id")
+        if send_bot is admin_bot or not file_id:
+            return UploadOnce(file_id)
+        bio = await admin_bot.download(file_id)
+        if not bio or not isinstance(bio, io.BytesIO):
+            raise RuntimeError("не удалось скачать файл рассылки с админ-бота")
+        bio.seek(0)
+        upload = BufferedInputFile(bio.read(), filename="broadcast.jpg" if kind == "photo" else "broadcast.mp4")
+
+        async def remember(new_file_id: str) -> None:
+            await broadcast_jobs_repo.set_media_file_id(job["id"], new_file_id)
+
+        return UploadOnce(upload, on_file_id=remember)
+
+    async def _run(self, job_id: int, admin_bot: Bot) -> None:
+        job = await broadcast_jobs_repo.get(job_id)
+        if not job:
+            return
+        payload = job["payload"]
+        use_user_bot = bool(payload.get("from_user_bot") and settings.user_bot_token.strip())
+        send_bot = create_user_bot() if use_user_bot else admin_bot
+        progress = _ProgressMessage(admin_bot, job)
+        progress_task = asyncio.create_task(progress.run(settings.broadcast_progress_interval_seconds))
+        try:
+            media = await self._prepare_media(job, send_bot, admin_bot)
+            reply_markup = build_reply_markup(payload.get("buttons"))
+            kind = job["kind"]
+
+            async def send_one(tg_id: int) -> None:
+                if kind == "text":
+                    await send_bot.send_message(tg_id, payload.get("text", ""), reply_markup=reply_markup)
+                elif kind == "photo":
+                    await media.send(
+                        lambda file: send_bot.send_photo(
+                            tg_id, file, caption=payload.get("caption"), reply_markup=reply_markup
+                        )
+                    )
+                elif kind == "video":
+                    await media.send(
+                        lambda file: send_bot.send_video(
+                            tg_id, file, caption=payload.get("caption"), reply_markup=reply_markup
+                        )
+                    )
+                else:
+                    raise ValueError("неизвестный тип рассылки")
+
+            while True:
+                job = await broadcast_jobs_repo.get(job_id)
+                if not job or job["status"] != JOB_RUNNING:
+                    return
+                chunk = await broadcast_jobs_repo.pending_chunk(job_id, max(1, settings.broadcast_chunk_size))
+                if not chunk:
+                    await broadcast_jobs_repo.set_status(job_id, JOB_DONE, only_from=(JOB_RUNNING,))
+                    await self._report(job_id, admin_bot)
+                    return
+                sent_ids: list[int] = []
+                unreachable: list[tuple[int, str]] = []
+
+                def on_failed(tg_id: int, exc: Exception) -> None:
+                    reason = unreachable_reason(exc)
+                    if reason:
+                        unreachable.append((tg_id, reason))
+
+                sender = BroadcastSender(
+                    send_one,
+                    concurrency=settings.broadcast_concurrency,
+                    max_retries=settings.broadcast_max_retries,
+                    describe_error=short_reason,
+                    on_sent=sent_ids.append,
+                    on_failed=on_failed,
+                )
+                progress.sender = sender
+                chunk_started = time.monotonic()
+                with outbound_priority(Priority.MARKETING):
+                    stats = await sender.run(chunk)
+                async with progress.lock:
+                    await broadcast_jobs_repo.checkpoint(
+                        job_id, sent_ids, stats.failures, time.monotonic() - chunk_started
+                    )
+                    progress.sender = None
+                if send_bot is not admin_bot:
+                    # Reachability is tracked for user_bot chats only.
+                    await reachability_repo.mark_reachable(sent_ids)
+                    await reachability_repo.mark_unreachable(unreachable)
+        except Exception as exc:
+            logger.exception("Broadcast job #%s stopped: %s", job_id, exc)
+            await broadcast_jobs_repo.set_status(job_id, JOB_PAUSED, only_from=(JOB_RUNNING,))
+            await self._notify_creator(
+                job_id,
+                admin_bot,
+                f"❌ Рассылка #{job_id} приостановлена из-за ошибки: {html.escape(str(exc))}\n"
+                "Её можно продолжить из списка рассылок.",
+            )
+        finally:
+            progress_task.cancel()
+            progress.sender = None
+            try:
+                await progress.refresh()
+            except Exception as exc:
+                logger.warning("Broadcast #%s final progress update failed: %s", job_id, exc)
+            if send_bot is not admin_bot:
+                await send_bot.session.close()
+            self._tasks.pop(job_id, None)
+
+    async def _notify_creator(self, job_id: int, admin_bot: Bot, text: str) -> None:
+        job = await broadcast_jobs_repo.get(job_id)
+        chat_id = int((job or {}).get("created_by") or 0)
+        if not chat_id:
+            return
+        try:
+            await admin_bot.send_message(chat_id, text)
+        except Exception as exc:
+            logger.warning("Failed to notify admin %s about broadcast #%s: %s", chat_id, job_id, exc)
+
+    async def _report(self, job_id: int, admin_bot: Bot) -> None:
+        job = await broadcast_jobs_repo.get(job_id)
+        if not job:
+            return
+        # Only time spent sending: pauses would understate the speed.
+        elapsed = float(job.get("running_seconds") or 0)
+        from_user_bot = bool(job["payload"].get("from_user_bot"))
+        lines = [
+            f"✅ Рассылка #{job_id} завершена.",
+            f"Отправлено от: {'user_bot' if from_user_bot else 'админ-бот'}",
+            f"Доставлено: {job['sent']}",
+            f"Ошибки: {job['failed']}",
+        ]
+        if elapsed > 0:
+            lines.append(
+                f"Время отправки: {_format_duration(elapsed)}, "
+                f"скорость: {job['sent'] / max(1.0, elapsed):.1f} сообщ./с"
+            )
+        reasons = await broadcast_jobs_repo.failure_reasons(job_id)
+        if reasons:
+            lines.append("")
+            lines.append("Причины ошибок:")
+            lines.extend(f"• {html.escape(reason)} — {count}" for reason, count in reasons)
+        await self._notify_creator(job_id, admin_bot, "\n".join(lines))
+
+
+broadcast_runner = BroadcastJobRunner()
@@ -0,0 +1,121 @@
+"""Concurrent sender for bulk Telegram messages."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BroadcastStats:
+    """Counters of one bulk send; safe to read while the send is running."""
+
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+    failures: list[tuple[int, str]] = field(default_factory=list)
+    reasons: Counter = field(default_factory=Counter)
+
+    @property
+    def done(self) -> int:
+        return self.sent + self.failed
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.total - self.done)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return max(0.0, end - self.started_at)
+
+    @property
+    def throughput(self) -> float:
+        """Delivered messages per second."""
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+
+class BroadcastSender:
+    """
+    Deliver one message to many chats through a pool of workers.
+
+    Pacing is left to the outbound gateway of the bot (`app.services.outbound`),
+    which also pauses the token on flood wait; a TelegramRetryAfter that gets
+    through requeues the chat, up to `max_retries` times.
+    """
+
+    def __init__(
+        self,
+        send_one: Callable[[int], Awaitable[None]],
+        *,
+        concurrency: int,
+        max_retries: int = 3,
+        describe_error: Callable[[Exception], str] = lambda exc: str(exc) or type(exc).__name__,
+        on_sent: Callable[[int], None] | None = None,
+        on_failed: Callable[[int, Exception], None] | None = None,
+    ):
+        self.send_one = send_one
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = max(0, int(max_retries))
+        self.describe_error = describe_error
+        self.on_sent = on_sent
+        self.on_failed = on_failed
+        self.stats = BroadcastStats()
+
+    def _fail(self, chat_id: int, reason: str) -> None:
+        self.stats.failed += 1
+        self.stats.failures.append((chat_id, reason))
+        self.stats.reasons[reason] += 1
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                chat_id, attempt = item
+                try:
+                    await self.send_one(chat_id)
+                    self.stats.sent += 1
+                    if self.on_sent is not None:
+                        self.on_sent(chat_id)
+                except TelegramRetryAfter:
+                    if attempt < self.max_retries:
+                        self.stats.retried += 1
+                        queue.put_nowait((chat_id, attempt + 1))
+                    else:
+                        self._fail(chat_id, "flood wait")
+                except Exception as exc:
+                    self._fail(chat_id, self.describe_error(exc))
+                    if self.on_failed is not None:
+                        self.on_failed(chat_id, exc)
+                    logger.warning("Bulk send tg_id=%s: %s", chat_id, exc)
+            finally:
+                queue.task_done()
+
+    async def run(self, chat_ids: list[int]) -> BroadcastStats:
+        self.stats = BroadcastStats(total=len(chat_ids))
+        queue: asyncio.Queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait((chat_id, 0))
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)]
+        try:
+            await queue.join()
+        finally:
+            for _ in workers:
+                queue.put_nowait(None)
+            await asyncio.gather(*workers, return_exceptions=True)
+            self.stats.finished_at = time.monotonic()
+        return self.stats
@@ -0,0 +1,31 @@
+"""
+admin_bot side of the outbound gateway.
+
+The gateway itself lives in `user_bot/utils/outbound.py` (both bots send
+through the user_bot token, so they must share one limiter and one flood
+pause); this module puts user_bot on the import path and wires the gateway
+to the aiosqlite repository. Bots created by `app.bot.factory` route every
+message-sending call through it; bulk senders tag their traffic with
+`outbound_priority(...)`.
+"""
+
+from __future__ import annotations
+
+from app.config.settings import settings
+from app.db.repo.outbound import outbound_pauses_repo
+from app.services.user_bot import ensure_user_bot_on_path
+
+ensure_user_bot_on_path()
+
+from utils.outbound import OutboundMiddleware, Priority, outbound_priority  # noqa: E402  (user_bot)
+
+__all__ = ["Priority", "create_outbound_middleware", "outbound_priority"]
+
+
+def create_outbound_middleware() -> OutboundMiddleware:
+    """Gateway middleware with admin_bot's limits and shared state repository."""
+    return OutboundMiddleware(
+        outbound_pauses_repo,
+        rate=settings.outbound_rate_per_second,
+        max_retries=settings.outbound_max_retries,
+    )
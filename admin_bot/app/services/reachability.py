@@ -0,0 +1,16 @@
+"""
+admin_bot side of chat reachability.
+
+Classifying delivery errors lives in `user_bot/utils/reachability.py`, so
+both bots mark the same chats unreachable for the same reasons.
+"""
+
+from __future__ import annotations
+
+from app.services.user_bot import ensure_user_bot_on_path
+
+ensure_user_bot_on_path()
+
+from utils.reachability import unreachable_reason  # noqa: E402  (user_bot)
+
+__all__ = ["unreachable_reason"]
@@ -302,6 +302,85 @@ async def get_all_telegram_ids() -> list[int]:
     return [int(row[0]) for row in rows if row and row[0] is not None]
 
 
+AUDIENCE_SEGMENTS: dict[str, str] = {
+    "all": "Все пользователи",
+    "active_paid": "Активная платная подписка",
+    "trial": "Пробный период",
+    "expired_7": "Подписка истекла ≤ 7 дней назад",
+    "expired_30": "Подписка истекла ≤ 30 дней назад",
+    "lte_buyers": "Покупали LTE",
+    "never_paid": "Ни разу не платили",
+    "referrers": "Приглашали друзей",
+}
+
+# Chats that blocked the bot are skipped until their re-probe time.
+_REACHABLE_CONDITION = (
+    "telegram_id NOT IN (SELECT tg_id FROM unreachable_chats WHERE next_probe_at > ?)"
+)
+
+def _segment_condition(segment: str, now_ts: int) -> tuple[str, tuple]:
+    """
+    SQL condition on `subscription` for an audience segment.
+
+    "Paid" uses the same heuristic as user_bot: the subscription was extended
+    beyond the initial trial period granted at signup.
+    """
+    trial_seconds = max(0, int(settings.trial_days)) * 24 * 60 * 60
+    paid = "(created_at > 0 AND subscription_ends > created_at + ?)"
+    if segment == "all":
+        return "1 = 1", ()
+    if segment == "active_paid":
+        return f"subscription_ends > ? AND {paid}", (now_ts, trial_seconds)
+    if segment == "trial":
+        return f"subscription_ends > ? AND NOT {paid}", (now_ts, trial_seconds)
+    if segment in ("expired_7", "expired_30"):
+        days = 7 if segment == "expired_7" else 30
+        return "subscription_ends > ? AND subscription_ends <= ?", (now_ts - days * 24 * 60 * 60, now_ts)
+    if segment == "lte_buyers":
+        return (
+            "telegram_id IN (SELECT tg_id FROM lte_traffic_limits "
+            "WHERE paid_balance_bytes > 0 OR cycle_paid_spent_bytes > 0)",
+            (),
+        )
+    if segment == "never_paid":
+        return f"NOT {paid}", (trial_seconds,)
+    if segment == "referrers":
+        return "referred_people > 0", ()
+    raise ValueError(f"Unknown audience segment: {segment}")
+
+
+async def get_segment_telegram_ids(segment: str) -> list[int]:
+    """Fetch distinct reachable telegram_id values of an audience segment."""
+    db_path = _get_db_path()
+    now_ts = int(datetime.now(timezone.utc).timestamp())
+    condition, params = _segment_condition(segment, now_ts)
+    async with aiosqlite.connect(db_path) as db:
+        await _ensure_subscription_table(db, db_path)
+        cursor = await db.execute(
+            "SELECT DISTINCT telegram_id FROM subscription "
+            f"WHERE telegram_id IS NOT NULL AND {condition} AND {_REACHABLE_CONDITION}",
+            (*params, now_ts),
+        )
+        rows = await cursor.fetchall()
+    return [int(row[0]) for row in rows if row and row[0] is not None]
+
+
+async def count_segment(segment: str) -> int:
+    """Number of distinct reachable users in an audience segment."""
+    db_path = _get_db_path()
+    now_ts = int(datetime.now(timezone.utc).timestamp())
+    condition, params = _segment_condition(segment, now_ts)
+    async with aiosqlite.connect(db_path) as db:
+        await _ensure_subscription_table(db, db_path)
+        cursor = await db.execute(
+            "SELECT COUNT(DISTINCT telegram_id) FROM subscription "
+            f"WHERE telegram_id IS NOT NULL AND {condition} AND {_REACHABLE_CONDITION}",
+            (*params, now_ts),
+        )
+        row = await cursor.fetchone()
+    return int(row[0] or 0) if row else 0
+
+
 async def get_subscription_ends_map() -> dict[int, int]:
     """
     Return {telegram_id: latest_subscription_ends_ts}.
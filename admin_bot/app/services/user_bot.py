@@ -0,0 +1,32 @@
+"""
+user_bot code reused by admin_bot.
+
+Both bots send through the user_bot token and work on the same SQLite file,
+so helpers owned by user_bot (the outbound gateway, reachability
+bookkeeping) are imported from there instead of being copied.
+"""
+
+from __future__ import annotations
+
+import sys
+
+from app.config.settings import settings
+
+_USER_BOT_DIR = str(settings.base_dir.parent / "user_bot")
+
+
+def ensure_user_bot_on_path() -> None:
+    """Make user_bot modules (`utils`, `data`) importable."""
+    if _USER_BOT_DIR not in sys.path:
+        # Appended, not prepended: admin_bot's own `app` package must win.
+        sys.path.append(_USER_BOT_DIR)
+
+
+ensure_user_bot_on_path()
+
+from data import db_utils  # noqa: E402  (user_bot)
+
+# On this side the shared file is configured by USER_BOT_DB_PATH.
+db_utils.DB_PATH = settings.user_bot_db_path
+
+__all__ = ["db_utils", "ensure_user_bot_on_path"]
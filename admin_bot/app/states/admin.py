@@ -89,6 +89,7 @@ class BroadcastState(StatesGroup):
     """States for broadcast."""
     content = State()
     buttons = State()
+    segment = State()
     confirm = State()
 
 
@@ -9,6 +9,7 @@ from app.bot.routers import get_all_routers
 from app.notify.log_setup import setup_logging
 from app.scheduler.setup import create_scheduler
 from app.db.sqlite import db
+from app.services.broadcast_jobs import broadcast_runner
 
 
 async def main() -> None:
@@ -26,6 +27,10 @@ async def main() -> None:
     scheduler.start()
     logger.info("Scheduler started.")
 
+    resumed = await broadcast_runner.resume_all(bot)
+    if resumed:
+        logger.info("Resumed %s broadcast job(s).", resumed)
+
     logger.info("Bot started.")
     try:
         await dp.start_polling(bot)
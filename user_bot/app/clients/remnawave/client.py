@@ -27,6 +27,8 @@ class RemnawaveClient:
         self._username = username
         self._password = password
         self._timeout_seconds = timeout_seconds
+        # Число HTTP-запросов к панели за время жизни клиента (включая login).
+        self.request_count = 0
 
     @property
     def _timeout(self) -> tuple[float, float]:
@@ -35,6 +37,10 @@ class RemnawaveClient:
         connect = float(min(_CONNECT_TIMEOUT_SECONDS, max(2, read)))
         return (connect, read)
 
+    def _send(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        self.request_count += 1
+        return requests.request(method, url, **kwargs)
+
     def _headers(self, token_override: str | None = None) -> dict[str, str]:
         token = token_override or self._token
         if not token:
@@ -46,7 +52,8 @@ class RemnawaveClient:
             raise ValueError("REMNAWAVE_USERNAME/REMNAWAVE_PASSWORD are not set")
 
         url = f"{self._base_url}/api/auth/login"
-        resp = requests.post(
+        resp = self._send(
+            "POST",
             url,
             json={"username": self._username, "password": self._password},
             timeout=self._timeout,
@@ -64,7 +71,8 @@ class RemnawaveClient:
     def get_user_by_username(self, username: str, token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/users/by-username/{username}"
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             url,
             headers=self._headers(token),
             timeout=self._timeout,
@@ -77,7 +85,8 @@ class RemnawaveClient:
     def create_user(self, payload: dict[str, Any], token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/users"
-        resp = requests.post(
+        resp = self._send(
+            "POST",
             url,
             headers=self._headers(token),
             json=payload,
@@ -86,7 +95,8 @@ class RemnawaveClient:
         if resp.status_code == 401 and self._username and self._password and token_override is None:
             logging.warning("[Remnawave] Token unauthorized on create_user, retrying after login")
             refreshed = self.login()
-            resp = requests.post(
+            resp = self._send(
+                "POST",
                 url,
                 headers=self._headers(refreshed),
                 json=payload,
@@ -106,7 +116,8 @@ class RemnawaveClient:
     def list_users(self, page: int = 1, size: int = 100, token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/users"
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             url,
             headers=self._headers(token),
             params={"page": page, "size": size, "limit": size},
@@ -118,7 +129,8 @@ class RemnawaveClient:
     def list_internal_squads(self, token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/internal-squads"
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             url,
             headers=self._headers(token),
             timeout=self._timeout,
@@ -129,7 +141,8 @@ class RemnawaveClient:
     def create_internal_squad(self, payload: dict[str, Any], token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/internal-squads"
-        resp = requests.post(
+        resp = self._send(
+            "POST",
             url,
             headers=self._headers(token),
             json=payload,
@@ -146,7 +159,8 @@ class RemnawaveClient:
     ) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/internal-squads/{squad_uuid}/bulk-actions/add-users"
-        resp = requests.post(
+        resp = self._send(
+            "POST",
             url,
             headers=self._headers(token),
             json={"userUuids": user_uuids},
@@ -163,7 +177,8 @@ class RemnawaveClient:
     ) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/users/bulk/update-squads"
-        resp = requests.post(
+        resp = self._send(
+            "POST",
             url,
             headers=self._headers(token),
             json={"uuids": user_uuids, "activeInternalSquads": squad_uuids},
@@ -171,6 +186,7 @@ class RemnawaveClient:
         )
         resp.raise_for_status()
         return resp.json()
+
     def remove_users_from_internal_squad(
         self,
         squad_uuid: str,
@@ -179,7 +195,8 @@ class RemnawaveClient:
     ) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/internal-squads/{squad_uuid}/bulk-actions/remove-users"
-        resp = requests.delete(
+        resp = self._send(
+            "DELETE",
             url,
             headers=self._headers(token),
             json={"userUuids": user_uuids},
@@ -191,7 +208,8 @@ class RemnawaveClient:
     def update_user(self, payload: dict[str, Any], token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/users"
-        resp = requests.patch(
+        resp = self._send(
+            "PATCH",
             url,
             headers=self._headers(token),
             json=payload,
@@ -203,7 +221,8 @@ class RemnawaveClient:
     def get_subscription_by_username(self, username: str, token_override: str | None = None) -> dict[str, Any]:
         token = token_override or self.ensure_token()
         url = f"{self._base_url}/api/subscriptions/by-username/{username}"
-        resp = requests.get(
+        resp = self._send(
+            "GET",
             url,
             headers=self._headers(token),
             timeout=self._timeout,
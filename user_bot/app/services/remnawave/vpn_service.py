@@ -8,7 +8,6 @@ from remnawave_api.models.users import CreateUserRequestDto
 from app.clients.remnawave.client import RemnawaveClient
 from app.config.settings import get_remnawave_settings
 from data import db_utils
-from data.db_utils import get_db, update_subscription_expire
 
 
 def _utc_iso_from_timestamp(timestamp: int) -> str:
@@ -182,14 +181,20 @@ def _internal_squad_index(squad: dict, prefix: str) -> int:
     return int(suffix) if suffix.isdigit() else 0
 
 
-def _get_or_create_internal_squad(client: RemnawaveClient, token: str) -> tuple[dict | None, bool]:
+def _get_or_create_internal_squad(
+    client: RemnawaveClient,
+    token: str,
+    squads: list[dict] | None = None,
+) -> tuple[dict | None, bool]:
     """Find or create a paid `internal-*` squad with capacity (excludes FREE/LTE).
 
     New users always land in the highest-indexed `internal-<N>` first; we only
-    fall back to older pools when the newer ones are saturated.
+    fall back to older pools when the newer ones are saturated. Pass `squads`
+    to reuse an already fetched squad list.
     """
     settings = get_remnawave_settings()
-    squads = _list_internal_squads(client, token)
+    if squads is None:
+        squads = _list_internal_squads(client, token)
     limit = settings.internal_squad_max_users
     prefix = settings.internal_squad_prefix
     paid_squads = [s for s in squads if _is_paid_internal_squad(s, prefix)]
@@ -245,27 +250,37 @@ def _assign_internal_squad_for_user(client: RemnawaveClient, response: dict) ->
         logging.error("[Remnawave] Failed to assign internal squad: %s", exc)
 
 
-def _restore_paid_squad_after_payment(client: RemnawaveClient, telegram_id: int) -> None:
+def _restore_paid_squad_after_payment(
+    client: RemnawaveClient,
+    telegram_id: int,
+    user: dict | None = None,
+    token: str | None = None,
+) -> None:
     """
     Promote user from FREE squad back to a paid internal squad after payment.
 
     Strategy:
-    - Read user's current squads.
-    - If user already has a paid `internal-*` squad → leave squads untouched.
+    - Read user's current squads (or take them from an already fetched `user`).
+    - If user already has a paid `internal-*` squad → leave squads untouched
+      (decided from squad names when the panel returns them, without
+      listing all squads).
     - Otherwise: pick a paid internal squad and replace `[FREE]` with `[paid]`.
     - LTE squad assignment is left to the traffic monitor.
     """
     settings = get_remnawave_settings()
     username = str(telegram_id)
     try:
-        token = client.ensure_token()
-        user_resp = client.get_user_by_username(username, token_override=token)
-        user = (user_resp or {}).get("response") or {}
+        token = token or client.ensure_token()
+        if user is None:
+            user_resp = client.get_user_by_username(username, token_override=token)
+            user = (user_resp or {}).get("response") or {}
         user_uuid = user.get("uuid")
         if not user_uuid:
             return
         active_squads = user.get("activeInternalSquads") or []
         current_uuids = [str(s.get("uuid")) for s in active_squads if s.get("uuid")]
+        if any(_is_paid_internal_squad(s, settings.internal_squad_prefix) for s in active_squads):
+            return
 
         all_squads = _list_internal_squads(client, token)
         paid_uuids = {
@@ -280,7 +295,7 @@ def _restore_paid_squad_after_payment(client: RemnawaveClient, telegram_id: int)
         if already_paid:
             return
 
-        squad, _created = _get_or_create_internal_squad(client, token)
+        squad, _created = _get_or_create_internal_squad(client, token, all_squads)
         target_uuid = str((squad or {}).get("uuid") or "")
         if not target_uuid:
             logging.warning("[Remnawave] No paid squad available for restore: tg=%s", telegram_id)
@@ -324,6 +339,10 @@ def create_vpn_user_by_telegram_id(telegram_id: int, days_to_add: int) -> bool:
     The argument is preserved for callers' compatibility.
     """
     del days_to_add  # kept for backwards compatibility
+    return _create_vpn_user(_client(), telegram_id)
+
+
+def _create_vpn_user(client: RemnawaveClient, telegram_id: int) -> bool:
     username = f"{telegram_id}"
     expire_at = _parse_infinite_expire_at()
     body = CreateUserRequestDto(
@@ -336,7 +355,6 @@ def create_vpn_user_by_telegram_id(telegram_id: int, days_to_add: int) -> bool:
     # Some API versions validate telegramId strictly as number.
     payload["telegramId"] = int(telegram_id)
     try:
-        client = _client()
         response = client.create_user(payload)
         _assign_internal_squad_for_user(client, response)
         logging.info("[Remnawave] User %s created.", username)
@@ -346,75 +364,118 @@ def create_vpn_user_by_telegram_id(telegram_id: int, days_to_add: int) -> bool:
         return False
 
 
-def _ensure_remnawave_user_for_extend(telegram_id: int, token: str) -> tuple[bool, str | None]:
+def _get_or_create_user_for_extend(
+    client: RemnawaveClient,
+    telegram_id: int,
+    token: str,
+) -> tuple[dict | None, str | None]:
     """
-    Ensure user exists in Remnawave before extension.
-    Returns (existed_or_created, error_message).
+    Fetch the panel user once for the extend path, creating it if missing.
+    Returns (user, error_message); user is None when the profile was just
+    created — it already has infinite expireAt and a paid squad.
     """
     username = f"{telegram_id}"
     try:
-        get_user_expire(username, token)
-        return True, None
+        response = client.get_user_by_username(username, token_override=token)
+        return (response or {}).get("response") or {}, None
     except ValueError as exc:
         if "User not found" not in str(exc):
             logging.error("[Remnawave] Ошибка получения профиля @%s: %s", username, exc)
-            return False, f"❌ Ошибка получения профиля @{username}."
+            return None, f"❌ Ошибка получения профиля @{username}."
 
         logging.info("[Remnawave] Пользователь @%s не найден, создаём профиль.", username)
-        created_ok = create_vpn_user_by_telegram_id(telegram_id, 0)
-        if not created_ok:
-            return False, f"❌ Не удалось создать пользователя @{username}."
-        return True, None
+        if not _create_vpn_user(client, telegram_id):
+            return None, f"❌ Не удалось создать пользователя @{username}."
+        return None, None
     except Exception as exc:
         logging.error("[Remnawave] Ошибка при проверке пользователя @%s: %s", username, exc)
-        return False, f"❌ Ошибка проверки пользователя @{username}."
+        return None, f"❌ Ошибка проверки пользователя @{username}."
+
+
+def _has_infinite_expire(user: dict) -> bool:
+    raw = user.get("expireAt")
+    if not raw:
+        return False
+    try:
+        return _timestamp_from_utc_iso(str(raw)) >= int(_parse_infinite_expire_at().timestamp())
+    except ValueError:
+        return False
+
 
+def _already_applied(source: str | None, username: str) -> str:
+    logging.info("[Remnawave] Credit %s for @%s already applied", source, username)
+    return f"ℹ️ Продление {source} для @{username} уже применено."
 
-def extend_subscription_by_telegram_id(telegram_id: int, days_to_add: int) -> str:
+
+def extend_subscription_by_telegram_id(
+    telegram_id: int,
+    days_to_add: int,
+    *,
+    payment_id: str | None = None,
+    promo_code: str | None = None,
+    jobs=(),
+) -> str:
     """
     Extend local subscription_ends by `days_to_add`.
 
     Panel's expireAt is held at INFINITE_EXPIRE_DATE: we never push the local
     end date to Remnawave. After updating the DB we promote the user back to a
     paid internal squad if they were demoted to FREE.
+
+    The panel user is fetched once and reused; the expireAt PATCH and the
+    squad restore only hit the panel when the state actually needs fixing.
+
+    With `payment_id` (or `promo_code` for a queued promo usage) the credit
+    is marked in the same DB transaction, together with the follow-up `jobs`,
+    and a credit that was already applied is not applied again (checked
+    before any panel request, and once more inside the transaction).
     """
     try:
         username = f"{telegram_id}"
         logging.info("[Remnawave] Extend subscription for @%s by %sd", username, days_to_add)
 
-        token = get_token(telegram_id)
-        ensured, ensure_error = _ensure_remnawave_user_for_extend(telegram_id, token)
+        if (payment_id and db_utils.is_payment_credited(payment_id)) or (
+            promo_code and not db_utils.is_promo_usage_pending(promo_code, telegram_id)
+        ):
+            return _already_applied(payment_id or promo_code, username)
+
+        client = _client()
+        token = client.ensure_token()
+        user, ensure_error = _get_or_create_user_for_extend(client, telegram_id, token)
         if ensure_error:
             return ensure_error
-        if not ensured:
-            return f"❌ Ошибка проверки пользователя @{username}."
 
         days_to_add = int(days_to_add)
-        if not db_utils.user_in_db(telegram_id):
-            db_utils.create_user_record(telegram_id, username)
-
-        user_row = db_utils.get_user_by_id(telegram_id)
-        current_local_expire = int(user_row["subscription_ends"]) if user_row else 0
-        new_expire = max(current_local_expire, int(time.time())) + days_to_add * 86400
-        update_subscription_expire(telegram_id, new_expire)
+        new_expire = db_utils.extend_subscription_ends(
+            telegram_id,
+            username,
+            days_to_add,
+            payment_id=payment_id,
+            promo_code=promo_code,
+            jobs=jobs,
+        )
+        if new_expire is None:
+            return _already_applied(payment_id or promo_code, username)
 
-        # Make sure panel still reports infinite expiration. This is idempotent:
-        # if the user was created with the old logic (real expireAt) we lift it
-        # to infinity here; for new users the patch is a no-op.
-        try:
-            payload = {"username": username, "expireAt": _infinite_expire_iso()}
-            _client().update_user(payload, token_override=token)
-        except Exception as exc:
-            logging.warning("[Remnawave] Failed to enforce infinite expireAt for @%s: %s", username, exc)
+        if user is not None:
+            # Users created with the old logic may still carry a real expireAt:
+            # lift it to infinity. Already-infinite users need no PATCH.
+            if not _has_infinite_expire(user):
+                try:
+                    payload = {"username": username, "expireAt": _infinite_expire_iso()}
+                    client.update_user(payload, token_override=token)
+                except Exception as exc:
+                    logging.warning("[Remnawave] Failed to enforce infinite expireAt for @%s: %s", username, exc)
 
-        # Bring user back from FREE squad immediately so they don't have to wait
-        # for the next subscription monitor cycle.
-        try:
-            _restore_paid_squad_after_payment(_client(), telegram_id)
-        except Exception as exc:
-            logging.warning("[Remnawave] Failed to restore paid squad for @%s: %s", username, exc)
+            # Bring user back from FREE squad immediately so they don't have to wait
+            # for the next subscription monitor cycle.
+            _restore_paid_squad_after_payment(client, telegram_id, user=user, token=token)
 
-        _reset_reminded_flag(telegram_id)
+        logging.info(
+            "[Remnawave] Extend @%s done: %s panel requests",
+            username,
+            client.request_count,
+        )
         return (
             f"✅ Подписка @{username} продлена на {days_to_add} дней.\n"
             f"📆 Новая дата окончания: "
@@ -442,9 +503,3 @@ def ensure_vpn_profile_created_if_missing(telegram_id: int) -> None:
         else:
             logging.error("[Remnawave] Ошибка при проверке профиля: %s", exc)
 
-
-def _reset_reminded_flag(username: int) -> None:
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE subscription SET reminded = 0 WHERE telegram_id = ?", (username,))
-        conn.commit()
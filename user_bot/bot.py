@@ -7,9 +7,13 @@ from aiogram import Bot, Dispatcher
 from aiogram.types import ErrorEvent
 from aiogram.exceptions import TelegramForbiddenError
 from data.event_logger import EventLogger           # ← NEW
+from utils.outbound import OutboundMiddleware
+from utils.outbound_store import db_outbound_store
+from utils.reachability import record_send_error
 from precache_videos import precache_videos, _load_cache
 from utils.reminders import reminders_scheduler
 from handlers.user_handlers import router as user_router
+from payments.yookassa_client import close_session as close_yookassa_session
 from middlewares.email_gate import EmailGateMiddleware
 
 # ── .env ──────────────────────────────────────────────────────────────
@@ -20,6 +24,10 @@ admin_ids_raw = os.getenv("ADMIN_IDS") or ""
 ADMIN_ID = int(admin_ids_raw.split(",")[0].strip() or "0")
 
 bot = Bot(token=USER_BOT_TOKEN)
+# Every send from this process (handlers, reminders, payment webhook) shares
+# one prioritized rate limiter per token; the budget is split with the other
+# processes sending through it (webhook workers, admin_bot).
+bot.session.middleware(OutboundMiddleware(db_outbound_store))
 dp  = Dispatcher()
 VIDEO_ID_CACHE: dict = {}
 reminders_task: asyncio.Task | None = None
@@ -69,12 +77,19 @@ async def on_shutdown(dispatcher: Dispatcher) -> None:
         except asyncio.CancelledError:
             pass
     await evlog.shutdown()
+    await close_yookassa_session()
 
 
 @dp.error()
 async def ignored_blocked_users(event: ErrorEvent) -> bool:
     if isinstance(event.exception, TelegramForbiddenError):
         logging.warning("Telegram user blocked bot; skipping update: %s", event.exception)
+        try:
+            user = getattr(event.update.event, "from_user", None)
+        except Exception:
+            user = None
+        if user is not None:
+            await asyncio.to_thread(record_send_error, user.id, event.exception)
         return True
     return False
 
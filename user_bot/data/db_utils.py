@@ -1,10 +1,14 @@
+import json
 import sqlite3
+import threading
 import time
 import logging
 import random
 import string
 import os
+from datetime import datetime
 from pathlib import Path
+from zoneinfo import ZoneInfo
 
 from dotenv import load_dotenv
 from contextlib import contextmanager
@@ -13,16 +17,33 @@ ROOT_DIR = Path(__file__).resolve().parents[2]
 load_dotenv(dotenv_path=ROOT_DIR / ".env")
 DEFAULT_DB_PATH = Path(__file__).resolve().parent / "subscription.db"
 DB_PATH = os.getenv("DB_PATH", str(DEFAULT_DB_PATH))
+REACHABILITY_PROBE_BASE_DAYS = int(os.getenv("REACHABILITY_PROBE_BASE_DAYS", "7"))
+REACHABILITY_PROBE_MAX_DAYS = int(os.getenv("REACHABILITY_PROBE_MAX_DAYS", "60"))
+# How long a payment claim holds; longer than any crediting run, so a crashed
+# handler does not block the payment forever.
+PAYMENT_CLAIM_LEASE_SECONDS = int(os.getenv("PAYMENT_CLAIM_LEASE_SECONDS", "300"))
+# Payment statuses that can still turn into `succeeded` on the YooKassa side.
+PAYMENT_OPEN_STATUSES = ("", "pending", "waiting_for_capture", "processing_error")
+# Revenue rollups are bucketed by Moscow calendar day, like the admin reports.
+REVENUE_TZ = ZoneInfo("Europe/Moscow")
+# Upper bounds (ms) of the payment stage latency histogram buckets; -1 is +Inf.
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 30000)
+# Bulk senders skip chats that blocked the bot until their re-probe time;
+# format with the telegram_id column and bind the current timestamp.
+REACHABLE_SQL = "{column} NOT IN (SELECT tg_id FROM unreachable_chats WHERE next_probe_at > ?)"
 _db = None
+# The schema is checked once per process, by the first connection.
+_schema_ready = False
+_schema_lock = threading.Lock()
 
 @contextmanager
 def get_db():
     if not DB_PATH:
         raise RuntimeError("DB_PATH is not set and default path is empty.")
     conn = sqlite3.connect(DB_PATH)
-    conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA busy_timeout = 5000")
-    _ensure_schema(conn)
+    if not _schema_ready:
+        _prepare_db(conn)
     try:
         yield conn
     finally:
@@ -145,6 +166,47 @@ def save_promo_usage(code: str, user_id: int):
         cursor.execute("INSERT INTO promo_usage (code, telegram_id) VALUES (?, ?)", (code, user_id))
         conn.commit()
 
+def save_promo_usage_with_job(code: str, user_id: int, kind: str, payload: dict, dedupe_key: str) -> bool:
+    """
+    Record the promo usage as pending and enqueue the job that applies it in
+    one transaction. Returns False if the job (same dedupe_key) was already queued.
+    """
+    with get_db() as conn:
+        conn.execute(
+            "INSERT INTO promo_usage (code, telegram_id, apply_pending) VALUES (?, ?, 1)",
+            (code, user_id),
+        )
+        queued = _insert_job(conn, kind, payload, dedupe_key)
+        conn.commit()
+        return queued
+
+def create_gift_promo_once(code: str, days: int, creator_id: int, *, payment_id: str | None = None) -> bool:
+    """
+    Create a gift promo and count it for the creator, unless the code already
+    exists (a retried job) or `payment_id` was already credited.
+    Returns True if the promo was created now.
+    """
+    with get_db() as conn:
+        if payment_id and not _mark_payment_credited(conn, payment_id):
+            return False
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO promo_codes (code, type, value, is_active, one_time, creator_id)
+            SELECT ?, 'gift', ?, 1, 1, ?
+            WHERE NOT EXISTS (SELECT 1 FROM promo_codes WHERE code = ?)
+            """,
+            (code, days, creator_id, code)
+        )
+        created = cursor.rowcount > 0
+        if created:
+            cursor.execute(
+                "UPDATE subscription SET gifted_subscriptions = gifted_subscriptions + 1 WHERE telegram_id = ?",
+                (creator_id,)
+            )
+        conn.commit()
+        return created
+
 def update_telegram_tag(telegram_id: int, telegram_tag: str):
     """Обновляет поле telegram_tag для пользователя по telegram_id."""
     with get_db() as conn:
@@ -196,11 +258,11 @@ def update_payment_status(payment_id: str, new_status: str):
             (payment_id, new_status, now_ts, now_ts),
         )
 
-        # Обновляем статус и время обновления
+        # Обновляем статус и время обновления; зачисленный платёж остаётся succeeded
         cursor.execute("""
             UPDATE payments
             SET status = ?, updated_at = ?
-            WHERE payment_id = ?
+            WHERE payment_id = ? AND COALESCE(credited_at, 0) = 0
         """, (new_status, now_ts, payment_id))
 
         conn.commit()
@@ -214,6 +276,168 @@ def get_payment_status(payment_id: str) -> str | None:
         return row[0] if row else None
 
 
+def claim_payment(payment_id: str, lease_seconds: int = PAYMENT_CLAIM_LEASE_SECONDS) -> bool:
+    """
+    Atomically take a payment for crediting: only one caller wins, whichever
+    entry point (bot webhook, web API) it comes from. A claim whose lease
+    expired (crashed worker) can be taken over.
+    """
+    now_ts = int(time.time())
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO payments (payment_id, status, created_at, updated_at)
+            VALUES (?, '', ?, ?)
+            """,
+            (payment_id, now_ts, now_ts),
+        )
+        cursor = conn.execute(
+            """
+            UPDATE payments
+            SET status = 'processing', locked_until = ?, updated_at = ?
+            WHERE payment_id = ?
+              AND COALESCE(credited_at, 0) = 0
+              AND (status NOT IN ('processing', 'succeeded')
+                   OR (status = 'processing' AND locked_until <= ?))
+            """,
+            (now_ts + lease_seconds, now_ts, payment_id, now_ts),
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def release_payment_claim(payment_id: str, status: str = "processing_error") -> None:
+    """
+    Drop a claim that did not end in a final status, so a retry can take it.
+    A credited payment is never reopened.
+    """
+    with get_db() as conn:
+        conn.execute(
+            """
+            UPDATE payments
+            SET status = ?, locked_until = 0, updated_at = ?
+            WHERE payment_id = ? AND status = 'processing' AND COALESCE(credited_at, 0) = 0
+            """,
+            (status, int(time.time()), payment_id),
+        )
+        conn.commit()
+
+
+def _mark_payment_credited(conn: sqlite3.Connection, payment_id: str) -> bool:
+    """
+    Mark a payment as credited inside the caller's transaction. Returns False
+    if it already was, in which case the caller must not credit again.
+    """
+    now_ts = int(time.time())
+    conn.execute(
+        "INSERT OR IGNORE INTO payments (payment_id, status, created_at, updated_at) VALUES (?, '', ?, ?)",
+        (payment_id, now_ts, now_ts),
+    )
+    cursor = conn.execute(
+        """
+        UPDATE payments
+        SET status = 'succeeded', credited_at = ?, locked_until = 0, updated_at = ?
+        WHERE payment_id = ? AND COALESCE(credited_at, 0) = 0
+        """,
+        (now_ts, now_ts, payment_id),
+    )
+    return cursor.rowcount > 0
+
+
+def _mark_promo_applied(conn: sqlite3.Connection, code: str, telegram_id: int) -> bool:
+    """Flip a pending promo usage to applied; False if it was applied already."""
+    cursor = conn.execute(
+        "UPDATE promo_usage SET apply_pending = 0 WHERE code = ? AND telegram_id = ? AND apply_pending = 1",
+        (code, telegram_id),
+    )
+    return cursor.rowcount > 0
+
+
+def _insert_jobs(conn: sqlite3.Connection, jobs) -> None:
+    for kind, payload, key in jobs:
+        _insert_job(conn, kind, payload, key)
+
+
+def is_payment_credited(payment_id: str) -> bool:
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT credited_at FROM payments WHERE payment_id = ?", (payment_id,)
+        ).fetchone()
+    return bool(row and row[0])
+
+
+def is_promo_usage_pending(code: str, telegram_id: int) -> bool:
+    """True while a queued promo usage still waits to be applied."""
+    with get_db() as conn:
+        row = conn.execute(
+            "SELECT 1 FROM promo_usage WHERE code = ? AND telegram_id = ? AND apply_pending = 1",
+            (code, telegram_id),
+        ).fetchone()
+    return row is not None
+
+
+def credit_payment(payment_id: str, *, jobs=()) -> bool:
+    """
+    Record a credit that has no balance change of its own (e.g. a queued
+    gift) together with its `jobs`; nothing is queued if it was credited already.
+    """
+    with get_db() as conn:
+        credited = _mark_payment_credited(conn, payment_id)
+        if credited:
+            _insert_jobs(conn, jobs)
+        conn.commit()
+        return credited
+
+
+def settle_payment(payment_id: str, *, jobs=()) -> None:
+    """
+    Close a paid payment that could not be credited (status `succeeded`,
+    no credited marker) and queue its error notifications in one transaction.
+    """
+    now_ts = int(time.time())
+    with get_db() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO payments (payment_id, status, created_at, updated_at) VALUES (?, '', ?, ?)",
+            (payment_id, now_ts, now_ts),
+        )
+        conn.execute(
+            "UPDATE payments SET status = 'succeeded', locked_until = 0, updated_at = ? WHERE payment_id = ?",
+            (now_ts, payment_id),
+        )
+        _insert_jobs(conn, jobs)
+        conn.commit()
+
+
+def get_stale_open_payments(
+    updated_before: int, updated_after: int, limit: int
+) -> list[tuple[str, str]]:
+    """Open payments last touched in (updated_after, updated_before), oldest first."""
+    placeholders = ", ".join("?" for _ in PAYMENT_OPEN_STATUSES)
+    with get_db() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT payment_id, status FROM payments
+            WHERE status IN ({placeholders})
+              AND updated_at > ? AND updated_at < ?
+            ORDER BY updated_at
+            LIMIT ?
+            """,
+            (*PAYMENT_OPEN_STATUSES, updated_after, updated_before, limit),
+        ).fetchall()
+    return [(str(row[0]), str(row[1] or "")) for row in rows]
+
+
+def refresh_payment_status(payment_id: str, expected: str, new_status: str) -> bool:
+    """Store a status seen at YooKassa unless someone changed the row meanwhile."""
+    with get_db() as conn:
+        cursor = conn.execute(
+            "UPDATE payments SET status = ?, updated_at = ? WHERE payment_id = ? AND status = ?",
+            (new_status, int(time.time()), payment_id, expected),
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
 def _ensure_payments_table(conn: sqlite3.Connection) -> None:
     _ensure_table(
         conn,
@@ -224,14 +448,29 @@ def _ensure_payments_table(conn: sqlite3.Connection) -> None:
             "status": "TEXT",
             "created_at": "INTEGER",
             "updated_at": "INTEGER",
+            "locked_until": "INTEGER",
+            "credited_at": "INTEGER",
         },
-        defaults={"status": "", "created_at": 0, "updated_at": 0},
+        defaults={"status": "", "created_at": 0, "updated_at": 0, "locked_until": 0, "credited_at": 0},
         indexes=[
-            "CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_payment_id ON payments(payment_id)"
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_payments_payment_id ON payments(payment_id)",
+            "CREATE INDEX IF NOT EXISTS idx_payments_status_updated ON payments(status, updated_at)",
         ],
     )
 
 
+def _prepare_db(conn: sqlite3.Connection) -> None:
+    global _schema_ready
+    with _schema_lock:
+        if _schema_ready:
+            return
+        # WAL is a property of the database file, so setting it once is enough.
+        conn.execute("PRAGMA journal_mode=WAL")
+        _ensure_schema(conn)
+        conn.commit()
+        _schema_ready = True
+
+
 def _ensure_schema(conn: sqlite3.Connection) -> None:
     _ensure_table(
         conn,
@@ -247,6 +486,7 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
             "gifted_subscriptions": "INTEGER",
             "reminded": "INTEGER",
             "nurture_stage": "INTEGER",
+            "nurture_sent_at": "INTEGER",
             "created_at": "INTEGER",
             "email": "TEXT",
         },
@@ -258,9 +498,17 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
             "gifted_subscriptions": 0,
             "reminded": 0,
             "nurture_stage": 0,
+            "nurture_sent_at": 0,
             "created_at": 0,
             "email": "",
         },
+        indexes=[
+            "CREATE INDEX IF NOT EXISTS idx_subscription_telegram_id ON subscription(telegram_id)",
+            "CREATE INDEX IF NOT EXISTS idx_subscription_ends ON subscription(subscription_ends)",
+            "CREATE INDEX IF NOT EXISTS idx_subscription_referred_people ON subscription(referred_people)",
+            "CREATE INDEX IF NOT EXISTS idx_subscription_reminded_ends ON subscription(reminded, subscription_ends)",
+            "CREATE INDEX IF NOT EXISTS idx_subscription_nurture_created ON subscription(nurture_stage, created_at)",
+        ],
     )
     _ensure_table(
         conn,
@@ -286,8 +534,9 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
             "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
             "code": "TEXT",
             "telegram_id": "INTEGER",
+            "apply_pending": "INTEGER",
         },
-        defaults={"telegram_id": 0},
+        defaults={"telegram_id": 0, "apply_pending": 0},
         indexes=[
             "CREATE INDEX IF NOT EXISTS idx_promo_usage_code ON promo_usage(code)",
             "CREATE INDEX IF NOT EXISTS idx_promo_usage_telegram_id ON promo_usage(telegram_id)",
@@ -320,7 +569,163 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
             "updated_at": 0,
         },
         indexes=[
-            "CREATE UNIQUE INDEX IF NOT EXISTS idx_lte_traffic_limits_tg_id ON lte_traffic_limits(tg_id)"
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_lte_traffic_limits_tg_id ON lte_traffic_limits(tg_id)",
+            "CREATE INDEX IF NOT EXISTS idx_lte_traffic_limits_notified_low "
+            "ON lte_traffic_limits(notified_lte_low, last_remaining_bytes)",
+            "CREATE INDEX IF NOT EXISTS idx_lte_traffic_limits_notified_zero "
+            "ON lte_traffic_limits(notified_lte_zero, last_remaining_bytes)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "lte_usage_daily",
+        {
+            "tg_id": "INTEGER NOT NULL",
+            "day": "TEXT NOT NULL",
+            "node_uuid": "TEXT NOT NULL DEFAULT ''",
+            "bytes": "INTEGER NOT NULL DEFAULT 0",
+            "updated_at": "TIMESTAMP",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_lte_usage_daily_key ON lte_usage_daily(tg_id, day, node_uuid)",
+            "CREATE INDEX IF NOT EXISTS idx_lte_usage_daily_day ON lte_usage_daily(day)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "unreachable_chats",
+        {
+            "tg_id": "INTEGER PRIMARY KEY",
+            "reason": "TEXT NOT NULL DEFAULT ''",
+            "failures": "INTEGER NOT NULL DEFAULT 0",
+            "first_failed_at": "INTEGER NOT NULL DEFAULT 0",
+            "last_failed_at": "INTEGER NOT NULL DEFAULT 0",
+            "next_probe_at": "INTEGER NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE INDEX IF NOT EXISTS idx_unreachable_chats_next_probe ON unreachable_chats(next_probe_at)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "outbound_pauses",
+        {
+            "bot_id": "INTEGER PRIMARY KEY",
+            "paused_until": "REAL NOT NULL DEFAULT 0",
+            "updated_at": "INTEGER NOT NULL DEFAULT 0",
+        },
+    )
+    _ensure_table(
+        conn,
+        "outbound_peers",
+        {
+            "bot_id": "INTEGER NOT NULL",
+            "peer": "TEXT NOT NULL",
+            "seen_at": "REAL NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_outbound_peers_bot_peer "
+            "ON outbound_peers(bot_id, peer)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "monitor_cursors",
+        {
+            "name": "TEXT PRIMARY KEY",
+            "value": "TEXT NOT NULL DEFAULT ''",
+            "updated_at": "TIMESTAMP DEFAULT CURRENT_TIMESTAMP",
+        },
+    )
+    _ensure_table(
+        conn,
+        "payment_events",
+        {
+            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+            "payment_id": "TEXT NOT NULL",
+            "event": "TEXT NOT NULL DEFAULT ''",
+            "payload": "TEXT NOT NULL DEFAULT ''",
+            "status": "TEXT NOT NULL DEFAULT 'pending'",
+            "attempts": "INTEGER NOT NULL DEFAULT 0",
+            "next_attempt_at": "INTEGER NOT NULL DEFAULT 0",
+            "locked_until": "INTEGER NOT NULL DEFAULT 0",
+            "last_error": "TEXT NOT NULL DEFAULT ''",
+            "created_at": "INTEGER NOT NULL DEFAULT 0",
+            "updated_at": "INTEGER NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_events_key ON payment_events(payment_id, event)",
+            "CREATE INDEX IF NOT EXISTS idx_payment_events_due ON payment_events(status, next_attempt_at)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "payment_latency",
+        {
+            "path": "TEXT NOT NULL",
+            "stage": "TEXT NOT NULL",
+            "le_ms": "INTEGER NOT NULL",
+            "count": "INTEGER NOT NULL DEFAULT 0",
+            "sum_ms": "REAL NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_latency_key ON payment_latency(path, stage, le_ms)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "payment_ledger",
+        {
+            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+            "payment_id": "TEXT NOT NULL",
+            "event": "TEXT NOT NULL",
+            "telegram_id": "INTEGER NOT NULL DEFAULT 0",
+            "purchase_type": "TEXT NOT NULL DEFAULT ''",
+            "amount_kopecks": "INTEGER NOT NULL DEFAULT 0",
+            "currency": "TEXT NOT NULL DEFAULT 'RUB'",
+            "days": "INTEGER NOT NULL DEFAULT 0",
+            "lte_gb": "INTEGER NOT NULL DEFAULT 0",
+            "source": "TEXT NOT NULL DEFAULT ''",
+            "created_at": "INTEGER NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_ledger_event ON payment_ledger(payment_id, event)",
+            "CREATE INDEX IF NOT EXISTS idx_payment_ledger_user ON payment_ledger(telegram_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_payment_ledger_type ON payment_ledger(purchase_type, created_at)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "revenue_daily",
+        {
+            "day": "TEXT NOT NULL",
+            "purchase_type": "TEXT NOT NULL",
+            "payments": "INTEGER NOT NULL DEFAULT 0",
+            "amount_kopecks": "INTEGER NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_revenue_daily_key ON revenue_daily(day, purchase_type)",
+        ],
+    )
+    _ensure_table(
+        conn,
+        "background_jobs",
+        {
+            "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+            "kind": "TEXT NOT NULL",
+            "dedupe_key": "TEXT",
+            "payload": "TEXT NOT NULL DEFAULT '{}'",
+            "status": "TEXT NOT NULL DEFAULT 'pending'",
+            "attempts": "INTEGER NOT NULL DEFAULT 0",
+            "next_attempt_at": "INTEGER NOT NULL DEFAULT 0",
+            "locked_until": "INTEGER NOT NULL DEFAULT 0",
+            "last_error": "TEXT NOT NULL DEFAULT ''",
+            "created_at": "INTEGER NOT NULL DEFAULT 0",
+            "updated_at": "INTEGER NOT NULL DEFAULT 0",
+        },
+        indexes=[
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_background_jobs_dedupe ON background_jobs(dedupe_key)",
+            "CREATE INDEX IF NOT EXISTS idx_background_jobs_due ON background_jobs(status, next_attempt_at)",
         ],
     )
     _ensure_payments_table(conn)
@@ -380,13 +785,80 @@ def update_subscription_expire(telegram_id: int, new_expire: int):
         logging.error("Ошибка обновления срока подписки для telegram_id %s: %s", telegram_id, e)
 
 
-def add_lte_paid_gb(telegram_id: int, gb_amount: int) -> None:
-    """Increase purchased LTE balance for user."""
+def extend_subscription_ends(
+    telegram_id: int,
+    username: str,
+    days_to_add: int,
+    *,
+    payment_id: str | None = None,
+    promo_code: str | None = None,
+    jobs=(),
+) -> int | None:
+    """
+    Create the user row if missing, push subscription_ends by `days_to_add`
+    from max(current end, now) and clear `reminded` — all in one transaction.
+    With `payment_id` (or `promo_code`, a pending promo usage) the credited
+    marker and `jobs` are written in that transaction too, and an already
+    applied credit is not extended again (returns None).
+    Returns the new end timestamp.
+    """
+    now_ts = int(time.time())
+    with get_db() as conn:
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if (payment_id and not _mark_payment_credited(conn, payment_id)) or (
+                promo_code and not _mark_promo_applied(conn, promo_code, telegram_id)
+            ):
+                conn.execute("ROLLBACK")
+                return None
+            conn.execute(
+                """
+                INSERT INTO subscription
+                    (telegram_id, telegram_tag, subscription_ends, reminded, nurture_stage, created_at)
+                SELECT ?, ?, 0, 0, 0, ?
+                WHERE NOT EXISTS (SELECT 1 FROM subscription WHERE telegram_id = ?)
+                """,
+                (telegram_id, username, now_ts, telegram_id),
+            )
+            row = conn.execute(
+                "SELECT subscription_ends FROM subscription WHERE telegram_id = ?",
+                (telegram_id,),
+            ).fetchone()
+            current_expire = int(row[0] or 0) if row else 0
+            new_expire = max(current_expire, now_ts) + int(days_to_add) * 86400
+            conn.execute(
+                "UPDATE subscription SET subscription_ends = ?, reminded = 0 WHERE telegram_id = ?",
+                (new_expire, telegram_id),
+            )
+            _insert_jobs(conn, jobs)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    logging.info("Срок подписки обновлён для telegram_id: %s, новый expire: %s", telegram_id, new_expire)
+    return new_expire
+
+
+def add_lte_paid_gb(
+    telegram_id: int,
+    gb_amount: int,
+    *,
+    payment_id: str | None = None,
+    jobs=(),
+) -> bool:
+    """
+    Increase purchased LTE balance for user. With `payment_id` the balance is
+    added once per payment (the credit marker and `jobs` are written in the
+    same transaction); returns False if nothing was added.
+    """
     if gb_amount <= 0:
-        return
+        return False
     bytes_to_add = int(gb_amount) * 1024 * 1024 * 1024
     now_ts = int(time.time())
     with get_db() as conn:
+        if payment_id and not _mark_payment_credited(conn, payment_id):
+            return False
         cursor = conn.cursor()
         cursor.execute(
             """
@@ -400,7 +872,9 @@ def add_lte_paid_gb(telegram_id: int, gb_amount: int) -> None:
             """,
             (telegram_id, bytes_to_add, now_ts),
         )
+        _insert_jobs(conn, jobs)
         conn.commit()
+        return True
 
 
 def get_lte_remaining_bytes(telegram_id: int, free_gb: int = 1) -> int:
@@ -430,3 +904,496 @@ def get_lte_remaining_bytes(telegram_id: int, free_gb: int = 1) -> int:
             return last_remaining
         paid_balance = int(row["paid_balance_bytes"] or 0)
         return max(0, free_bytes + paid_balance)
+
+
+def get_lte_usage_daily(telegram_id: int, since_day: str) -> list[tuple[str, int]]:
+    """
+    Return [(day, bytes)] of LTE usage from the daily rollup, oldest first.
+
+    The rollup is maintained by the admin_bot LTE monitor; days without
+    traffic are absent.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT day, SUM(bytes)
+            FROM lte_usage_daily
+            WHERE tg_id = ? AND day >= ?
+            GROUP BY day
+            ORDER BY day
+            """,
+            (telegram_id, since_day),
+        )
+        return [(str(row[0]), int(row[1] or 0)) for row in cursor.fetchall()]
+
+
+def mark_chat_unreachable(telegram_id: int, reason: str, now: int | None = None) -> None:
+    """
+    Record that a chat blocked the bot (or is gone). The chat is skipped by
+    bulk senders until `next_probe_at`; the delay doubles per failure.
+    """
+    mark_chats_unreachable([(telegram_id, reason)], now)
+
+
+def mark_chats_unreachable(failures: list[tuple[int, str]], now: int | None = None) -> None:
+    """`mark_chat_unreachable` for many (telegram_id, reason) pairs in one transaction."""
+    if not failures:
+        return
+    now = int(now if now is not None else time.time())
+    base = max(1, REACHABILITY_PROBE_BASE_DAYS) * 86400
+    cap = max(base, max(1, REACHABILITY_PROBE_MAX_DAYS) * 86400)
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO unreachable_chats
+                (tg_id, reason, failures, first_failed_at, last_failed_at, next_probe_at)
+            VALUES (?, ?, 1, ?, ?, ?)
+            ON CONFLICT(tg_id) DO UPDATE SET
+                reason = excluded.reason,
+                last_failed_at = excluded.last_failed_at,
+                next_probe_at = excluded.last_failed_at + MIN(?, ? * (1 << MIN(failures, 10))),
+                failures = failures + 1
+            """,
+            [
+                (int(telegram_id), reason, now, now, now + base, cap, base)
+                for telegram_id, reason in failures
+            ],
+        )
+        conn.commit()
+
+
+def mark_chat_reachable(telegram_id: int) -> None:
+    """Forget a previous delivery failure, e.g. after the user pressed /start again."""
+    with get_db() as conn:
+        conn.execute("DELETE FROM unreachable_chats WHERE tg_id = ?", (telegram_id,))
+        conn.commit()
+
+
+def sync_outbound_peer(bot_id: int, peer: str, now: float, active_since: float) -> tuple[float, int]:
+    """
+    Heartbeat one sending process of a bot token and return the shared state:
+    (unix time the token is paused until, number of processes sending now).
+    """
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO outbound_peers (bot_id, peer, seen_at) VALUES (?, ?, ?)
+            ON CONFLICT(bot_id, peer) DO UPDATE SET seen_at = excluded.seen_at
+            """,
+            (bot_id, peer, now),
+        )
+        conn.execute(
+            "DELETE FROM outbound_peers WHERE bot_id = ? AND seen_at < ?",
+            (bot_id, active_since),
+        )
+        peers = conn.execute(
+            "SELECT COUNT(*) FROM outbound_peers WHERE bot_id = ?", (bot_id,)
+        ).fetchone()[0]
+        row = conn.execute(
+            "SELECT paused_until FROM outbound_pauses WHERE bot_id = ?", (bot_id,)
+        ).fetchone()
+        conn.commit()
+    return (float(row[0] or 0) if row else 0.0), int(peers)
+
+
+def set_outbound_pause(bot_id: int, paused_until: float) -> None:
+    """Share a flood-wait pause with every process sending through this token."""
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO outbound_pauses (bot_id, paused_until, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(bot_id) DO UPDATE SET
+                paused_until = MAX(paused_until, excluded.paused_until),
+                updated_at = excluded.updated_at
+            """,
+            (bot_id, paused_until, int(time.time())),
+        )
+        conn.commit()
+
+
+def get_cursor(name: str, default: str = "") -> str:
+    """Named progress marker shared with admin_bot jobs (`monitor_cursors`)."""
+    with get_db() as conn:
+        row = conn.execute("SELECT value FROM monitor_cursors WHERE name = ?", (name,)).fetchone()
+    return str(row[0]) if row else default
+
+
+def claim_periodic_run(name: str, interval_seconds: int, now: int | None = None) -> bool:
+    """
+    Let exactly one process run a periodic job per interval: the cursor
+    holds the last start time and only the caller that advances it wins.
+    """
+    now = int(now if now is not None else time.time())
+    with get_db() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO monitor_cursors (name, value, updated_at) VALUES (?, '0', CURRENT_TIMESTAMP)",
+            (name,),
+        )
+        cursor = conn.execute(
+            """
+            UPDATE monitor_cursors
+            SET value = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE name = ? AND CAST(value AS INTEGER) <= ?
+            """,
+            (str(now), name, now - interval_seconds),
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def set_cursor(name: str, value: str) -> None:
+    with get_db() as conn:
+        conn.execute(
+            """
+            INSERT INTO monitor_cursors (name, value, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(name) DO UPDATE SET
+                value = excluded.value,
+                updated_at = CURRENT_TIMESTAMP
+            """,
+            (name, str(value)),
+        )
+        conn.commit()
+
+
+def enqueue_payment_event(payment_id: str, event: str, payload: str) -> bool:
+    """
+    Persist a YooKassa notification for the payment workers. Redeliveries of
+    the same (payment_id, event) are ignored; returns False for those.
+    """
+    now_ts = int(time.time())
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            INSERT OR IGNORE INTO payment_events
+                (payment_id, event, payload, status, next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', ?, ?, ?)
+            """,
+            (payment_id, event, payload, now_ts, now_ts, now_ts),
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def requeue_payment_event(payment_id: str, event: str, payload: str) -> bool:
+    """
+    Like `enqueue_payment_event`, but also revives an event that already
+    finished or was dead-lettered. Returns False if it is still queued.
+    """
+    now_ts = int(time.time())
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO payment_events
+                (payment_id, event, payload, status, next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, 'pending', ?, ?, ?)
+            ON CONFLICT(payment_id, event) DO UPDATE SET
+                payload = excluded.payload,
+                status = 'pending',
+                attempts = 0,
+                next_attempt_at = excluded.next_attempt_at,
+                locked_until = 0,
+                updated_at = excluded.updated_at
+            WHERE status IN ('done', 'dead')
+            """,
+            (payment_id, event, payload, now_ts, now_ts, now_ts),
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+
+
+def claim_payment_events(limit: int, lease_seconds: int) -> list[sqlite3.Row]:
+    """
+    Lease up to `limit` due events. Events left `processing` by a crashed
+    worker become claimable again once their lease expires.
+    """
+    now_ts = int(time.time())
+    with get_db() as conn:
+        conn.row_factory = sqlite3.Row
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT id, payment_id, event, payload, attempts, created_at
+                FROM payment_events
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'processing' AND locked_until <= ?)
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+                """,
+                (now_ts, now_ts, limit),
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE payment_events
+                SET status = 'processing', attempts = attempts + 1,
+                    locked_until = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                [(now_ts + lease_seconds, now_ts, row["id"]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return rows
+
+
+def complete_payment_event(event_id: int) -> None:
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE payment_events SET status = 'done', last_error = '', updated_at = ? WHERE id = ?",
+            (int(time.time()), event_id),
+        )
+        conn.commit()
+
+
+def retry_payment_event(event_id: int, error: str, delay_seconds: int | None) -> None:
+    """Schedule another attempt in `delay_seconds`, or dead-letter the event when None."""
+    now_ts = int(time.time())
+    with get_db() as conn:
+        if delay_seconds is None:
+            conn.execute(
+                "UPDATE payment_events SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+                (error[:500], now_ts, event_id),
+            )
+        else:
+            conn.execute(
+                """
+                UPDATE payment_events
+                SET status = 'pending', next_attempt_at = ?, locked_until = 0,
+                    last_error = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (now_ts + delay_seconds, error[:500], now_ts, event_id),
+            )
+        conn.commit()
+
+
+def next_payment_event_at() -> int | None:
+    """Earliest time a pending or leased event becomes claimable."""
+    with get_db() as conn:
+        row = conn.execute(
+            """
+            SELECT MIN(due) FROM (
+                SELECT MIN(next_attempt_at) AS due FROM payment_events WHERE status = 'pending'
+                UNION ALL
+                SELECT MIN(locked_until) FROM payment_events WHERE status = 'processing'
+            )
+            """
+        ).fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def _insert_job(
+    conn: sqlite3.Connection,
+    kind: str,
+    payload: dict,
+    dedupe_key: str | None,
+) -> bool:
+    now_ts = int(time.time())
+    cursor = conn.execute(
+        """
+        INSERT OR IGNORE INTO background_jobs
+            (kind, dedupe_key, payload, status, next_attempt_at, created_at, updated_at)
+        VALUES (?, ?, ?, 'pending', ?, ?, ?)
+        """,
+        (kind, dedupe_key, json.dumps(payload, ensure_ascii=False), now_ts, now_ts, now_ts),
+    )
+    return cursor.rowcount > 0
+
+
+def enqueue_jobs(jobs: list[tuple[str, dict, str | None]]) -> int:
+    """
+    Store (kind, payload, dedupe_key) background jobs for the webhook process
+    workers in one transaction. A job whose `dedupe_key` is already known is
+    skipped; returns how many jobs were stored.
+    """
+    with get_db() as conn:
+        queued = sum(1 for kind, payload, key in jobs if _insert_job(conn, kind, payload, key))
+        conn.commit()
+        return queued
+
+
+def claim_jobs(limit: int, lease_seconds: int) -> list[sqlite3.Row]:
+    """Lease up to `limit` due jobs; expired leases make jobs claimable again."""
+    now_ts = int(time.time())
+    with get_db() as conn:
+        conn.row_factory = sqlite3.Row
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT id, kind, payload, attempts, created_at
+                FROM background_jobs
+                WHERE (status = 'pending' AND next_attempt_at <= ?)
+                   OR (status = 'processing' AND locked_until <= ?)
+                ORDER BY next_attempt_at, id
+                LIMIT ?
+                """,
+                (now_ts, now_ts, limit),
+            ).fetchall()
+            conn.executemany(
+                """
+                UPDATE background_jobs
+                SET status = 'processing', attempts = attempts + 1,
+                    locked_until = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                [(now_ts + lease_seconds, now_ts, row["id"]) for row in rows],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return rows
+
+
+def complete_job(job_id: int) -> None:
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE background_jobs SET status = 'done', last_error = '', updated_at = ? WHERE id = ?",
+            (int(time.time()), job_id),
+        )
+        conn.commit()
+
+
+def retry_job(job_id: int, error: str, delay_seconds: int | None) -> None:
+    """Schedule another attempt in `delay_seconds`, or dead-letter the job when None."""
+    now_ts = int(time.time())
+    with get_db() as conn:
+        if delay_seconds is None:
+            conn.execute(
+                "UPDATE background_jobs SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+                (error[:500], now_ts, job_id),
+            )
+        else:
+            conn.execute(
+                """
+                UPDATE background_jobs
+                SET status = 'pending', next_attempt_at = ?, locked_until = 0,
+                    last_error = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (now_ts + delay_seconds, error[:500], now_ts, job_id),
+            )
+        conn.commit()
+
+
+def next_job_at() -> int | None:
+    """Earliest time a pending or leased job becomes claimable."""
+    with get_db() as conn:
+        row = conn.execute(
+            """
+            SELECT MIN(due) FROM (
+                SELECT MIN(next_attempt_at) AS due FROM background_jobs WHERE status = 'pending'
+                UNION ALL
+                SELECT MIN(locked_until) FROM background_jobs WHERE status = 'processing'
+            )
+            """
+        ).fetchone()
+    return int(row[0]) if row and row[0] is not None else None
+
+
+def prune_queues(finished_before: int, peers_seen_before: float) -> tuple[int, int, int]:
+    """
+    Delete payment events and background jobs that finished (done or dead)
+    before `finished_before`, and outbound peers not seen since
+    `peers_seen_before`. Returns the deleted (events, jobs, peers) counts.
+    """
+    with get_db() as conn:
+        events = conn.execute(
+            "DELETE FROM payment_events WHERE status IN ('done', 'dead') AND updated_at < ?",
+            (finished_before,),
+        ).rowcount
+        jobs = conn.execute(
+            "DELETE FROM background_jobs WHERE status IN ('done', 'dead') AND updated_at < ?",
+            (finished_before,),
+        ).rowcount
+        peers = conn.execute(
+            "DELETE FROM outbound_peers WHERE seen_at < ?", (peers_seen_before,)
+        ).rowcount
+        conn.commit()
+    return events, jobs, peers
+
+
+def add_payment_latency(path: str, stages: dict[str, float]) -> None:
+    """Count stage durations (ms) into the shared histogram buckets."""
+    rows = []
+    for stage, elapsed_ms in stages.items():
+        le_ms = next((le for le in LATENCY_BUCKETS_MS if elapsed_ms <= le), -1)
+        rows.append((path, stage, le_ms, float(elapsed_ms)))
+    if not rows:
+        return
+    with get_db() as conn:
+        conn.executemany(
+            """
+            INSERT INTO payment_latency (path, stage, le_ms, count, sum_ms)
+            VALUES (?, ?, ?, 1, ?)
+            ON CONFLICT(path, stage, le_ms) DO UPDATE SET
+                count = count + 1,
+                sum_ms = sum_ms + excluded.sum_ms
+            """,
+            rows,
+        )
+        conn.commit()
+
+
+def get_payment_latency() -> list[tuple[str, str, int, int, float]]:
+    with get_db() as conn:
+        return conn.execute(
+            "SELECT path, stage, le_ms, count, sum_ms FROM payment_latency ORDER BY path, stage, le_ms"
+        ).fetchall()
+
+
+def append_payment_ledger(
+    payment_id: str,
+    event: str,
+    *,
+    telegram_id: int,
+    purchase_type: str,
+    amount_kopecks: int,
+    currency: str = "RUB",
+    days: int = 0,
+    lte_gb: int = 0,
+    source: str = "",
+    now: int | None = None,
+) -> bool:
+    """
+    Append one ledger entry (`created`, `succeeded`, ...). Repeats of the same
+    (payment_id, event) are ignored. A new `succeeded` entry is added to the
+    day's revenue rollup in the same transaction. Returns False for repeats.
+    """
+    now = int(now if now is not None else time.time())
+    with get_db() as conn:
+        cursor = conn.execute(
+            """
+            INSERT OR IGNORE INTO payment_ledger (
+                payment_id, event, telegram_id, purchase_type, amount_kopecks,
+                currency, days, lte_gb, source, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                payment_id, event, int(telegram_id), purchase_type, int(amount_kopecks),
+                currency, int(days), int(lte_gb), source, now,
+            ),
+        )
+        appended = cursor.rowcount > 0
+        if appended and event == "succeeded":
+            day = datetime.fromtimestamp(now, REVENUE_TZ).strftime("%Y-%m-%d")
+            conn.execute(
+                """
+                INSERT INTO revenue_daily (day, purchase_type, payments, amount_kopecks)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT(day, purchase_type) DO UPDATE SET
+                    payments = payments + 1,
+                    amount_kopecks = amount_kopecks + excluded.amount_kopecks
+                """,
+                (day, purchase_type, int(amount_kopecks)),
+            )
+        conn.commit()
+        return appended
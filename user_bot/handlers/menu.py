@@ -20,6 +20,7 @@ from data.db_utils import (
     create_user_record,
     get_lte_remaining_bytes,
     get_user_by_id,
+    mark_chat_reachable,
     update_subscription_expire,
     update_user_email,
     update_telegram_tag,
@@ -227,6 +228,8 @@ async def _send_help_menu(
 
 @router.message(Command("start"))
 async def cmd_start(message: types.Message, command: CommandObject | None = None) -> None:
+    # A user who writes to the bot has unblocked it; resume bulk messages.
+    await asyncio.to_thread(mark_chat_reachable, message.from_user.id)
     if command and command.args:
         match = WEB_LINK_TOKEN_RE.match(command.args.strip())
         if match:
@@ -18,22 +18,20 @@ from handlers.keyboards import (
     tariff_menu_keyboard,
 )
 from handlers.utils import get_subscription_price
-from payments.yookassa_client import create_payment
+from payments.ledger import record_payment
+from payments.yookassa_client import create_payment_async
 
 
 router = Router()
 
-# Жёсткий потолок на синхронный YooKassa SDK (Payment.create использует requests).
-# Без этого один залипший запрос блокирует весь polling-бот.
-YOOKASSA_CREATE_TIMEOUT_SECONDS = 15.0
 
-
-async def _create_payment_async(**kwargs):
-    """Запускаем sync YooKassa SDK в thread-pool с таймаутом."""
-    return await asyncio.wait_for(
-        asyncio.to_thread(create_payment, **kwargs),
-        timeout=YOOKASSA_CREATE_TIMEOUT_SECONDS,
-    )
+async def _track_created_payment(payment) -> None:
+    """Register a new payment locally (status row for reconciliation + ledger)."""
+    try:
+        await asyncio.to_thread(db_utils.update_payment_status, str(payment.id), str(payment.status))
+    except Exception as exc:
+        logging.error("[PAYMENT] Не удалось сохранить статус платежа %s: %s", payment.id, exc)
+    await record_payment(payment, "created", source="bot")
 
 LTE_GB_PRICES: dict[int, int] = {
     5: 19,
@@ -186,7 +184,7 @@ async def buy_lte_gb_callback(callback_query: types.CallbackQuery) -> None:
     )
 
     try:
-        payment = await _create_payment_async(
+        payment = await create_payment_async(
             amount=amount,
             description=description,
             return_url=return_url,
@@ -197,6 +195,7 @@ async def buy_lte_gb_callback(callback_query: types.CallbackQuery) -> None:
                 "lte_gb": gb_amount,
             },
         )
+        await _track_created_payment(payment)
         confirmation_url = payment.confirmation.confirmation_url
         await callback_query.message.edit_text(
             info_text + "\n\nНажмите кнопку ниже для перехода к оплате\\.",
@@ -251,13 +250,14 @@ async def buy_tariff_callback(callback_query: types.CallbackQuery) -> None:
     days_to_add = months * 30
 
     try:
-        payment = await _create_payment_async(
+        payment = await create_payment_async(
             amount=amount,
             description=description,
             return_url=return_url,
             telegram_id=telegram_id,
             days_to_extend=days_to_add,
         )
+        await _track_created_payment(payment)
         confirmation_url = payment.confirmation.confirmation_url
 
         await callback_query.message.edit_text(
@@ -374,7 +374,7 @@ async def buy_gift_callback(callback: CallbackQuery) -> None:
     return_url = "https://yourdomain.com/return"
 
     try:
-        payment = await _create_payment_async(
+        payment = await create_payment_async(
             amount=gift["price"],
             description=description,
             return_url=return_url,
@@ -382,6 +382,7 @@ async def buy_gift_callback(callback: CallbackQuery) -> None:
             days_to_extend=gift["days"],
             is_gift=True,
         )
+        await _track_created_payment(payment)
         url = payment.confirmation.confirmation_url
 
         await callback.message.edit_text(
@@ -0,0 +1,85 @@
+import logging
+import os
+from typing import Awaitable, Callable
+
+from data import db_utils
+from payments.leases import LeaseWorkers
+
+logger = logging.getLogger(__name__)
+
+# Воркеры, разбирающие очередь payment_events, и политика повторов.
+PAYMENT_EVENT_WORKERS = int(os.getenv("PAYMENT_EVENT_WORKERS", "4"))
+PAYMENT_EVENT_MAX_ATTEMPTS = int(os.getenv("PAYMENT_EVENT_MAX_ATTEMPTS", "8"))
+PAYMENT_EVENT_RETRY_BASE_SECONDS = int(os.getenv("PAYMENT_EVENT_RETRY_BASE_SECONDS", "30"))
+PAYMENT_EVENT_RETRY_MAX_SECONDS = int(os.getenv("PAYMENT_EVENT_RETRY_MAX_SECONDS", "1800"))
+# Аренда события воркером: если процесс упал, событие снова возьмут после неё.
+PAYMENT_EVENT_LEASE_SECONDS = int(os.getenv("PAYMENT_EVENT_LEASE_SECONDS", "120"))
+# Как часто проверять очередь без сигнала (события от других процессов, повторы).
+PAYMENT_EVENT_POLL_SECONDS = 5.0
+
+EventHandler = Callable[[str, str, str, int], Awaitable[None]]
+DeadLetterHandler = Callable[[str, str, str, str], Awaitable[None]]
+
+
+class PaymentEventSettled(Exception):
+    """
+    Raised by a handler when a step failed after the payment was already
+    credited: the event is logged and marked done, never retried.
+    """
+
+
+def retry_delay(attempts: int) -> int | None:
+    """Backoff before the next attempt, or None once attempts are exhausted."""
+    if attempts >= PAYMENT_EVENT_MAX_ATTEMPTS:
+        return None
+    return min(
+        PAYMENT_EVENT_RETRY_MAX_SECONDS,
+        PAYMENT_EVENT_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1),
+    )
+
+
+class PaymentEventWorkers(LeaseWorkers):
+    """Pool of workers draining `payment_events` (see `LeaseWorkers`)."""
+
+    def __init__(
+        self,
+        handler: EventHandler,
+        *,
+        on_dead: DeadLetterHandler | None = None,
+        workers: int = PAYMENT_EVENT_WORKERS,
+    ) -> None:
+        super().__init__(
+            "payment_events",
+            claim=db_utils.claim_payment_events,
+            complete=db_utils.complete_payment_event,
+            fail=db_utils.retry_payment_event,
+            next_due_at=db_utils.next_payment_event_at,
+            lease_seconds=PAYMENT_EVENT_LEASE_SECONDS,
+            poll_seconds=PAYMENT_EVENT_POLL_SECONDS,
+            workers=workers,
+        )
+        self._handler = handler
+        self._dead_handler = on_dead
+
+    def _describe(self, row) -> str:
+        return f"Событие {row['event']} платежа {row['payment_id']}"
+
+    def _retry_delay(self, attempt: int, exc: Exception) -> int | None:
+        return retry_delay(attempt)
+
+    async def _handle(self, row) -> None:
+        payment_id = str(row["payment_id"])
+        event = str(row["event"])
+        try:
+            await self._handler(payment_id, event, str(row["payload"]), int(row["created_at"] or 0))
+        except PaymentEventSettled as exc:
+            logger.error(
+                "Событие %s платежа %s: платёж зачислен, но обработка завершилась ошибкой (%s); без повтора",
+                event, payment_id, exc.__cause__ or exc,
+            )
+
+    async def _on_dead(self, row, error: str) -> None:
+        if self._dead_handler is not None:
+            await self._dead_handler(
+                str(row["payment_id"]), str(row["event"]), str(row["payload"]), error
+            )
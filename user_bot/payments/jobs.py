@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from data import db_utils
+from payments.leases import LeaseWorkers
+from payments.timing import record_latency
+
+logger = logging.getLogger(__name__)
+
+# Воркеры очереди background_jobs (подарки, рефералы, push, сообщения в Telegram).
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "6"))
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", "15"))
+JOB_RETRY_MAX_SECONDS = int(os.getenv("JOB_RETRY_MAX_SECONDS", "900"))
+# Аренда задачи воркером: больше любого таймаута внутри обработчика.
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "180"))
+# Задачи из web-кабинета приходят без сигнала — опрашиваем очередь чаще, чем платежи.
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+DeadJobHandler = Callable[[str, dict[str, Any], str], Awaitable[None]]
+
+
+class PermanentJobError(Exception):
+    """Failure a retry will not fix; the job is dead-lettered right away."""
+
+
+def job_retry_delay(attempts: int) -> int | None:
+    """Backoff before the next attempt, or None once attempts are exhausted."""
+    if attempts >= JOB_MAX_ATTEMPTS:
+        return None
+    return min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(0, attempts - 1))
+
+
+class JobWorkers(LeaseWorkers):
+    """
+    Pool of workers draining `background_jobs`, dispatching on the job kind.
+    Jobs can be enqueued from any process (e.g. the web backend).
+    """
+
+    def __init__(
+        self,
+        handlers: dict[str, JobHandler],
+        *,
+        on_dead: DeadJobHandler | None = None,
+        workers: int = JOB_WORKERS,
+    ) -> None:
+        super().__init__(
+            "background_jobs",
+            claim=db_utils.claim_jobs,
+            complete=db_utils.complete_job,
+            fail=db_utils.retry_job,
+            next_due_at=db_utils.next_job_at,
+            lease_seconds=JOB_LEASE_SECONDS,
+            poll_seconds=JOB_POLL_SECONDS,
+            workers=workers,
+        )
+        self._handlers = handlers
+        self._dead_handler = on_dead
+
+    def _describe(self, row) -> str:
+        return f"Задача {row['kind']} #{row['id']}"
+
+    def _retry_delay(self, attempt: int, exc: Exception) -> int | None:
+        return None if isinstance(exc, PermanentJobError) else job_retry_delay(attempt)
+
+    async def _handle(self, row) -> None:
+        kind = str(row["kind"])
+        started = time.perf_counter()
+        handler = self._handlers.get(kind)
+        if handler is None:
+            raise PermanentJobError(f"unknown job kind {kind!r}")
+        await handler(json.loads(row["payload"] or "{}"))
+        await record_latency(
+            "jobs",
+            {
+                kind: (time.perf_counter() - started) * 1000,
+                "queue_wait": max(0.0, time.time() - int(row["created_at"] or 0)) * 1000,
+            },
+        )
+
+    async def _on_dead(self, row, error: str) -> None:
+        if self._dead_handler is None:
+            return
+        try:
+            payload = json.loads(row["payload"] or "{}")
+        except ValueError:
+            payload = {}
+        await self._dead_handler(str(row["kind"]), payload, error)
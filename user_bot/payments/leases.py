@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+ClaimRows = Callable[[int, int], list[sqlite3.Row]]
+CompleteRow = Callable[[int], None]
+FailRow = Callable[[int, str, int | None], None]
+NextDueAt = Callable[[], int | None]
+
+
+class LeaseWorkers:
+    """
+    Pool of workers draining one SQLite queue table. Rows are leased by
+    `claim`, so several processes can share the queue, and anything left
+    unfinished by a restart is picked up again when its lease expires.
+
+    A failed row is passed to `fail` with the backoff from `_retry_delay`;
+    None dead-letters it and calls `_on_dead`. Subclasses implement
+    `_handle`, `_retry_delay` and `_describe`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        claim: ClaimRows,
+        complete: CompleteRow,
+        fail: FailRow,
+        next_due_at: NextDueAt,
+        lease_seconds: int,
+        poll_seconds: float,
+        workers: int,
+    ) -> None:
+        self._name = name
+        self._claim = claim
+        self._complete = complete
+        self._fail = fail
+        self._next_due_at = next_due_at
+        self._lease_seconds = lease_seconds
+        self._poll_seconds = poll_seconds
+        self._workers = max(1, workers)
+        self._wakeup = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+    def notify(self) -> None:
+        """Wake idle workers right after rows were stored in this process."""
+        self._wakeup.set()
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"{self._name}-{i}")
+            for i in range(self._workers)
+        ]
+        logger.info("Запущено воркеров очереди %s: %s", self._name, self._workers)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _handle(self, row: sqlite3.Row) -> None:
+        raise NotImplementedError
+
+    def _retry_delay(self, attempt: int, exc: Exception) -> int | None:
+        raise NotImplementedError
+
+    def _describe(self, row: sqlite3.Row) -> str:
+        raise NotImplementedError
+
+    async def _on_dead(self, row: sqlite3.Row, error: str) -> None:
+        """Called once a row is dead-lettered."""
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._claim, 1, self._lease_seconds)
+            except Exception:
+                logger.exception("Не удалось получить строки из очереди %s", self._name)
+                rows = []
+            if rows:
+                await self._process(rows[0])
+                continue
+            await self._idle()
+
+    async def _idle(self) -> None:
+        timeout = self._poll_seconds
+        try:
+            next_at = await asyncio.to_thread(self._next_due_at)
+        except Exception:
+            next_at = None
+        if next_at is not None:
+            timeout = min(timeout, max(0.0, next_at - time.time()))
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _process(self, row: sqlite3.Row) -> None:
+        row_id = int(row["id"])
+        attempt = int(row["attempts"]) + 1
+        try:
+            await self._handle(row)
+        except Exception as exc:
+            delay = self._retry_delay(attempt, exc)
+            error = f"{type(exc).__name__}: {exc}"
+            await asyncio.to_thread(self._fail, row_id, error, delay)
+            if delay is None:
+                logger.error("%s: не выполнено, попыток: %s (%s)", self._describe(row), attempt, error)
+                try:
+                    await self._on_dead(row, error)
+                except Exception as notify_err:
+                    logger.error("Ошибка уведомления (%s): %s", self._describe(row), notify_err)
+            else:
+                logger.warning(
+                    "%s: попытка %s не удалась (%s), повтор через %ss",
+                    self._describe(row), attempt, error, delay,
+                )
+            return
+        await asyncio.to_thread(self._complete, row_id)
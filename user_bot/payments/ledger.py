@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from decimal import Decimal, InvalidOperation
+
+from data import db_utils
+
+logger = logging.getLogger(__name__)
+
+
+def _purchase_type(metadata: dict) -> str:
+    if str(metadata.get("purchase_type") or "").strip().lower() == "lte_gb":
+        return "lte_gb"
+    if str(metadata.get("is_gift", "")).strip().lower() in {"true", "1", "yes", "y"}:
+        return "gift"
+    return "subscription"
+
+
+def _int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _kopecks(amount) -> int:
+    try:
+        return int(Decimal(str(getattr(amount, "value", "0") or "0")) * 100)
+    except (InvalidOperation, ValueError):
+        return 0
+
+
+async def record_payment(payment, event: str, source: str) -> None:
+    """
+    Append a YooKassa payment to `payment_ledger` under `event`. Best-effort:
+    a ledger failure is logged and never breaks the payment flow.
+    """
+    metadata = getattr(payment, "metadata", None) or {}
+    amount = getattr(payment, "amount", None)
+    purchase_type = _purchase_type(metadata)
+    try:
+        await asyncio.to_thread(
+            db_utils.append_payment_ledger,
+            str(payment.id),
+            event,
+            telegram_id=_int(metadata.get("telegram_id")),
+            purchase_type=purchase_type,
+            amount_kopecks=_kopecks(amount),
+            currency=str(getattr(amount, "currency", "") or "RUB"),
+            days=_int(metadata.get("days_to_extend")) if purchase_type != "lte_gb" else 0,
+            lte_gb=_int(metadata.get("lte_gb")) if purchase_type == "lte_gb" else 0,
+            source=source,
+        )
+    except Exception as exc:
+        logger.error("Не удалось записать платёж %s в ledger (%s): %s", getattr(payment, "id", "?"), event, exc)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable
+
+from data import db_utils
+from payments.yookassa_client import fetch_payment_async
+
+logger = logging.getLogger(__name__)
+
+# Платежи, по которым вебхук так и не пришёл: раз в интервал сверяем с YooKassa
+# открытые платежи старше PAYMENT_RECONCILE_AGE_MINUTES (но не старше MAX_AGE).
+PAYMENT_RECONCILE_INTERVAL_MINUTES = int(os.getenv("PAYMENT_RECONCILE_INTERVAL_MINUTES", "10"))
+PAYMENT_RECONCILE_AGE_MINUTES = int(os.getenv("PAYMENT_RECONCILE_AGE_MINUTES", "15"))
+PAYMENT_RECONCILE_MAX_AGE_HOURS = int(os.getenv("PAYMENT_RECONCILE_MAX_AGE_HOURS", "72"))
+PAYMENT_RECONCILE_BATCH = int(os.getenv("PAYMENT_RECONCILE_BATCH", "200"))
+PAYMENT_RECONCILE_CONCURRENCY = int(os.getenv("PAYMENT_RECONCILE_CONCURRENCY", "5"))
+# Выполненные события и задачи храним столько дней, потом их удаляет сверка.
+QUEUE_RETENTION_DAYS = int(os.getenv("QUEUE_RETENTION_DAYS", "30"))
+# Процессы, не отправлявшие сообщений сутки, убираем из outbound_peers.
+OUTBOUND_PEER_RETENTION_SECONDS = 86400
+
+
+async def reconcile_pending_payments(now: int | None = None) -> int:
+    """
+    Re-check stale open payments at YooKassa. Newly succeeded ones are put
+    into `payment_events` as a regular `payment.succeeded` notification, so
+    they are credited by the same claim-guarded path as the webhook.
+    Returns how many payments were recovered.
+    """
+    now = int(now if now is not None else time.time())
+    stale = await asyncio.to_thread(
+        db_utils.get_stale_open_payments,
+        now - PAYMENT_RECONCILE_AGE_MINUTES * 60,
+        now - PAYMENT_RECONCILE_MAX_AGE_HOURS * 3600,
+        PAYMENT_RECONCILE_BATCH,
+    )
+    if not stale:
+        return 0
+
+    semaphore = asyncio.Semaphore(max(1, PAYMENT_RECONCILE_CONCURRENCY))
+
+    async def check(payment_id: str, local_status: str) -> bool:
+        async with semaphore:
+            try:
+                payment = await fetch_payment_async(payment_id)
+            except Exception as exc:
+                logger.warning("Сверка платежа %s не удалась: %r", payment_id, exc)
+                return False
+        status = str(getattr(payment, "status", "") or "")
+        if status != "succeeded":
+            # Запоминаем статус (и время проверки), чтобы не дёргать платёж каждый проход.
+            await asyncio.to_thread(
+                db_utils.refresh_payment_status, payment_id, local_status, status or local_status
+            )
+            return False
+        payload = {"type": "notification", "event": "payment.succeeded", "object": dict(payment)}
+        return await asyncio.to_thread(
+            db_utils.requeue_payment_event,
+            payment_id,
+            "payment.succeeded",
+            json.dumps(payload, ensure_ascii=False),
+        )
+
+    results = await asyncio.gather(*(check(pid, status) for pid, status in stale))
+    recovered = sum(1 for ok in results if ok)
+    logger.info("Сверка платежей: проверено %s, восстановлено %s", len(stale), recovered)
+    return recovered
+
+
+async def prune_queues(now: int | None = None) -> None:
+    """Drop finished queue rows past retention and peers of long-gone processes."""
+    now = int(now if now is not None else time.time())
+    events, jobs, peers = await asyncio.to_thread(
+        db_utils.prune_queues,
+        now - max(1, QUEUE_RETENTION_DAYS) * 86400,
+        now - OUTBOUND_PEER_RETENTION_SECONDS,
+    )
+    if events or jobs or peers:
+        logger.info("Очистка очередей: событий %s, задач %s, outbound-процессов %s", events, jobs, peers)
+
+
+async def reconcile_loop(on_recovered: Callable[[int], Awaitable[None]] | None = None) -> None:
+    """
+    Run `reconcile_pending_payments` and `prune_queues` every
+    PAYMENT_RECONCILE_INTERVAL_MINUTES. With several webhook processes only
+    the one that claims the slot runs.
+    """
+    interval = max(1, PAYMENT_RECONCILE_INTERVAL_MINUTES) * 60
+    while True:
+        try:
+            if await asyncio.to_thread(db_utils.claim_periodic_run, "payment_reconcile", interval):
+                recovered = await reconcile_pending_payments()
+                if recovered and on_recovered is not None:
+                    await on_recovered(recovered)
+                await prune_queues()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Сверка платежей упала")
+        await asyncio.sleep(min(60, interval))
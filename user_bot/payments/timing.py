@@ -0,0 +1,123 @@
+"""Per-stage latency of payment processing: spans, histograms, /metrics."""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+from data import db_utils
+
+logger = logging.getLogger(__name__)
+
+# Платежи дольше порога логируются с разбивкой по стадиям.
+PAYMENT_SLOW_LOG_MS = int(os.getenv("PAYMENT_SLOW_LOG_MS", "5000"))
+
+
+@dataclass
+class PaymentTrace:
+    """Stage durations (ms) collected while one payment is processed."""
+
+    path: str
+    payment_id: str
+    stages: dict[str, float] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+
+_current_trace: ContextVar[PaymentTrace | None] = ContextVar("payment_trace", default=None)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a block as `name` within the current payment trace (if any)."""
+    trace = _current_trace.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            elapsed = (time.perf_counter() - started) * 1000
+            trace.stages[name] = trace.stages.get(name, 0.0) + elapsed
+
+
+_pending_records: set[asyncio.Task] = set()
+
+
+async def record_latency(path: str, stages: dict[str, float]) -> None:
+    """Add stage durations to the shared histograms; never fails the caller."""
+    try:
+        await asyncio.to_thread(db_utils.add_payment_latency, path, stages)
+    except Exception as exc:
+        logger.warning("Failed to record payment latency: %s", exc)
+
+
+def record_latency_later(path: str, stages: dict[str, float]) -> None:
+    """`record_latency` off the request path, e.g. for the webhook ack."""
+    task = asyncio.create_task(record_latency(path, stages))
+    _pending_records.add(task)
+    task.add_done_callback(_pending_records.discard)
+
+
+@asynccontextmanager
+async def payment_trace(path: str, payment_id: str):
+    """
+    Collect `stage()` spans for one payment. On exit the total is added,
+    everything goes to the histograms and slow payments are logged.
+    """
+    trace = PaymentTrace(path=path, payment_id=payment_id)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        total = (time.perf_counter() - trace.started) * 1000
+        trace.stages["total"] = total
+        if total >= PAYMENT_SLOW_LOG_MS:
+            breakdown = ", ".join(
+                f"{name}={ms:.0f}ms" for name, ms in trace.stages.items() if name != "total"
+            )
+            logger.warning(
+                "Медленный платёж %s (%s): %.0f мс — %s",
+                payment_id, path, total, breakdown or "без стадий",
+            )
+        await record_latency(path, trace.stages)
+
+
+def _format_le(le_ms: int) -> str:
+    return "+Inf" if le_ms < 0 else str(le_ms)
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition of the payment stage histograms."""
+    rows = db_utils.get_payment_latency()
+    series: dict[tuple[str, str], dict[int, tuple[int, float]]] = {}
+    for path, stage_name, le_ms, count, sum_ms in rows:
+        series.setdefault((path, stage_name), {})[int(le_ms)] = (int(count), float(sum_ms))
+
+    lines = [
+        "# HELP payment_stage_latency_ms Payment processing stage latency in milliseconds.",
+        "# TYPE payment_stage_latency_ms histogram",
+    ]
+    for (path, stage_name), buckets in sorted(series.items()):
+        labels = f'path="{path}",stage="{stage_name}"'
+        cumulative = 0
+        total_sum = 0.0
+        for le_ms in [*db_utils.LATENCY_BUCKETS_MS, -1]:
+            count, sum_ms = buckets.get(le_ms, (0, 0.0))
+            cumulative += count
+            total_sum += sum_ms
+            lines.append(
+                f'payment_stage_latency_ms_bucket{{{labels},le="{_format_le(le_ms)}"}} {cumulative}'
+            )
+        lines.append(f"payment_stage_latency_ms_sum{{{labels}}} {total_sum:.3f}")
+        lines.append(f"payment_stage_latency_ms_count{{{labels}}} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    text = await asyncio.to_thread(render_metrics)
+    return web.Response(text=text, content_type="text/plain", charset="utf-8")
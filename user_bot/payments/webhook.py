@@ -1,30 +1,39 @@
 import asyncio
+import json
 import logging
 import os
+import time
 
 import aiohttp as _aiohttp
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
 from aiohttp import web
 from yookassa.domain.notification import WebhookNotification
 
 from app.services.remnawave.vpn_service import extend_subscription_by_telegram_id
-from bot import bot
 from data import db_utils
 from data.db_utils import (
     add_lte_paid_gb,
     generate_gift_code,
     get_payment_status,
-    update_payment_status,
 )
 from handlers.utils import escape_markdown_v2
-from payments.yookassa_client import fetch_payment
+from payments.events import PaymentEventSettled, PaymentEventWorkers
+from payments.jobs import JobWorkers, PermanentJobError
+from payments.ledger import record_payment
+from payments.timing import payment_trace, record_latency_later, stage
+from payments.yookassa_client import fetch_payment_async
+from utils.outbound import OutboundMiddleware
+from utils.outbound_store import db_outbound_store
 
 ADMIN_ID = int((os.getenv("ADMIN_IDS") or "").split(",")[0].strip() or "0")
 logger = logging.getLogger(__name__)
 
-# Жёсткие потолки на блокирующие сетевые вызовы, чтобы зависший
-# upstream (YooKassa/Remnawave) никогда не клал event loop надолго.
-YOOKASSA_FETCH_TIMEOUT_SECONDS = 15.0
-REMNAWAVE_EXTEND_TIMEOUT_SECONDS = 20.0
+# Вебхуку нужен только клиент Bot API, без диспетчера и хендлеров из bot.py.
+bot = Bot(token=os.getenv("USER_BOT_TOKEN"))
+bot.session.middleware(OutboundMiddleware(db_outbound_store))
+
+# Потолок на чтение тела запроса, чтобы медленный клиент не держал обработчик.
 REQUEST_BODY_TIMEOUT_SECONDS = 10.0
 
 # Web-кабинет: push-уведомления через internal API (loopback).
@@ -36,8 +45,27 @@ WEB_INTERNAL_PUSH_URL = (
 WEB_INTERNAL_SECRET = (os.getenv("WEB_INTERNAL_SECRET") or "").strip()
 WEB_PUSH_TIMEOUT_SECONDS = 5.0
 
+# Одна сессия (и пул соединений к loopback API) на всё время жизни приложения.
+_push_session: _aiohttp.ClientSession | None = None
+
+
+async def open_web_push_session() -> None:
+    global _push_session
+    if _push_session is None and WEB_INTERNAL_SECRET:
+        _push_session = _aiohttp.ClientSession(
+            timeout=_aiohttp.ClientTimeout(total=WEB_PUSH_TIMEOUT_SECONDS),
+            headers={"X-Kaira-Internal-Secret": WEB_INTERNAL_SECRET},
+        )
+
+
+async def close_web_push_session() -> None:
+    global _push_session
+    if _push_session is not None:
+        await _push_session.close()
+        _push_session = None
 
-async def _try_send_web_push(
+
+async def _send_web_push(
     *,
     telegram_id: int,
     title: str,
@@ -45,25 +73,39 @@ async def _try_send_web_push(
     url: str = "/cabinet",
     tag: str = "kaira-default",
 ) -> None:
-    """Best-effort web-push notification. Никогда не роняет webhook."""
-    if not WEB_INTERNAL_SECRET:
+    """Web-push via the internal API; raises on network errors and 5xx so the job retries."""
+    if _push_session is None:
         return
-    try:
-        timeout = _aiohttp.ClientTimeout(total=WEB_PUSH_TIMEOUT_SECONDS)
-        async with _aiohttp.ClientSession(timeout=timeout) as session:
-            await session.post(
-                WEB_INTERNAL_PUSH_URL,
-                json={
-                    "telegram_id": int(telegram_id),
-                    "title": title,
-                    "body": body,
-                    "url": url,
-                    "tag": tag,
-                },
-                headers={"X-Kaira-Internal-Secret": WEB_INTERNAL_SECRET},
-            )
-    except Exception as exc:
-        logger.warning("web-push send failed for %s: %s", telegram_id, exc)
+    async with _push_session.post(
+        WEB_INTERNAL_PUSH_URL,
+        json={
+            "telegram_id": int(telegram_id),
+            "title": title,
+            "body": body,
+            "url": url,
+            "tag": tag,
+        },
+    ) as resp:
+        if resp.status >= 500:
+            raise RuntimeError(f"web-push API answered {resp.status}")
+        if resp.status >= 400:
+            logger.warning("web-push for %s answered %s", telegram_id, resp.status)
+
+
+def _telegram_job(payment_id: str, role: str, chat_id: int, text: str) -> tuple[str, dict, str]:
+    return "telegram_message", {"chat_id": int(chat_id), "text": text}, f"tg:{payment_id}:{role}"
+
+
+def _push_job(key: str, **push) -> tuple[str, dict, str]:
+    return "web_push", push, f"push:{key}"
+
+
+async def _enqueue_jobs(jobs: list[tuple[str, dict, str]]) -> None:
+    """Persist side-effect jobs and wake the workers of this process."""
+    if not jobs:
+        return
+    await asyncio.to_thread(db_utils.enqueue_jobs, jobs)
+    job_workers.notify()
 
 
 async def _send_markdown_or_plain(chat_id: int, text: str) -> None:
@@ -76,7 +118,12 @@ async def _send_markdown_or_plain(chat_id: int, text: str) -> None:
 
 
 async def yookassa_webhook_handler(request: web.Request):
+    """
+    Validate the notification, store it in `payment_events` and answer
+    YooKassa right away; the actual processing runs in `payment_workers`.
+    """
     logger.info("Получен запрос вебхука от Yookassa.")
+    started = time.perf_counter()
     try:
         payload = await asyncio.wait_for(
             request.json(),
@@ -106,259 +153,409 @@ async def yookassa_webhook_handler(request: web.Request):
         logger.warning("Webhook payload has no payment.id: %s", payload)
         return web.json_response({"error": "Invalid payload: missing payment id"}, status=400)
 
-    # YooKassa SDK синхронный (использует requests). Уносим его в thread-pool,
-    # чтобы не блокировать event loop, и накладываем жёсткий таймаут.
-    payment_api = None
+    parsed = time.perf_counter()
     try:
-        payment_api = await asyncio.wait_for(
-            asyncio.to_thread(fetch_payment, payment_id),
-            timeout=YOOKASSA_FETCH_TIMEOUT_SECONDS,
+        queued = await asyncio.to_thread(
+            db_utils.enqueue_payment_event,
+            str(payment_id),
+            str(event or ""),
+            json.dumps(payload, ensure_ascii=False),
         )
-    except asyncio.TimeoutError:
-        logger.error(
-            "YooKassa fetch_payment timeout (>%ss) для %s",
-            YOOKASSA_FETCH_TIMEOUT_SECONDS,
-            payment_id,
-        )
-        if ADMIN_ID:
-            try:
-                await bot.send_message(
-                    ADMIN_ID,
-                    f"⏱ YooKassa API timeout для платежа {payment_id}",
-                )
-            except Exception as send_err:
-                logger.error("Ошибка отправки админу: %s", send_err)
     except Exception as e:
-        logger.error("Не удалось запросить платеж %s из YooKassa: %s", payment_id, e)
-        if ADMIN_ID:
-            try:
-                await bot.send_message(
-                    ADMIN_ID,
-                    f"❌ YooKassa API error для платежа {payment_id}: {e}",
-                )
-            except Exception as send_err:
-                logger.error("Ошибка отправки админу: %s", send_err)
+        # Без записи в очередь отвечаем ошибкой — YooKassa повторит доставку.
+        logger.error("Не удалось сохранить событие %s платежа %s: %s", event, payment_id, e)
+        return web.json_response({"error": "Temporary failure"}, status=500)
+
+    if queued:
+        payment_workers.notify()
+    else:
+        logger.info("Событие %s платежа %s уже в очереди. Пропуск.", event, payment_id)
+    done = time.perf_counter()
+    record_latency_later(
+        "webhook",
+        {
+            "parse": (parsed - started) * 1000,
+            "enqueue": (done - parsed) * 1000,
+            "ack": (done - started) * 1000,
+        },
+    )
+    return web.json_response({"status": "ok"}, status=200)
+
+
+async def process_payment_event(
+    payment_id: str, event: str, payload: str, queued_at: int | None = None
+) -> None:
+    """
+    Handle one stored notification. Exceptions are retried by the workers,
+    so only failures that are safe to repeat may escape from here.
+    """
+    async with payment_trace("webhook", payment_id) as trace:
+        if queued_at:
+            trace.stages["queue_wait"] = max(0.0, time.time() - queued_at) * 1000
+        await _process_payment_event(payment_id, event, payload)
+
+
+async def _process_payment_event(payment_id: str, event: str, payload: str) -> None:
+    notification = WebhookNotification(json.loads(payload))
+    payment = notification.object
+
+    # Ошибка или таймаут (YOOKASSA_TIMEOUT_SECONDS) здесь — повод повторить
+    # событие позже.
+    with stage("yookassa_fetch"):
+        payment_api = await fetch_payment_async(payment_id)
 
     effective_payment = payment_api or payment
     effective_status = getattr(effective_payment, "status", None)
 
-    if event == "payment.succeeded" or effective_status == "succeeded":
-        logger.info("Платёж успешно завершён: %s", payment_id)
+    if not (event == "payment.succeeded" or effective_status == "succeeded"):
+        # Можно обрабатывать и другие события (payment.waiting_for_capture и т.д.),
+        # но чаще достаточно только payment.succeeded
+        logger.info("Получено событие '%s'. Обработка не требуется.", event)
+        return
 
-        existing_status = await asyncio.to_thread(get_payment_status, payment_id)
-        if existing_status == "succeeded":
+    logger.info("Платёж успешно завершён: %s", payment_id)
+    with stage("claim"):
+        claimed = await asyncio.to_thread(db_utils.claim_payment, payment_id)
+    if not claimed:
+        status = await asyncio.to_thread(get_payment_status, payment_id)
+        if status == "succeeded":
             logger.info("Платёж %s уже обработан. Пропуск.", payment_id)
-            return web.json_response({"status": "ok"}, status=200)
+            return
+        # Платёж сейчас зачисляет другой обработчик — повторим, когда освободится.
+        raise RuntimeError(f"payment {payment_id} is being processed elsewhere")
+    try:
+        await _apply_succeeded_payment(payment_id, effective_payment)
+    except Exception as exc:
+        # Повторяем только то, что упало до зачисления.
+        if await asyncio.to_thread(db_utils.is_payment_credited, payment_id):
+            raise PaymentEventSettled(str(exc)) from exc
+        raise
+    finally:
+        await asyncio.to_thread(db_utils.release_payment_claim, payment_id)
+
+
+async def _apply_succeeded_payment(payment_id: str, effective_payment) -> None:
+    """
+    Credit a claimed payment. The credit, the credited marker and the jobs
+    that notify the user and the admin are committed in one transaction.
+    """
+    # Считываем данные из metadata
+    metadata = (getattr(effective_payment, "metadata", None) or {}) if effective_payment else {}
+    telegram_id_raw = metadata.get("telegram_id")
+    try:
+        telegram_id = int(telegram_id_raw) if telegram_id_raw is not None else None
+    except (TypeError, ValueError):
+        telegram_id = None
+    days_to_extend = metadata.get("days_to_extend", 30)
+    is_gift_raw = metadata.get("is_gift", False)
+    purchase_type = str(metadata.get("purchase_type") or "").strip().lower()
+    lte_gb_raw = metadata.get("lte_gb", 0)
 
-        # Считываем данные из metadata
-        metadata = (getattr(effective_payment, "metadata", None) or {}) if effective_payment else {}
-        telegram_id_raw = metadata.get("telegram_id")
-        try:
-            telegram_id = int(telegram_id_raw) if telegram_id_raw is not None else None
-        except (TypeError, ValueError):
-            telegram_id = None
-        days_to_extend = metadata.get("days_to_extend", 30)
-        is_gift_raw = metadata.get("is_gift", False)
-        purchase_type = str(metadata.get("purchase_type") or "").strip().lower()
-        lte_gb_raw = metadata.get("lte_gb", 0)
+    try:
+        days_to_extend = int(days_to_extend)
+    except (TypeError, ValueError):
+        logger.warning("Некорректный days_to_extend=%s, используем 30", days_to_extend)
+        days_to_extend = 30
 
-        try:
-            days_to_extend = int(days_to_extend)
-        except (TypeError, ValueError):
-            logger.warning("Некорректный days_to_extend=%s, используем 30", days_to_extend)
-            days_to_extend = 30
+    if days_to_extend <= 0:
+        logger.warning("days_to_extend=%s <= 0, используем 30", days_to_extend)
+        days_to_extend = 30
 
-        if days_to_extend <= 0:
-            logger.warning("days_to_extend=%s <= 0, используем 30", days_to_extend)
-            days_to_extend = 30
+    if isinstance(is_gift_raw, bool):
+        is_gift = is_gift_raw
+    else:
+        is_gift = str(is_gift_raw).strip().lower() in {"true", "1", "yes", "y"}
+
+    logger.info("Платёж успешен. telegram_id: %s, days_to_extend: %s", telegram_id, days_to_extend)
 
-        if isinstance(is_gift_raw, bool):
-            is_gift = is_gift_raw
+    if not telegram_id:
+        logger.warning("telegram_id не найден в metadata.")
+        return
+
+    if purchase_type == "lte_gb":
+        try:
+            lte_gb = int(lte_gb_raw)
+        except (TypeError, ValueError):
+            lte_gb = 0
+        if lte_gb <= 0:
+            logger.warning("Некорректный lte_gb в metadata: %s", lte_gb_raw)
+            await _settle_with_error(
+                payment_id,
+                telegram_id,
+                "⚠️ Платёж прошёл, но пакет LTE ГБ не удалось определить.\n"
+                "Пожалуйста, напишите в поддержку.",
+                f"⚠️ LTE-платёж без валидного lte_gb\n"
+                f"Пользователь: {telegram_id}\n"
+                f"payment_id: {payment_id}",
+            )
         else:
-            is_gift = str(is_gift_raw).strip().lower() in {"true", "1", "yes", "y"}
-
-        logger.info("Платёж успешен. telegram_id: %s, days_to_extend: %s", telegram_id, days_to_extend)
-
-        if telegram_id:
-            result = ""
-            user_message = ""
-            group_message = ""
-
-            if purchase_type == "lte_gb":
-                try:
-                    lte_gb = int(lte_gb_raw)
-                except (TypeError, ValueError):
-                    lte_gb = 0
-                if lte_gb <= 0:
-                    logger.warning("Некорректный lte_gb в metadata: %s", lte_gb_raw)
-                    user_message = (
-                        "⚠️ Платёж прошёл, но пакет LTE ГБ не удалось определить.\n"
-                        "Пожалуйста, напишите в поддержку."
-                    )
-                    group_message = (
-                        f"⚠️ LTE-платёж без валидного lte_gb\n"
-                        f"Пользователь: {telegram_id}\n"
-                        f"payment_id: {payment_id}"
-                    )
-                else:
-                    await asyncio.to_thread(add_lte_paid_gb, telegram_id, lte_gb)
-                    result = f"LTE +{lte_gb} ГБ"
-                    user_message = (
-                        f"✅ Ваш платеж успешно завершен\\!\n"
-                        f"Добавлено *{lte_gb} ГБ LTE трафика*\\.\n\n"
-                        "📌 Пакет действует только для LTE серверов с лимитом\\.\n"
-                        "♻️ Непотраченные LTE ГБ переносятся на следующий месяц\\."
-                    )
-                    group_message = (
-                        f"📶 LTE пакет успешно оплачен\n"
-                        f"Пользователь: {telegram_id}\n"
-                        f"Добавлено: {lte_gb} ГБ"
-                    )
-            elif is_gift:
-                # 🎁 Генерация подарочного кода
-                gift_code = await asyncio.to_thread(generate_gift_code)
-                escape_gift_code = escape_markdown_v2(gift_code)
+            jobs = _notification_jobs(
+                payment_id,
+                telegram_id,
+                f"✅ Ваш платеж успешно завершен\\!\n"
+                f"Добавлено *{lte_gb} ГБ LTE трафика*\\.\n\n"
+                "📌 Пакет действует только для LTE серверов с лимитом\\.\n"
+                "♻️ Непотраченные LTE ГБ переносятся на следующий месяц\\.",
+                f"📶 LTE пакет успешно оплачен\n"
+                f"Пользователь: {telegram_id}\n"
+                f"Добавлено: {lte_gb} ГБ",
+            )
+            jobs.append(_push_job(
+                payment_id,
+                telegram_id=telegram_id,
+                title="LTE-пакет зачислен",
+                body=f"+{lte_gb} ГБ LTE на 30 дней",
+                url="/cabinet/lte",
+                tag="kaira-payment",
+            ))
+            with stage("lte_credit"):
                 await asyncio.to_thread(
-                    db_utils.create_gift_promo, gift_code, days_to_extend, telegram_id
-                )
-                # Увеличиваем счётчик
-                try:
-                    await asyncio.to_thread(db_utils.increment_gifted_subscriptions, telegram_id)
-                    logger.info(f"[GIFT] Пользователь {telegram_id} теперь подарил ещё одну подписку.")
-                except Exception as e:
-                    logger.error(f"[GIFT] Не удалось обновить gifted_subscriptions для {telegram_id}: {e}")
-
-                # Формируем текст
-                result = f"🎁 Промокод для подарка: `{escape_gift_code}`"
-                user_message = (
-                    f"✅ Платёж успешно завершен\\!\n"
-                    f"Вы приобрели *подарочную подписку* на *{days_to_extend}* дней\\.\n\n"
-                    f"Передайте другу этот код: `{escape_gift_code}`"
-                )
-                group_message = (
-                    f"🎁 Подарок оформлен\\!\n"
-                    f"Пользователь: {telegram_id}\n"
-                    f"Срок: {days_to_extend} дней\n"
-                    f"Код: {escape_gift_code}"
+                    add_lte_paid_gb, telegram_id, lte_gb, payment_id=payment_id, jobs=jobs
                 )
+            logger.info("LTE +%s ГБ зачислено: %s", lte_gb, telegram_id)
+    elif is_gift:
+        # 🎁 Код создаёт задача gift_create (она же шлёт код пользователю);
+        # код генерируем здесь, чтобы повтор задачи не выпустил второй.
+        gift_code = generate_gift_code()
+        gift_job = (
+            "gift_create",
+            {
+                "payment_id": payment_id,
+                "telegram_id": telegram_id,
+                "days": days_to_extend,
+                "code": gift_code,
+            },
+            f"gift:{payment_id}",
+        )
+        with stage("gift_create"):
+            await asyncio.to_thread(db_utils.credit_payment, payment_id, jobs=[gift_job])
+        logger.info("🎁 Подарок %s поставлен в очередь", gift_code)
+    else:
+        # ✅ Реферал, push и сообщения фиксируются вместе с продлением.
+        jobs = [("referral_award", {"telegram_id": telegram_id}, f"referral:{telegram_id}")]
+        jobs.append(_push_job(
+            payment_id,
+            telegram_id=telegram_id,
+            title="Подписка продлена",
+            body=f"Срок подписки увеличен на {days_to_extend} дней",
+            url="/cabinet",
+            tag="kaira-payment",
+        ))
+        jobs.extend(_notification_jobs(
+            payment_id,
+            telegram_id,
+            f"✅ Ваш платеж успешно завершен\n"
+            f"Подписка продлена на {days_to_extend} дней\n\n",
+            f"🔔 Платеж успешно завершен\n"
+            f"Пользователь: {telegram_id}\n"
+            f"Тариф продлен на {days_to_extend} дней",
+        ))
+        # 📦 Продлеваем подписку (sync HTTP в Remnawave) — в thread. Без
+        # внешнего таймаута: поток нельзя прервать, и продление, «опоздавшее»
+        # за таймаут, всё равно бы зачислилось. Зависание ограничивают
+        # HTTP-таймауты клиента Remnawave (REMNAWAVE_TIMEOUT_SECONDS).
+        with stage("remnawave_extend"):
+            result = await asyncio.to_thread(
+                extend_subscription_by_telegram_id,
+                telegram_id,
+                days_to_extend,
+                payment_id=payment_id,
+                jobs=jobs,
+            )
+        logger.info("Результат продления подписки: %s", result)
+
+        if isinstance(result, str) and result.startswith("❌"):
+            if await asyncio.to_thread(db_utils.is_payment_credited, payment_id):
+                logger.warning("Платёж %s зачислен, ошибка после продления: %s", payment_id, result)
             else:
-                # 📦 Продлеваем подписку (sync HTTP в Remnawave) — выносим в thread
-                # с жёстким таймаутом, чтобы зависший Remnawave не клал webhook.
-                try:
-                    result = await asyncio.wait_for(
-                        asyncio.to_thread(
-                            extend_subscription_by_telegram_id,
-                            telegram_id,
-                            days_to_extend,
-                        ),
-                        timeout=REMNAWAVE_EXTEND_TIMEOUT_SECONDS,
-                    )
-                except asyncio.TimeoutError:
-                    result = (
-                        f"❌ Таймаут продления подписки (>{REMNAWAVE_EXTEND_TIMEOUT_SECONDS}s)"
-                    )
-                    logger.error(
-                        "extend_subscription_by_telegram_id timeout for %s",
-                        telegram_id,
-                    )
-                logger.info("Результат продления подписки: %s", result)
-
-                # ✅ Проверка на реферала
-                try:
-                    user = await asyncio.to_thread(db_utils.get_user_by_id, telegram_id)
-                    if user and user["referrer_tag"]:
-                        applied = await asyncio.to_thread(
-                            db_utils.award_referral,
-                            user["referrer_tag"],
-                            telegram_id,
-                        )
-                        if applied:
-                            logger.info(f"[Referral] Зачислен реферал: @{user['referrer_tag']} от {telegram_id}")
-                        else:
-                            logger.info(f"[Referral] Уже начислен: {telegram_id}")
-                    else:
-                        logger.info(f"[Referral] Не начислен: {telegram_id}")
-                except Exception as e:
-                    logger.exception(f"[Referral] Ошибка: {e}")
-
-                if isinstance(result, str) and result.startswith("❌"):
-                    user_message = (
-                        "⚠️ Платёж прошёл, но при продлении возникла ошибка.\n"
-                        "Мы уже занимаемся этим вопросом."
-                    )
-                    group_message = (
-                        f"⚠️ Ошибка продления\n"
-                        f"Пользователь: {telegram_id}\n"
-                        f"Текст: {result}"
-                    )
-                else:
-                    user_message = (
-                        f"✅ Ваш платеж успешно завершен\n"
-                        f"Подписка продлена на {days_to_extend} дней\n\n"
-                    )
-                    group_message = (
-                        f"🔔 Платеж успешно завершен\n"
-                        f"Пользователь: {telegram_id}\n"
-                        f"Тариф продлен на {days_to_extend} дней"
-                    )
-
-            # ✅ Обновляем статус
-            await asyncio.to_thread(update_payment_status, payment_id, "succeeded")
-
-            # 🔔 Web push (best-effort, не блокирует на ошибках)
-            if purchase_type == "lte_gb":
-                try:
-                    lte_gb = int(lte_gb_raw)
-                except (TypeError, ValueError):
-                    lte_gb = 0
-                if lte_gb > 0:
-                    await _try_send_web_push(
-                        telegram_id=telegram_id,
-                        title="LTE-пакет зачислен",
-                        body=f"+{lte_gb} ГБ LTE на 30 дней",
-                        url="/cabinet/lte",
-                        tag="kaira-payment",
-                    )
-            elif is_gift:
-                await _try_send_web_push(
-                    telegram_id=telegram_id,
-                    title="Подарочный код готов",
-                    body=f"Подписка на {days_to_extend} дней — отправьте другу",
-                    url="/cabinet/gifts",
-                    tag="kaira-gift",
+                # Не зачислено — событие уйдёт на повтор; пользователю и админу
+                # пишем, только когда повторы закончатся (_on_dead_payment_event).
+                raise RuntimeError(result)
+
+    job_workers.notify()
+    with stage("db_status"):
+        await record_payment(effective_payment, "succeeded", source="bot")
+
+
+def _notification_jobs(
+    payment_id: str, telegram_id: int, user_message: str, group_message: str, suffix: str = ""
+) -> list[tuple[str, dict, str]]:
+    jobs = [_telegram_job(payment_id, f"user{suffix}", telegram_id, user_message)]
+    if ADMIN_ID:
+        jobs.append(_telegram_job(payment_id, f"admin{suffix}", ADMIN_ID, group_message))
+    else:
+        logger.warning("ADMIN_IDS не задан, уведомление админу не отправлено")
+    return jobs
+
+
+async def _settle_with_error(
+    payment_id: str, telegram_id: int, user_message: str, group_message: str
+) -> None:
+    """Close a paid but not credited payment and queue the error notifications."""
+    jobs = _notification_jobs(payment_id, telegram_id, user_message, group_message, "_error")
+    with stage("db_status"):
+        await asyncio.to_thread(db_utils.settle_payment, payment_id, jobs=jobs)
+
+
+async def _on_dead_payment_event(payment_id: str, event: str, payload: str, error: str) -> None:
+    """
+    Out of retries: a paid but still not credited payment is settled with
+    the error notifications; otherwise only the admin is told.
+    """
+    if await asyncio.to_thread(db_utils.claim_payment, payment_id):
+        try:
+            payment = json.loads(payload).get("object") or {}
+            metadata = payment.get("metadata") or {}
+            telegram_id = int(metadata.get("telegram_id") or 0)
+            if telegram_id and (event == "payment.succeeded" or payment.get("status") == "succeeded"):
+                await _settle_with_error(
+                    payment_id,
+                    telegram_id,
+                    "⚠️ Платёж прошёл, но при продлении возникла ошибка.\n"
+                    "Мы уже занимаемся этим вопросом.",
+                    f"⚠️ Ошибка продления\n"
+                    f"Пользователь: {telegram_id}\n"
+                    f"payment_id: {payment_id}\n"
+                    f"Текст: {error}",
                 )
-            else:
-                if not (isinstance(result, str) and result.startswith("❌")):
-                    await _try_send_web_push(
-                        telegram_id=telegram_id,
-                        title="Подписка продлена",
-                        body=f"Срок подписки увеличен на {days_to_extend} дней",
-                        url="/cabinet",
-                        tag="kaira-payment",
-                    )
-
-            # 🔔 Уведомления
-            try:
-                await _send_markdown_or_plain(telegram_id, user_message)
-                logger.info("Сообщение пользователю отправлено")
-            except Exception as e:
-                logger.error("Ошибка отправки сообщения пользователю: %s", e)
-
-            if ADMIN_ID:
-                try:
-                    await _send_markdown_or_plain(ADMIN_ID, group_message)
-                    logger.info("Сообщение админу отправлено")
-                except Exception as e:
-                    logger.error("Ошибка отправки сообщения админу: %s", e)
-            else:
-                logger.warning("ADMIN_IDS не задан, уведомление админу не отправлено")
+                job_workers.notify()
+                return
+        except (TypeError, ValueError, AttributeError) as exc:
+            logger.error("Не удалось разобрать событие платежа %s: %s", payment_id, exc)
+        finally:
+            await asyncio.to_thread(db_utils.release_payment_claim, payment_id)
+    if ADMIN_ID:
+        await bot.send_message(
+            ADMIN_ID,
+            f"❌ Событие {event} платежа {payment_id} не обработано: {error}",
+        )
+
+
+payment_workers = PaymentEventWorkers(process_payment_event, on_dead=_on_dead_payment_event)
+
+
+async def _run_gift_create_job(payload: dict) -> None:
+    """Create the gift promo for a paid gift and queue the code delivery."""
+    payment_id = str(payload["payment_id"])
+    telegram_id = int(payload["telegram_id"])
+    days = int(payload["days"])
+    gift_code = str(payload["code"])
+    created = await asyncio.to_thread(db_utils.create_gift_promo_once, gift_code, days, telegram_id)
+    if created:
+        logger.info(f"[GIFT] Пользователь {telegram_id} теперь подарил ещё одну подписку.")
+
+    escape_gift_code = escape_markdown_v2(gift_code)
+    jobs = [
+        _telegram_job(
+            payment_id,
+            "user",
+            telegram_id,
+            f"✅ Платёж успешно завершен\\!\n"
+            f"Вы приобрели *подарочную подписку* на *{days}* дней\\.\n\n"
+            f"Передайте другу этот код: `{escape_gift_code}`",
+        ),
+        _push_job(
+            payment_id,
+            telegram_id=telegram_id,
+            title="Подарочный код готов",
+            body=f"Подписка на {days} дней — отправьте другу",
+            url="/cabinet/gifts",
+            tag="kaira-gift",
+        ),
+    ]
+    if ADMIN_ID:
+        jobs.append(_telegram_job(
+            payment_id,
+            "admin",
+            ADMIN_ID,
+            f"🎁 Подарок оформлен\\!\n"
+            f"Пользователь: {telegram_id}\n"
+            f"Срок: {days} дней\n"
+            f"Код: {escape_gift_code}",
+        ))
+    await _enqueue_jobs(jobs)
+
+
+async def _run_referral_award_job(payload: dict) -> None:
+    telegram_id = int(payload["telegram_id"])
+    user = await asyncio.to_thread(db_utils.get_user_by_id, telegram_id)
+    if user and user["referrer_tag"]:
+        applied = await asyncio.to_thread(db_utils.award_referral, user["referrer_tag"], telegram_id)
+        if applied:
+            logger.info(f"[Referral] Зачислен реферал: @{user['referrer_tag']} от {telegram_id}")
         else:
-            logger.warning("telegram_id не найден в metadata.")
+            logger.info(f"[Referral] Уже начислен: {telegram_id}")
     else:
-        logger.info("Получено событие '%s'. Обработка не требуется.", event)
-    # Можно обрабатывать и другие события (payment.waiting_for_capture и т.д.),
-    # но чаще достаточно только payment.succeeded
-    return web.json_response({"status": "ok"}, status=200)
+        logger.info(f"[Referral] Не начислен: {telegram_id}")
+
+
+async def _run_subscription_extend_job(payload: dict) -> None:
+    """
+    Extend a subscription queued by the web cabinet (promo codes). The days
+    are added at most once per promo usage, so a retry is always safe.
+    """
+    telegram_id = int(payload["telegram_id"])
+    days = int(payload["days"])
+    code = str(payload.get("code") or "")
+    push = _push_job(
+        f"promo:{code}:{telegram_id}",
+        telegram_id=telegram_id,
+        title="Промокод активирован",
+        body=f"Подписка продлена на {days} дней",
+        url="/cabinet",
+        tag="kaira-promo",
+    )
+    result = await asyncio.to_thread(
+        extend_subscription_by_telegram_id, telegram_id, days, promo_code=code, jobs=[push]
+    )
+    if isinstance(result, str) and result.startswith("❌"):
+        raise RuntimeError(result)
+    logger.info("Результат продления подписки: %s", result)
+    job_workers.notify()
+
+
+async def _run_telegram_message_job(payload: dict) -> None:
+    chat_id = int(payload["chat_id"])
+    try:
+        await _send_markdown_or_plain(chat_id, str(payload["text"]))
+    except TelegramForbiddenError as exc:
+        # Пользователь заблокировал бота — повтор не поможет.
+        raise PermanentJobError(f"chat {chat_id} is unreachable: {exc}") from exc
+
+
+async def _run_web_push_job(payload: dict) -> None:
+    await _send_web_push(**payload)
+
+
+async def _notify_admin_dead_job(kind: str, payload: dict, error: str) -> None:
+    if ADMIN_ID and kind != "telegram_message":
+        await bot.send_message(
+            ADMIN_ID,
+            f"❌ Фоновая задача {kind} не выполнена: {error}\n"
+            f"{json.dumps(payload, ensure_ascii=False)[:1000]}",
+        )
+
+
+job_workers = JobWorkers(
+    {
+        "gift_create": _run_gift_create_job,
+        "referral_award": _run_referral_award_job,
+        "subscription_extend": _run_subscription_extend_job,
+        "telegram_message": _run_telegram_message_job,
+        "web_push": _run_web_push_job,
+    },
+    on_dead=_notify_admin_dead_job,
+)
+
+
+async def report_recovered_payments(count: int) -> None:
+    """Reconciler hook: start crediting right away and tell the admin."""
+    payment_workers.notify()
+    if ADMIN_ID:
+        await bot.send_message(
+            ADMIN_ID,
+            f"🔄 Сверка с YooKassa: найдено оплаченных платежей без вебхука — {count}",
+        )
 
 # Дорогой прогер:
 #
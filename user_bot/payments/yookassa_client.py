@@ -1,8 +1,13 @@
+import asyncio
 import os
 import logging
+import uuid
 from pathlib import Path
+from urllib.parse import quote
+
+import aiohttp
 from dotenv import load_dotenv
-from yookassa import Configuration, Payment
+from yookassa.domain.response import PaymentResponse
 
 # Загружаем переменные окружения
 ROOT_DIR = Path(__file__).resolve().parents[2]
@@ -15,18 +20,104 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
 )
 
-# Подключение к YooKassa
+# Доступ к API YooKassa
 SHOP_ID = os.getenv("YOOKASSA_SHOP_ID")
 SECRET_KEY = os.getenv("YOOKASSA_SECRET_KEY")
 
 if not SHOP_ID or not SECRET_KEY:
     raise ValueError("YOOKASSA_SHOP_ID and YOOKASSA_SECRET_KEY must be set in the .env file.")
 
-Configuration.account_id = SHOP_ID
-Configuration.secret_key = SECRET_KEY
+YOOKASSA_API_URL = os.getenv("YOOKASSA_API_URL", "https://api.yookassa.ru/v3").rstrip("/")
+# Потолок на весь запрос к YooKassa (соединение + ответ) в async-клиенте.
+YOOKASSA_TIMEOUT_SECONDS = float(os.getenv("YOOKASSA_TIMEOUT_SECONDS", "15"))
+
+# Keep-alive пул соединений на event loop процесса; создаётся лениво.
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+
+
+class YooKassaError(Exception):
+    """Non-2xx answer from the YooKassa API."""
+
+    def __init__(self, status: int, body: str) -> None:
+        super().__init__(f"YooKassa API {status}: {body[:300]}")
+        self.status = status
+
+
+def _payment_request(amount, description, return_url, metadata: dict) -> dict:
+    return {
+        "amount": {
+            "value": str(amount),
+            "currency": "RUB"
+        },
+        "confirmation": {
+            "type": "redirect",
+            "return_url": return_url
+        },
+        "capture": True,
+        "description": description,
+        "metadata": metadata,
+        "receipt": {
+            "customer": {
+                "email": "no-reply@nitravpn.com"  # Можно указать email пользователя, если есть
+            },
+            "items": [
+                {
+                    "description": description,
+                    "quantity": "1.00",
+                    "amount": {
+                        "value": str(amount),
+                        "currency": "RUB"
+                    },
+                    "vat_code": 1,  # 1 — без НДС (для самозанятых)
+                    "payment_mode": "full_payment",
+                    "payment_subject": "service"
+                }
+            ]
+        }
+    }
+
+
+def _payment_metadata(telegram_id, days_to_extend, is_gift, metadata_extra: dict | None) -> dict:
+    metadata = {
+        "telegram_id": telegram_id,
+        "days_to_extend": days_to_extend,
+        "is_gift": "true" if is_gift else "false",
+    }
+    if metadata_extra:
+        metadata.update(metadata_extra)
+    return metadata
+
 
+def _get_session() -> aiohttp.ClientSession:
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(
+            auth=aiohttp.BasicAuth(str(SHOP_ID), str(SECRET_KEY)),
+            timeout=aiohttp.ClientTimeout(total=YOOKASSA_TIMEOUT_SECONDS),
+        )
+        _session_loop = loop
+    return _session
 
-def create_payment(
+
+async def close_session() -> None:
+    """Close the pooled session; call from the app shutdown hook."""
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+async def _request(method: str, path: str, **kwargs) -> PaymentResponse:
+    async with _get_session().request(method, f"{YOOKASSA_API_URL}{path}", **kwargs) as resp:
+        if resp.status >= 400:
+            raise YooKassaError(resp.status, await resp.text())
+        return PaymentResponse(await resp.json())
+
+
+async def create_payment_async(
     amount,
     description,
     return_url,
@@ -35,65 +126,33 @@ def create_payment(
     is_gift=False,
     metadata_extra: dict | None = None,
 ):
+    """
+    Create a payment over the pooled keep-alive session. Returns the SDK's
+    PaymentResponse model; a slow API raises asyncio.TimeoutError.
+    """
     logger.info(f"[PAYMENT] Создание платежа: amount={amount} description='{description}' "
                 f"telegram_id={telegram_id} is_gift={is_gift} days_to_extend={days_to_extend}")
-
+    metadata = _payment_metadata(telegram_id, days_to_extend, is_gift, metadata_extra)
     try:
-        metadata = {
-            "telegram_id": telegram_id,
-            "days_to_extend": days_to_extend,
-            "is_gift": "true" if is_gift else "false",
-        }
-        if metadata_extra:
-            metadata.update(metadata_extra)
-
-        payment = Payment.create({
-            "amount": {
-                "value": str(amount),
-                "currency": "RUB"
-            },
-            "confirmation": {
-                "type": "redirect",
-                "return_url": return_url
-            },
-            "capture": True,
-            "description": description,
-            "metadata": metadata,
-            "receipt": {
-                "customer": {
-                    "email": "no-reply@nitravpn.com"  # Можно указать email пользователя, если есть
-                },
-                "items": [
-                    {
-                        "description": description,
-                        "quantity": "1.00",
-                        "amount": {
-                            "value": str(amount),
-                            "currency": "RUB"
-                        },
-                        "vat_code": 1,  # 1 — без НДС (для самозанятых)
-                        "payment_mode": "full_payment",
-                        "payment_subject": "service"
-                    }
-                ]
-            }
-        })
-
-        logger.info(f"[PAYMENT] Платёж успешно создан. ID: {payment.id}")
-        return payment
-
+        payment = await _request(
+            "POST",
+            "/payments",
+            json=_payment_request(amount, description, return_url, metadata),
+            headers={"Idempotence-Key": str(uuid.uuid4())},
+        )
     except Exception as e:
-        logger.error(f"[PAYMENT] Ошибка создания платежа: {e}")
+        logger.error(f"[PAYMENT] Ошибка создания платежа: {e!r}")
         raise
+    logger.info(f"[PAYMENT] Платёж успешно создан. ID: {payment.id}")
+    return payment
 
 
-def fetch_payment(payment_id: str):
+async def fetch_payment_async(payment_id: str):
     """Fetch payment status/details from YooKassa API."""
     try:
-        payment = Payment.find_one(payment_id)
-        logger.info("[PAYMENT] Платёж получен из YooKassa: id=%s status=%s", payment_id, payment.status)
-        return payment
+        payment = await _request("GET", f"/payments/{quote(str(payment_id), safe='')}")
     except Exception as e:
-        logger.error("[PAYMENT] Ошибка получения платежа %s из YooKassa: %s", payment_id, e)
+        logger.error("[PAYMENT] Ошибка получения платежа %s из YooKassa: %r", payment_id, e)
         raise
-
+    logger.info("[PAYMENT] Платёж получен из YooKassa: id=%s status=%s", payment_id, payment.status)
+    return payment
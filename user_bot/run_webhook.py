@@ -1,9 +1,24 @@
+import asyncio
 import logging
+import multiprocessing
 import os
+import signal
+import time
 
 from aiohttp import web
 
-from payments.webhook import yookassa_webhook_handler
+from payments.webhook import (
+    bot,
+    close_web_push_session,
+    job_workers,
+    open_web_push_session,
+    payment_workers,
+    report_recovered_payments,
+    yookassa_webhook_handler,
+)
+from payments.reconcile import reconcile_loop
+from payments.timing import metrics_handler
+from payments.yookassa_client import close_session as close_yookassa_session
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,8 +33,11 @@ WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
 WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8000"))
 # Сколько секунд ждём корректного завершения in-flight запросов при остановке.
 WEBHOOK_SHUTDOWN_TIMEOUT = float(os.getenv("WEBHOOK_SHUTDOWN_TIMEOUT", "5"))
+# Число процессов на одном порту (SO_REUSEPORT). Всё общее состояние
+# (очередь событий, захваты платежей, flood-паузы) лежит в SQLite.
+WEBHOOK_PROCESSES = int(os.getenv("WEBHOOK_PROCESSES", "1"))
 
-app = web.Application()
+RECONCILER_TASK = web.AppKey("reconciler_task", asyncio.Task)
 
 
 @web.middleware
@@ -37,22 +55,106 @@ async def log_webhook_request(request: web.Request, handler):
 async def health_check_first(request: web.Request, handler):
     if request.method == "GET" and request.path in ("/health", "/healthz"):
         return web.json_response({"status": "ok"})
+    if request.method == "GET" and request.path == "/metrics":
+        return await metrics_handler(request)
     return await handler(request)
 
 
-app.middlewares.append(health_check_first)
-app.middlewares.append(log_webhook_request)
-app.router.add_post("/webhook-yookassa", yookassa_webhook_handler)
+async def start_clients(app: web.Application) -> None:
+    await open_web_push_session()
 
 
-if __name__ == "__main__":
+async def stop_clients(app: web.Application) -> None:
+    await close_web_push_session()
+    await close_yookassa_session()
+    await bot.session.close()
+
+
+async def start_payment_workers(app: web.Application) -> None:
+    payment_workers.start()
+    job_workers.start()
+
+
+async def stop_payment_workers(app: web.Application) -> None:
+    await payment_workers.stop()
+    # Незавершённые задачи остаются в background_jobs и будут взяты после рестарта.
+    await job_workers.stop()
+
+
+async def start_reconciler(app: web.Application) -> None:
+    app[RECONCILER_TASK] = asyncio.create_task(reconcile_loop(report_recovered_payments))
+
+
+async def stop_reconciler(app: web.Application) -> None:
+    task = app.get(RECONCILER_TASK)
+    if task is not None:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def create_app() -> web.Application:
+    """
+    App factory; also the gunicorn entry point:
+    gunicorn run_webhook:create_app --worker-class aiohttp.GunicornWebWorker
+    """
+    app = web.Application(middlewares=[health_check_first, log_webhook_request])
+    app.router.add_post("/webhook-yookassa", yookassa_webhook_handler)
+    app.on_startup.append(start_clients)
+    app.on_startup.append(start_payment_workers)
+    app.on_startup.append(start_reconciler)
+    # Cleanup runs in order: workers stop first, then the client sessions close.
+    app.on_cleanup.append(stop_reconciler)
+    app.on_cleanup.append(stop_payment_workers)
+    app.on_cleanup.append(stop_clients)
+    return app
+
+
+def serve(reuse_port: bool = False) -> None:
     # shutdown_timeout — после SIGINT/SIGTERM aiohttp ждёт N секунд завершения
     # текущих запросов и затем закрывает loop. Без этого systemd может ждать
     # до TimeoutStopSec (обычно 90s) и слать SIGKILL.
     web.run_app(
-        app,
+        create_app(),
         host=WEBHOOK_HOST,
         port=WEBHOOK_PORT,
         shutdown_timeout=WEBHOOK_SHUTDOWN_TIMEOUT,
         access_log=None,
+        reuse_port=reuse_port,
     )
+
+
+def supervise(processes: int) -> None:
+    """Run `processes` workers on one port and restart any that dies."""
+    stopping = False
+
+    def spawn(index: int) -> multiprocessing.Process:
+        proc = multiprocessing.Process(target=serve, args=(True,), name=f"webhook-{index}")
+        proc.start()
+        return proc
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for proc in workers:
+            if proc.is_alive():
+                proc.terminate()
+
+    workers = [spawn(i) for i in range(processes)]
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info("Запущено процессов webhook: %s", processes)
+    while not stopping:
+        for i, proc in enumerate(workers):
+            if not proc.is_alive() and not stopping:
+                logger.warning("Процесс %s завершился (код %s), перезапуск", proc.name, proc.exitcode)
+                workers[i] = spawn(i)
+        time.sleep(1)
+    for proc in workers:
+        proc.join(WEBHOOK_SHUTDOWN_TIMEOUT + 5)
+
+
+if __name__ == "__main__":
+    if WEBHOOK_PROCESSES > 1:
+        supervise(WEBHOOK_PROCESSES)
+    else:
+        serve()
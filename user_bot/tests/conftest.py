@@ -0,0 +1,21 @@
+"""Shared test setup: user_bot on the import path and a throwaway subscription DB."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+USER_BOT_DIR = Path(__file__).resolve().parents[1]
+if str(USER_BOT_DIR) not in sys.path:
+    sys.path.insert(0, str(USER_BOT_DIR))
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Point db_utils at an empty database file for the duration of a test."""
+    pytest.importorskip("dotenv")
+    from data import db_utils
+
+    monkeypatch.setattr(db_utils, "DB_PATH", str(tmp_path / "subscription.db"))
+    monkeypatch.setattr(db_utils, "_schema_ready", False)
+    return db_utils
@@ -0,0 +1,124 @@
+"""extend_subscription_by_telegram_id against an in-memory Remnawave panel."""
+
+import json
+
+import pytest
+
+requests = pytest.importorskip("requests")
+pytest.importorskip("remnawave_api")
+
+from app.clients.remnawave.client import RemnawaveClient  # noqa: E402
+from app.services.remnawave import vpn_service  # noqa: E402
+
+INFINITE = "2099-12-31T23:59:59.000Z"
+PAID_SQUAD = {"uuid": "sq-paid", "name": "internal-1", "info": {"membersCount": 3}, "inbounds": []}
+FREE_SQUAD = {"uuid": "sq-free", "name": "FREE", "info": {"membersCount": 10}, "inbounds": []}
+
+
+class FakeRemnawaveClient(RemnawaveClient):
+    """Real client whose HTTP layer answers from in-memory users and squads."""
+
+    def __init__(self, users: dict[str, dict], squads: list[dict]):
+        super().__init__("https://panel.test", "token", None, None, 5)
+        self.users = users
+        self.squads = squads
+        self.calls: list[tuple[str, str, dict | None]] = []
+
+    def _send(self, method, url, **kwargs):
+        self.request_count += 1
+        path = url[len(self._base_url):]
+        body = kwargs.get("json")
+        self.calls.append((method, path, body))
+        status, payload = self._handle(method, path, body)
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = json.dumps(payload).encode()
+        return response
+
+    def _handle(self, method, path, body):
+        if method == "GET" and path.startswith("/api/users/by-username/"):
+            user = self.users.get(path.rsplit("/", 1)[-1])
+            return (200, {"response": user}) if user else (404, {"message": "User not found"})
+        if method == "PATCH" and path == "/api/users":
+            self.users[body["username"]]["expireAt"] = body["expireAt"]
+            return 200, {"response": self.users[body["username"]]}
+        if method == "GET" and path == "/api/internal-squads":
+            return 200, {"response": {"internalSquads": self.squads}}
+        if method == "POST" and path == "/api/users/bulk/update-squads":
+            by_uuid = {squad["uuid"]: squad for squad in self.squads}
+            for user in self.users.values():
+                if user["uuid"] in body["uuids"]:
+                    user["activeInternalSquads"] = [by_uuid[uuid] for uuid in body["activeInternalSquads"]]
+            return 200, {"response": {"success": True}}
+        return 500, {"message": f"unexpected {method} {path}"}
+
+
+@pytest.fixture
+def panel(db, monkeypatch):
+    monkeypatch.setenv("REMNAWAVE_BASE_URL", "https://panel.test")
+    monkeypatch.setenv("INFINITE_EXPIRE_DATE", INFINITE)
+    monkeypatch.setenv("INTERNAL_SQUAD_PREFIX", "internal")
+    monkeypatch.setenv("FREE_SQUAD_NAME", "FREE")
+    client = FakeRemnawaveClient(users={}, squads=[PAID_SQUAD, FREE_SQUAD])
+    monkeypatch.setattr(vpn_service, "_client", lambda: client)
+    return client
+
+
+def _add_user(panel, telegram_id, *, expire_at=INFINITE, squads=(PAID_SQUAD,)):
+    panel.users[str(telegram_id)] = {
+        "uuid": f"user-{telegram_id}",
+        "username": str(telegram_id),
+        "expireAt": expire_at,
+        "activeInternalSquads": list(squads),
+    }
+
+
+def test_existing_paid_user_costs_one_panel_request(panel, db):
+    _add_user(panel, 1001)
+
+    result = vpn_service.extend_subscription_by_telegram_id(1001, 30, payment_id="pay-1")
+
+    assert result.startswith("✅")
+    assert panel.request_count == 1
+    assert [(method, path) for method, path, _ in panel.calls] == [("GET", "/api/users/by-username/1001")]
+    assert db.get_user_by_id(1001)["subscription_ends"] > 0
+
+
+def test_finite_expire_is_patched_to_infinity(panel):
+    _add_user(panel, 1002, expire_at="2025-01-01T00:00:00.000Z")
+
+    result = vpn_service.extend_subscription_by_telegram_id(1002, 30)
+
+    assert result.startswith("✅")
+    assert panel.request_count == 2
+    method, path, body = panel.calls[1]
+    assert (method, path) == ("PATCH", "/api/users")
+    assert body == {"username": "1002", "expireAt": vpn_service._infinite_expire_iso()}
+
+
+def test_free_user_is_restored_to_a_paid_squad(panel):
+    _add_user(panel, 1003, squads=(FREE_SQUAD,))
+
+    result = vpn_service.extend_subscription_by_telegram_id(1003, 30)
+
+    assert result.startswith("✅")
+    assert [(method, path) for method, path, _ in panel.calls] == [
+        ("GET", "/api/users/by-username/1003"),
+        ("GET", "/api/internal-squads"),
+        ("POST", "/api/users/bulk/update-squads"),
+    ]
+    assert panel.calls[2][2] == {"uuids": ["user-1003"], "activeInternalSquads": ["sq-paid"]}
+
+
+def test_repeated_payment_is_not_applied_twice(panel, db):
+    _add_user(panel, 1004)
+
+    vpn_service.extend_subscription_by_telegram_id(1004, 30, payment_id="pay-4")
+    ends = db.get_user_by_id(1004)["subscription_ends"]
+    requests_before = panel.request_count
+    result = vpn_service.extend_subscription_by_telegram_id(1004, 30, payment_id="pay-4")
+
+    assert result.startswith("ℹ️")
+    assert db.get_user_by_id(1004)["subscription_ends"] == ends
+    assert panel.request_count == requests_before
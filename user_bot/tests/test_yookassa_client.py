@@ -0,0 +1,161 @@
+"""payments.yookassa_client against a local aiohttp stand-in for the YooKassa API."""
+
+import asyncio
+import importlib
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("yookassa")
+pytest.importorskip("dotenv")
+
+from aiohttp import web  # noqa: E402
+
+
+class StandIn:
+    """Minimal /v3/payments endpoint that records what the client sent."""
+
+    def __init__(self):
+        self.peers: list[tuple] = []
+        self.requests: list[dict] = []
+        self.delay = 0.0
+        self.fail_status: int | None = None
+        self.runner: web.AppRunner | None = None
+        self.url = ""
+
+    def _payment(self, payment_id: str, metadata: dict) -> dict:
+        return {
+            "id": payment_id,
+            "status": "pending",
+            "paid": False,
+            "amount": {"value": "89.00", "currency": "RUB"},
+            "confirmation": {
+                "type": "redirect",
+                "confirmation_url": f"https://yoomoney.test/checkout/{payment_id}",
+            },
+            "created_at": "2026-01-01T00:00:00.000Z",
+            "description": "Оплата подписки на 1 мес.",
+            "metadata": metadata,
+            "recipient": {"account_id": "100500", "gateway_id": "100700"},
+            "refundable": False,
+            "test": True,
+        }
+
+    async def _record(self, request: web.Request) -> None:
+        self.peers.append(request.transport.get_extra_info("peername"))
+        body = await request.json() if request.can_read_body else None
+        self.requests.append({"method": request.method, "headers": dict(request.headers), "json": body})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    async def create(self, request: web.Request) -> web.Response:
+        await self._record(request)
+        if self.fail_status:
+            return web.json_response({"type": "error", "code": "invalid_request"}, status=self.fail_status)
+        return web.json_response(self._payment("pay-1", self.requests[-1]["json"]["metadata"]))
+
+    async def fetch(self, request: web.Request) -> web.Response:
+        await self._record(request)
+        return web.json_response(self._payment(request.match_info["payment_id"], {"telegram_id": "7"}))
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v3/payments", self.create)
+        app.router.add_get("/v3/payments/{payment_id}", self.fetch)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v3"
+
+    async def stop(self) -> None:
+        await self.runner.cleanup()
+
+
+@pytest.fixture
+def yookassa(monkeypatch):
+    monkeypatch.setenv("YOOKASSA_SHOP_ID", "shop")
+    monkeypatch.setenv("YOOKASSA_SECRET_KEY", "secret")
+    module = importlib.import_module("payments.yookassa_client")
+    monkeypatch.setattr(module, "SHOP_ID", "shop")
+    monkeypatch.setattr(module, "SECRET_KEY", "secret")
+    monkeypatch.setattr(module, "YOOKASSA_TIMEOUT_SECONDS", 0.5)
+    return module
+
+
+def run_with_stand_in(yookassa, monkeypatch, scenario):
+    async def main():
+        stand_in = StandIn()
+        await stand_in.start()
+        monkeypatch.setattr(yookassa, "YOOKASSA_API_URL", stand_in.url)
+        try:
+            return await scenario(stand_in)
+        finally:
+            await yookassa.close_session()
+            await stand_in.stop()
+
+    return asyncio.run(main())
+
+
+def test_payment_response_shape(yookassa, monkeypatch):
+    async def scenario(stand_in):
+        payment = await yookassa.create_payment_async(
+            amount=89,
+            description="Оплата подписки на 1 мес.",
+            return_url="https://t.me/bot",
+            telegram_id=7,
+            days_to_extend=30,
+        )
+        return payment, stand_in.requests[0]
+
+    payment, sent = run_with_stand_in(yookassa, monkeypatch, scenario)
+
+    assert payment.id == "pay-1"
+    assert payment.status == "pending"
+    assert payment.confirmation.confirmation_url == "https://yoomoney.test/checkout/pay-1"
+    assert payment.metadata == {"telegram_id": 7, "days_to_extend": 30, "is_gift": "false"}
+    assert sent["headers"]["Authorization"].startswith("Basic ")
+    assert sent["headers"]["Idempotence-Key"]
+    assert sent["json"]["amount"] == {"value": "89", "currency": "RUB"}
+
+
+def test_connection_is_reused(yookassa, monkeypatch):
+    async def scenario(stand_in):
+        await yookassa.fetch_payment_async("pay-1")
+        await yookassa.fetch_payment_async("pay-2")
+        await yookassa.fetch_payment_async("pay-3")
+        return stand_in.peers
+
+    peers = run_with_stand_in(yookassa, monkeypatch, scenario)
+
+    assert len(peers) == 3
+    assert len(set(peers)) == 1
+
+
+def test_slow_api_hits_the_timeout(yookassa, monkeypatch):
+    async def scenario(stand_in):
+        stand_in.delay = 2.0
+        with pytest.raises(asyncio.TimeoutError):
+            await yookassa.fetch_payment_async("pay-1")
+
+    run_with_stand_in(yookassa, monkeypatch, scenario)
+
+
+def test_non_2xx_raises_yookassa_error(yookassa, monkeypatch):
+    async def scenario(stand_in):
+        stand_in.fail_status = 400
+        with pytest.raises(yookassa.YooKassaError) as excinfo:
+            await yookassa.create_payment_async(
+                amount=89,
+                description="Оплата",
+                return_url="https://t.me/bot",
+                telegram_id=7,
+                days_to_extend=30,
+            )
+        return excinfo.value
+
+    error = run_with_stand_in(yookassa, monkeypatch, scenario)
+
+    assert error.status == 400
+    assert "invalid_request" in str(error)
@@ -0,0 +1,223 @@
+"""
+Outbound gateway: one priority queue and rate limiter per bot token.
+
+Every Bot API call that delivers or edits a message passes through
+`OutboundMiddleware`, which takes a slot from the gateway of the bot's token.
+Callers tag bulk traffic with `outbound_priority(...)`; everything else
+(handler replies, payment notifications) is TRANSACTIONAL and is served
+first, so a nurture pass never delays a reply to a user.
+
+This is the only implementation: admin_bot imports it as well and passes its
+own store. State shared by every process sending through a token (user_bot,
+each webhook worker, admin_bot) lives in the database:
+
+* `outbound_pauses` — a RetryAfter pauses the whole token everywhere;
+* `outbound_peers` — gateways that are sending heartbeat while they have
+  waiters, and the rate is split evenly between the active ones, so the
+  total stays within `rate` however many processes run.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Awaitable, Callable, Iterable, Protocol, TypeVar
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "25"))
+OUTBOUND_MAX_RETRIES = int(os.getenv("OUTBOUND_MAX_RETRIES", "2"))
+BULK_SEND_CONCURRENCY = int(os.getenv("BULK_SEND_CONCURRENCY", "8"))
+# How often a waiting gateway heartbeats and re-reads the shared state.
+SHARED_SYNC_SECONDS = 2.0
+# A peer that has not heartbeated for this long no longer takes a share.
+PEER_TTL_SECONDS = 3 * SHARED_SYNC_SECONDS
+
+_LIMITED_PREFIXES = ("Send", "Edit", "Copy", "Forward")
+_PEER_ID = uuid.uuid4().hex
+
+
+class Priority(IntEnum):
+    TRANSACTIONAL = 0
+    ALERT = 1
+    MARKETING = 2
+
+
+class OutboundStore(Protocol):
+    """Database state shared by the gateways of every process."""
+
+    async def sync(self, bot_id: int, peer: str, now: float, active_since: float) -> tuple[float, int]:
+        """Heartbeat `peer`; return (paused_until, number of active peers)."""
+
+    async def set(self, bot_id: int, paused_until: float) -> None:
+        """Pause the token until `paused_until` (never shortens a pause)."""
+
+
+_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.TRANSACTIONAL)
+
+
+@contextmanager
+def outbound_priority(priority: Priority):
+    """Send everything inside the block (and tasks created in it) with `priority`."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class OutboundGateway:
+    """Token bucket that hands out slots to waiters in priority order."""
+
+    def __init__(self, bot_id: int, rate: float, store: OutboundStore):
+        self.bot_id = bot_id
+        self.total_rate = max(0.1, float(rate))
+        self.rate = self.total_rate
+        self.peers = 1
+        self._store = store
+        # Start almost empty: the share of the rate is unknown until the first sync.
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._shared_checked = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._task: asyncio.Task | None = None
+
+    async def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + max(0.0, float(seconds)))
+        try:
+            await self._store.set(self.bot_id, time.time() + max(0.0, float(seconds)))
+        except Exception as exc:
+            logger.warning("Failed to share outbound pause for bot %s: %s", self.bot_id, exc)
+
+    async def _sync_shared(self) -> None:
+        now = time.monotonic()
+        if now - self._shared_checked < SHARED_SYNC_SECONDS:
+            return
+        self._shared_checked = now
+        wall = time.time()
+        try:
+            until_ts, peers = await self._store.sync(
+                self.bot_id, _PEER_ID, wall, wall - PEER_TTL_SECONDS
+            )
+        except Exception as exc:
+            logger.warning("Failed to sync outbound state for bot %s: %s", self.bot_id, exc)
+            return
+        self.peers = max(1, int(peers))
+        self.rate = self.total_rate / self.peers
+        self._tokens = min(self._tokens, self.rate)
+        remaining = until_ts - wall
+        if remaining > 0:
+            self._paused_until = max(self._paused_until, now + remaining)
+
+    async def acquire(self, priority: Priority) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._seq), future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self) -> None:
+        while self._waiters:
+            await self._sync_shared()
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(min(self._paused_until - now, SHARED_SYNC_SECONDS))
+                continue
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # Waiter was cancelled while queued.
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+
+
+_gateways: dict[int, OutboundGateway] = {}
+
+
+def get_gateway(bot: Bot, rate: float, store: OutboundStore) -> OutboundGateway:
+    gateway = _gateways.get(bot.id)
+    if gateway is None:
+        gateway = _gateways[bot.id] = OutboundGateway(bot.id, rate, store)
+    return gateway
+
+
+class OutboundMiddleware(BaseRequestMiddleware):
+    """Session middleware that routes message-sending calls through the gateway."""
+
+    def __init__(
+        self,
+        store: OutboundStore,
+        *,
+        rate: float = OUTBOUND_RATE_PER_SECOND,
+        max_retries: int = OUTBOUND_MAX_RETRIES,
+    ) -> None:
+        self.store = store
+        self.rate = rate
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if not type(method).__name__.startswith(_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+        gateway = get_gateway(bot, self.rate, self.store)
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            await gateway.acquire(priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc:
+                await gateway.pause(exc.retry_after)
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logger.warning("Flood wait %ss on %s, retry %s", exc.retry_after, type(method).__name__, attempt)
+
+
+async def send_bulk(
+    items: Iterable[T],
+    send_one: Callable[[T], Awaitable[None]],
+    *,
+    concurrency: int = BULK_SEND_CONCURRENCY,
+) -> list[tuple[T, Exception]]:
+    """
+    Call `send_one` for every item with at most `concurrency` calls in flight.
+    Pacing and flood waits are handled by the gateway. Returns the failures.
+    """
+    pending = iter(list(items))
+    failures: list[tuple[T, Exception]] = []
+
+    async def worker() -> None:
+        for item in pending:
+            try:
+                await send_one(item)
+            except Exception as exc:
+                failures.append((item, exc))
+
+    await asyncio.gather(*(worker() for _ in range(max(1, int(concurrency)))))
+    return failures
@@ -0,0 +1,18 @@
+"""user_bot's `OutboundStore`: the shared gateway state in `subscription.db`."""
+
+import asyncio
+
+from data.db_utils import set_outbound_pause, sync_outbound_peer
+
+
+class DbOutboundStore:
+    """Runs the sqlite calls in a thread so the event loop never blocks on them."""
+
+    async def sync(self, bot_id: int, peer: str, now: float, active_since: float) -> tuple[float, int]:
+        return await asyncio.to_thread(sync_outbound_peer, bot_id, peer, now, active_since)
+
+    async def set(self, bot_id: int, paused_until: float) -> None:
+        await asyncio.to_thread(set_outbound_pause, bot_id, paused_until)
+
+
+db_outbound_store = DbOutboundStore()
@@ -0,0 +1,33 @@
+import logging
+
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+from data.db_utils import mark_chat_unreachable
+
+logger = logging.getLogger(__name__)
+
+
+def unreachable_reason(exc: BaseException) -> str | None:
+    """Short reason if the chat can't receive messages at all, else None."""
+    text = str(exc).lower()
+    if isinstance(exc, TelegramForbiddenError):
+        if "blocked" in text:
+            return "blocked"
+        if "deactivated" in text:
+            return "deactivated"
+        return "forbidden"
+    if isinstance(exc, TelegramBadRequest) and ("chat not found" in text or "user not found" in text):
+        return "chat not found"
+    return None
+
+
+def record_send_error(telegram_id: int, exc: BaseException) -> bool:
+    """Mark the chat unreachable if `exc` says so; returns True when marked."""
+    reason = unreachable_reason(exc)
+    if not reason:
+        return False
+    try:
+        mark_chat_unreachable(int(telegram_id), reason)
+    except Exception:
+        logger.exception("Failed to store reachability for %s", telegram_id)
+    return True
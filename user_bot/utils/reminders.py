@@ -4,8 +4,11 @@ import logging, sqlite3
 import os
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram import Bot
-from datetime import datetime
-from data.db_utils import get_db
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Collection
+from data.db_utils import REACHABLE_SQL, get_db
+from utils.outbound import Priority, outbound_priority, send_bulk
+from utils.reachability import record_send_error
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +21,17 @@ REMINDER_TEXT = (
 )
 
 LTE_LOW_THRESHOLD_BYTES = 500 * 1024 * 1024
+LTE_ALERTS_INTERVAL_SECONDS = 300
+# A row whose send failed transiently is retried after this delay (while still in
+# the lookback); other rows of the same reminder are not held back.
+REMINDER_RETRY_DELAY_SECONDS = 3600
+# More failed rows than this look like an outage: the whole reminder waits instead
+# (also keeps the NOT IN list of held rows well below SQLite's parameter limit).
+REMINDER_RETRY_MAX_HELD = 500
+# Nurture messages due longer ago than this are not sent any more.
+NURTURE_LOOKBACK_SECONDS = 30 * SECONDS_DAY
+# A user who is behind gets the next nurture stage no sooner than this after the last one.
+NURTURE_MIN_GAP_SECONDS = SECONDS_DAY
 
 pay_kb = InlineKeyboardMarkup(
     inline_keyboard=[
@@ -25,38 +39,120 @@ pay_kb = InlineKeyboardMarkup(
     ]
 )
 
-def get_users_with_expiring_subscriptions():
+@dataclass(frozen=True)
+class DueBranch:
+    """Rows matching `where` become due at `column + offset` seconds."""
+
+    where: str
+    offset: int
+
+
+@dataclass(frozen=True)
+class DueReminder:
     """
-    Возвращает список пользователей, у которых подписка истекает в ближайшие 24 часа
-    и которым ещё не было отправлено напоминание.
+    A reminder over `subscription` rows, with one or more due branches.
+
+    A row is pending while its branch `where` holds: the per-user flag or
+    stage says the message was not sent yet, and sending it flips the flag.
+    Each run fetches every pending row due in (now - lookback, now], so a row
+    whose due time moved into the past (an earlier end date, the next nurture
+    stage after a late one, a restart) is still sent; the watermark
+    now - lookback is only the lower bound of the scan. Every branch is a
+    range scan of an index on (`where` columns, `column`); the fetch ORs the
+    branches into one query and tags each row with the index of its branch.
     """
+
+    name: str
+    column: str
+    branches: tuple[DueBranch, ...]
+    send: Callable[[Bot, list[sqlite3.Row]], Awaitable[list[sqlite3.Row]]]
+    priority: Priority
+    lookback: int
+
+
+def _scan_floor(reminder: DueReminder, now_ts: int) -> int:
+    """Pending rows due at or before this are no longer sent."""
+    return now_ts - reminder.lookback
+
+
+def _excluded_sql(exclude: Collection[int]) -> str:
+    if not exclude:
+        return ""
+    return f" AND telegram_id NOT IN ({', '.join('?' for _ in exclude)})"
+
+
+def _fetch_due_rows(
+    reminder: DueReminder, watermark: int, now_ts: int, exclude: Collection[int] = ()
+) -> list[sqlite3.Row]:
+    """Pending rows due in (watermark, now_ts], except `exclude`, with `branch` and `due_at`."""
+    column = reminder.column
+    branch_case = " ".join(
+        f"WHEN {branch.where} THEN {i}" for i, branch in enumerate(reminder.branches)
+    )
+    due_case = " ".join(
+        f"WHEN {branch.where} THEN {column} + {int(branch.offset)}" for branch in reminder.branches
+    )
+    windows = " OR ".join(
+        f"({branch.where} AND {column} > ? AND {column} <= ?)" for branch in reminder.branches
+    )
+    params: list[int] = []
+    for branch in reminder.branches:
+        params += [watermark - branch.offset, now_ts - branch.offset]
     with get_db() as conn:
         conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        now = int(time.time())
-        cursor.execute("""
-            SELECT telegram_id, subscription_ends, telegram_tag
+        cur = conn.execute(
+            f"""
+            SELECT telegram_id,
+                   CASE {branch_case} END AS branch,
+                   CASE {due_case} END AS due_at
             FROM subscription
-            WHERE reminded = 0 AND subscription_ends BETWEEN ? AND ?
-        """, (now, now + 86400))
-        rows = cursor.fetchall()
-
-    # Преобразуем в список словарей и подставим chat_id = telegram_id
-    return [
-        {
-            **dict(row),
-            "chat_id": row["telegram_id"]  # используем telegram_id как chat_id
-        }
-        for row in rows
-    ]
+            WHERE ({windows})
+              AND {REACHABLE_SQL.format(column="telegram_id")}{_excluded_sql(exclude)}
+            ORDER BY due_at
+            """,
+            (*params, now_ts, *exclude),
+        )
+        return cur.fetchall()
 
-def _set_reminded_flag(telegram_id: int, value: int) -> None:
+
+def _next_due_at(
+    reminder: DueReminder, after_ts: int, now_ts: int, exclude: Collection[int] = ()
+) -> int | None:
+    """Earliest due time of a pending reachable row (not in `exclude`) strictly after `after_ts`."""
+    column = reminder.column
+    reachable = REACHABLE_SQL.format(column="telegram_id")
+    excluded = _excluded_sql(exclude)
+    parts = " UNION ALL ".join(
+        f"SELECT MIN({column}) + {int(branch.offset)} AS due FROM subscription "
+        f"WHERE {branch.where} AND {column} > ? AND {reachable}{excluded}"
+        for branch in reminder.branches
+    )
+    params: list[int] = []
+    for branch in reminder.branches:
+        params += [after_ts - branch.offset, now_ts, *exclude]
     with get_db() as conn:
-        conn.execute(
-            "UPDATE subscription SET reminded = ? WHERE telegram_id = ?",
-            (value, telegram_id),
-        )
-        conn.commit()
+        row = conn.execute(f"SELECT MIN(due) FROM ({parts})", params).fetchone()
+    if not row or row[0] is None:
+        return None
+    return int(row[0])
+
+
+async def run_due_reminder(
+    bot: Bot, reminder: DueReminder, now_ts: int, exclude: Collection[int] = ()
+) -> list[sqlite3.Row]:
+    """
+    Send `reminder` to every pending row that is due, skipping `exclude`.
+    Returns the rows that failed transiently; their flags are unchanged, so
+    a later run picks them up again.
+    """
+    rows = _fetch_due_rows(reminder, _scan_floor(reminder, now_ts), now_ts, exclude)
+    failed: list[sqlite3.Row] = []
+    if rows:
+        with outbound_priority(reminder.priority):
+            failed = await reminder.send(bot, rows)
+    logger.debug("Reminder %s: %s due, %s failed", reminder.name, len(rows), len(failed))
+    return failed
+
 
 def _mark_reminded_if_needed(telegram_id: int) -> bool:
     with get_db() as conn:
@@ -68,197 +164,252 @@ def _mark_reminded_if_needed(telegram_id: int) -> bool:
         conn.commit()
         return cur.rowcount > 0
 
-async def send_reminders(bot: Bot):
-    """Отправить напоминания и проставить flag reminded=1."""
-    users = get_users_with_expiring_subscriptions()
-    if not users:
-        logging.info("[INFO] Нет пользователей для напоминания.")
-        return
-
-    for u in users:
-        chat_id = u.get("chat_id")
-        if not chat_id:
-            logging.warning(f"[WARN] chat_id отсутствует ({u['telegram_id']})")
-            continue
+def _set_reminded_flag(telegram_id: int, value: int) -> None:
+    with get_db() as conn:
+        conn.execute(
+            "UPDATE subscription SET reminded = ? WHERE telegram_id = ?",
+            (value, telegram_id),
+        )
+        conn.commit()
 
+async def send_reminders(bot: Bot, rows: list[sqlite3.Row]) -> list[sqlite3.Row]:
+    """Отправить напоминания об истечении и проставить flag reminded=1."""
+    failed = []
+    for row in rows:
+        chat_id = row["telegram_id"]
         try:
-            if not _mark_reminded_if_needed(u["telegram_id"]):
+            if not _mark_reminded_if_needed(chat_id):
                 continue
             await bot.send_message(chat_id, REMINDER_TEXT, reply_markup=pay_kb)
             logging.info(f"[INFO] Напоминание отправлено {chat_id}")
         except Exception as e:
-            _set_reminded_flag(u["telegram_id"], 0)
+            _set_reminded_flag(chat_id, 0)
+            if not record_send_error(chat_id, e):
+                failed.append(row)
             logging.error(f"[ERROR] Не удалось отправить {chat_id}: {e}")
+    return failed
 
 async def reminders_scheduler(bot: Bot):
     """
-    Запускает цикл:
+    Цикл напоминаний:
     - LTE-алерты: каждые 5 минут
-    - прочие напоминания и nurture: раз в час
+    - напоминание об истечении и nurture: просыпаемся к ближайшему сроку
+      (но не реже раза в 5 минут, чтобы увидеть новых пользователей)
     """
-    last_hourly_tasks_ts: int | None = None
+    next_lte_ts = 0
+    # {reminder name: {telegram_id: retry at}} for rows whose send failed.
+    retry_at: dict[str, dict[int, int]] = {}
     while True:
         now_ts = int(time.time())
+        wake_ts = now_ts + LTE_ALERTS_INTERVAL_SECONDS
         try:
-            await send_lte_traffic_alerts(bot, now_ts)
-
-            run_hourly = (
-                last_hourly_tasks_ts is None
-                or (now_ts - last_hourly_tasks_ts) >= 3600
-            )
-            if run_hourly:
-                logger.debug("Запуск hourly reminders в %s", datetime.now())
-                await send_reminders(bot)
-                await send_nurture_channel(bot, now_ts)
-                await send_nurture_1(bot, now_ts)
-                await send_nurture_2(bot, now_ts)
-                await send_nurture_3(bot, now_ts)
-                last_hourly_tasks_ts = now_ts
-                logger.debug("Hourly reminders выполнены успешно")
+            if now_ts >= next_lte_ts:
+                with outbound_priority(Priority.ALERT):
+                    await send_lte_traffic_alerts(bot, now_ts)
+                next_lte_ts = now_ts + LTE_ALERTS_INTERVAL_SECONDS
+            wake_ts = min(wake_ts, next_lte_ts)
+
+            for reminder in DUE_REMINDERS:
+                held = retry_at.setdefault(reminder.name, {})
+                for telegram_id, held_until in list(held.items()):
+                    if held_until <= now_ts:
+                        del held[telegram_id]
+                if len(held) > REMINDER_RETRY_MAX_HELD:
+                    wake_ts = min(wake_ts, min(held.values()))
+                    continue
+                floor = _scan_floor(reminder, now_ts)
+                due_at = _next_due_at(reminder, floor, now_ts, held)
+                if due_at is not None and due_at <= now_ts:
+                    for row in await run_due_reminder(bot, reminder, now_ts, held):
+                        held[int(row["telegram_id"])] = now_ts + REMINDER_RETRY_DELAY_SECONDS
+                    if len(held) > REMINDER_RETRY_MAX_HELD:
+                        wake_ts = min(wake_ts, min(held.values()))
+                        continue
+                    due_at = _next_due_at(reminder, floor, now_ts, held)
+                if held:
+                    wake_ts = min(wake_ts, min(held.values()))
+                if due_at is not None:
+                    wake_ts = min(wake_ts, due_at)
         except Exception:
-            logger.exception("Ошибка в hourly reminders")
-        await asyncio.sleep(300)
-
-def get_users_for_nurture(now_ts: int, target_stage: int, days_after: int):
-    """
-    Возвращает пользователей, у которых nurture_stage == target_stage-1
-    и со дня создания прошло нужное число суток.
-    """
-    with get_db() as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT telegram_id
-            FROM subscription
-            WHERE nurture_stage = ?
-              AND created_at <= ?
-            """,
-            (target_stage - 1, now_ts - days_after * SECONDS_DAY)
-        )
-        return cur.fetchall()
-
-async def send_nurture_1(bot: Bot, now_ts: int):
-    users = get_users_for_nurture(now_ts, target_stage=2, days_after=3)
-    if not users:
-        return
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="☰ Открыть меню", callback_data="main_menu")]]
-    )
-    text_md = (
-        "💡 *Полезные команды бота*\n\n"
-        "• `/help` — помощь\n"
-        "• `/promo` — использовать промокоды\n"
-        "• `/gift` — подарить подписку\n"
-        "• `/ref` — реферальная программа\n"
-        "• `/pay` — продлить подписку"
-    )
-    await _broadcast_and_mark(bot, users, text_md, next_stage=2, kb=kb)
-
-async def send_nurture_2(bot: Bot, now_ts: int):
-    users = get_users_for_nurture(now_ts, target_stage=3, days_after=10)
-    if not users:
-        return
-    text_md = (
-        "👥 *Реферальная программа*\n\n"
-        "Приглашайте друзей и получайте бонусные дни\\!\n"
-        "Команда для участия: `/ref`"
-    )
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="🚀 Перейти к /ref", callback_data="referral_info")]]
-    )
-    await _broadcast_and_mark(bot, users, text_md, next_stage=3, kb=kb)
-
-async def send_nurture_3(bot: Bot, now_ts: int):
-    users = get_users_for_nurture(now_ts, target_stage=4, days_after=25)
-    if not users:
-        return
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="💳 Продлить", callback_data="subscription_tariffs")]]
-    )
-    text_md = (
-        "⏳ *Скоро закончится бесплатный период\\!*\n\n"
-        "Продлите подписку заранее командой `/pay` "
-        "или нажмите кнопку ниже\\."
-    )
-    await _broadcast_and_mark(bot, users, text_md, next_stage=4, kb=kb)
-
-async def send_nurture_channel(bot: Bot, now_ts: int):
-    users = get_users_for_nurture(now_ts, target_stage=1, days_after=1)
-    if not users:
-        return
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text="📢 Канал бота", url=STATUS_CHANNEL_URL)]]
-    )
-    text_md = (
-        "📢 *У нас есть Telegram\\-канал бота*\n\n"
-        "Там публикуем информацию о техработах, блокировках и важных обновлениях\\.\n"
-        "Подпишитесь, чтобы быть в курсе\\."
-    )
-    await _broadcast_and_mark(bot, users, text_md, next_stage=1, kb=kb)
+            logger.exception("Ошибка в планировщике напоминаний")
+        await asyncio.sleep(max(1, wake_ts - int(time.time())))
+
+# Nurture messages by the stage the user is at; sending one moves the user to
+# the next stage. `days` are counted from created_at.
+NURTURE_STAGES: tuple[dict, ...] = (
+    {
+        "days": 1,
+        "text": (
+            "📢 *У нас есть Telegram\\-канал бота*\n\n"
+            "Там публикуем информацию о техработах, блокировках и важных обновлениях\\.\n"
+            "Подпишитесь, чтобы быть в курсе\\."
+        ),
+        "kb": InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="📢 Канал бота", url=STATUS_CHANNEL_URL)]]
+        ),
+    },
+    {
+        "days": 3,
+        "text": (
+            "💡 *Полезные команды бота*\n\n"
+            "• `/help` — помощь\n"
+            "• `/promo` — использовать промокоды\n"
+            "• `/gift` — подарить подписку\n"
+            "• `/ref` — реферальная программа\n"
+            "• `/pay` — продлить подписку"
+        ),
+        "kb": InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="☰ Открыть меню", callback_data="main_menu")]]
+        ),
+    },
+    {
+        "days": 10,
+        "text": (
+            "👥 *Реферальная программа*\n\n"
+            "Приглашайте друзей и получайте бонусные дни\\!\n"
+            "Команда для участия: `/ref`"
+        ),
+        "kb": InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="🚀 Перейти к /ref", callback_data="referral_info")]]
+        ),
+    },
+    {
+        "days": 25,
+        "text": (
+            "⏳ *Скоро закончится бесплатный период\\!*\n\n"
+            "Продлите подписку заранее командой `/pay` "
+            "или нажмите кнопку ниже\\."
+        ),
+        "kb": InlineKeyboardMarkup(
+            inline_keyboard=[[InlineKeyboardButton(text="💳 Продлить", callback_data="subscription_tariffs")]]
+        ),
+    },
+)
 
 def update_stage(telegram_ids: list[int], stage: int):
+    """Move users from stage-1 to `stage` in one transaction."""
     if not telegram_ids:
         return
-    q_marks = ",".join("?" * len(telegram_ids))
+    now_ts = int(time.time())
     with get_db() as conn:
-        conn.execute(
-            f"UPDATE subscription SET nurture_stage = ? WHERE telegram_id IN ({q_marks})",
-            (stage, *telegram_ids)
+        conn.executemany(
+            """
+            UPDATE subscription SET nurture_stage = ?, nurture_sent_at = ?
+            WHERE telegram_id = ? AND nurture_stage = ?
+            """,
+            [(stage, now_ts, telegram_id, stage - 1) for telegram_id in telegram_ids],
         )
         conn.commit()
 
-async def _broadcast_and_mark(bot: Bot, rows, text, next_stage: int, kb):
-    succeeded = []
+async def send_nurture(bot: Bot, rows: list[sqlite3.Row]) -> list[sqlite3.Row]:
+    """
+    Send every due nurture message in one pass. `branch` of a row is the
+    user's current stage; sends share one bounded worker pool (pacing comes
+    from the outbound gateway). Returns rows that failed for a transient reason.
+    """
+    async def send_one(row: sqlite3.Row) -> None:
+        stage = NURTURE_STAGES[int(row["branch"])]
+        await bot.send_message(row["telegram_id"], stage["text"],
+                               parse_mode="MarkdownV2",
+                               reply_markup=stage["kb"])
+
+    failures = await send_bulk(rows, send_one)
+    failed_ids = {int(row["telegram_id"]) for row, _ in failures}
+    failed = []
+    for row, exc in failures:
+        if not record_send_error(row["telegram_id"], exc):
+            failed.append(row)
+        logging.error(f"Nurture send fail {row['telegram_id']}: {exc}")
+
+    succeeded_by_stage: dict[int, list[int]] = {}
     for row in rows:
-        try:
-            await bot.send_message(row["telegram_id"], text,
-                                   parse_mode="MarkdownV2",
-                                   reply_markup=kb)
-            succeeded.append(row["telegram_id"])
-        except Exception as e:
-            logging.error(f"Nurture send fail {row['telegram_id']}: {e}")
-
-    update_stage(succeeded, next_stage)
+        if int(row["telegram_id"]) not in failed_ids:
+            succeeded_by_stage.setdefault(int(row["branch"]), []).append(int(row["telegram_id"]))
+    for stage, telegram_ids in succeeded_by_stage.items():
+        update_stage(telegram_ids, stage + 1)
+    return failed
+
+
+# Expiry reminder: 24h before subscription_ends (indexed on reminded, subscription_ends).
+# Nurture: one branch per stage, `days` after created_at for users at that stage
+# (indexed on nurture_stage, created_at), and at least NURTURE_MIN_GAP_SECONDS
+# after the previous stage, so a user who is behind gets one stage at a time.
+# Rows held back by the gap are picked up by the regular 5-minute wake-up.
+DUE_REMINDERS: tuple[DueReminder, ...] = (
+    DueReminder(
+        name="expiry",
+        column="subscription_ends",
+        branches=(DueBranch(where="reminded = 0", offset=-SECONDS_DAY),),
+        send=send_reminders,
+        priority=Priority.ALERT,
+        lookback=SECONDS_DAY,
+    ),
+    DueReminder(
+        name="nurture",
+        column="created_at",
+        branches=tuple(
+            DueBranch(
+                where=(
+                    f"nurture_stage = {stage} AND COALESCE(nurture_sent_at, 0)"
+                    f" <= CAST(strftime('%s', 'now') AS INTEGER) - {NURTURE_MIN_GAP_SECONDS}"
+                ),
+                offset=item["days"] * SECONDS_DAY,
+            )
+            for stage, item in enumerate(NURTURE_STAGES)
+        ),
+        send=send_nurture,
+        priority=Priority.MARKETING,
+        lookback=NURTURE_LOOKBACK_SECONDS,
+    ),
+)
 
 
 def _get_users_for_lte_alerts(now_ts: int) -> list[sqlite3.Row]:
+    """
+    Active users whose LTE alert state has to change: a low or zero alert
+    that was not sent yet, or flags to reset after a top-up. Steady-state
+    rows are filtered out by SQL via the idx_lte_traffic_limits_notified_* indexes.
+    """
     with get_db() as conn:
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         cursor.execute(
-            """
+            f"""
             SELECT
-                s.telegram_id,
-                s.subscription_ends,
+                l.tg_id AS telegram_id,
                 l.last_remaining_bytes,
                 l.notified_lte_low,
                 l.notified_lte_zero
-            FROM subscription s
-            JOIN lte_traffic_limits l ON l.tg_id = s.telegram_id
-            WHERE s.subscription_ends > ?
+            FROM lte_traffic_limits l
+            JOIN subscription s ON s.telegram_id = l.tg_id
+            WHERE (
+                    (l.notified_lte_low = 0 AND l.last_remaining_bytes > 0 AND l.last_remaining_bytes < ?)
+                 OR (l.notified_lte_zero = 0 AND l.last_remaining_bytes <= 0)
+                 OR (l.notified_lte_low > 0 AND l.last_remaining_bytes >= ?)
+                 OR (l.notified_lte_zero > 0 AND l.last_remaining_bytes >= ?)
+              )
+              AND s.subscription_ends > ?
+              AND {REACHABLE_SQL.format(column="l.tg_id")}
             """,
-            (now_ts,),
+            (
+                LTE_LOW_THRESHOLD_BYTES,
+                LTE_LOW_THRESHOLD_BYTES,
+                LTE_LOW_THRESHOLD_BYTES,
+                now_ts,
+                now_ts,
+            ),
         )
         return cursor.fetchall()
 
 
-def _set_lte_alert_flags(telegram_id: int, low: int | None = None, zero: int | None = None) -> None:
-    updates = []
-    params: list[int] = []
-    if low is not None:
-        updates.append("notified_lte_low = ?")
-        params.append(int(low))
-    if zero is not None:
-        updates.append("notified_lte_zero = ?")
-        params.append(int(zero))
+def _write_lte_alert_flags(updates: list[tuple[int, int, int]]) -> None:
+    """Persist (low, zero, tg_id) flag triples in one transaction."""
     if not updates:
         return
-    params.append(telegram_id)
     with get_db() as conn:
-        conn.execute(
-            f"UPDATE lte_traffic_limits SET {', '.join(updates)} WHERE tg_id = ?",
-            tuple(params),
+        conn.executemany(
+            "UPDATE lte_traffic_limits SET notified_lte_low = ?, notified_lte_zero = ? WHERE tg_id = ?",
+            updates,
         )
         conn.commit()
 
@@ -272,45 +423,40 @@ async def send_lte_traffic_alerts(bot: Bot, now_ts: int) -> None:
         inline_keyboard=[[InlineKeyboardButton(text="📶 Купить LTE Гб", callback_data="lte_gb_menu")]]
     )
 
+    flag_updates: list[tuple[int, int, int]] = []
+    alerts: list[tuple[int, str, tuple[int, int]]] = []
     for row in rows:
         telegram_id = int(row["telegram_id"])
         remaining = max(0, int(row["last_remaining_bytes"] or 0))
-        notified_low = int(row["notified_lte_low"] or 0)
-        notified_zero = int(row["notified_lte_zero"] or 0)
 
         # Reset flags when user is above warning threshold again.
         if remaining >= LTE_LOW_THRESHOLD_BYTES:
-            if notified_low or notified_zero:
-                _set_lte_alert_flags(telegram_id, low=0, zero=0)
-            continue
-
-        if remaining == 0:
-            if notified_zero:
-                continue
-            try:
-                await bot.send_message(
-                    telegram_id,
-                    "🚫 LTE трафик закончился.\n\n"
-                    "Чтобы продолжить пользоваться LTE серверами, докупите LTE Гб.",
-                    reply_markup=lte_buy_kb,
-                )
-                _set_lte_alert_flags(telegram_id, low=1, zero=1)
-            except Exception as e:
-                logger.error("LTE zero alert send fail %s: %s", telegram_id, e)
-            continue
-
-        # Here: 0 < remaining < 500MB
-        if notified_low:
-            continue
-        try:
+            flag_updates.append((0, 0, telegram_id))
+        elif remaining == 0:
+            alerts.append((
+                telegram_id,
+                "🚫 LTE трафик закончился.\n\n"
+                "Чтобы продолжить пользоваться LTE серверами, докупите LTE Гб.",
+                (1, 1),
+            ))
+        else:
+            # Here: 0 < remaining < 500MB
             remaining_mb = max(1, remaining // (1024 * 1024))
-            await bot.send_message(
+            alerts.append((
                 telegram_id,
                 "⚠️ LTE трафик почти закончился.\n"
                 f"Осталось меньше 500 МБ (сейчас примерно {remaining_mb} МБ).\n\n"
                 "Можно докупить LTE Гб заранее:",
-                reply_markup=lte_buy_kb,
-            )
-            _set_lte_alert_flags(telegram_id, low=1, zero=0)
-        except Exception as e:
-            logger.error("LTE low alert send fail %s: %s", telegram_id, e)
+                (1, 0),
+            ))
+
+    async def send_alert(alert: tuple[int, str, tuple[int, int]]) -> None:
+        telegram_id, text, (low, zero) = alert
+        await bot.send_message(telegram_id, text, reply_markup=lte_buy_kb)
+        flag_updates.append((low, zero, telegram_id))
+
+    for (telegram_id, _, _), e in await send_bulk(alerts, send_alert):
+        record_send_error(telegram_id, e)
+        logger.error("LTE alert send fail %s: %s", telegram_id, e)
+
+    _write_lte_alert_flags(flag_updates)
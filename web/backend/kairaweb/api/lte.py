@@ -5,12 +5,13 @@ from __future__ import annotations
 import logging
 from typing import Any
 
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Query, Request
 from pydantic import BaseModel
 
 from kairaweb.api.deps import current_user
 from kairaweb.core.settings import ensure_user_bot_on_path, get_settings
 from kairaweb.services.payments import create_lte_payment
+from kairaweb.services.user_service import get_lte_usage_series
 
 ensure_user_bot_on_path()
 
@@ -36,6 +37,17 @@ async def lte_packages() -> dict[str, Any]:
     }
 
 
+@router.get("/usage")
+async def lte_usage(days: int = Query(30, ge=1, le=90), user=current_user) -> dict[str, Any]:
+    series = get_lte_usage_series(int(user["telegram_id"]), days)
+    total_bytes = sum(item["bytes"] for item in series)
+    return {
+        "days": series,
+        "total_bytes": total_bytes,
+        "total_gb": round(total_bytes / (1024 ** 3), 2),
+    }
+
+
 @router.post("/buy")
 async def lte_buy(payload: LtePurchaseRequest, request: Request, user=current_user) -> dict[str, Any]:
     settings = get_settings()
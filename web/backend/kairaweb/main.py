@@ -23,6 +23,8 @@ from kairaweb.api.servers import router as servers_router
 from kairaweb.api.subscription import router as subscription_router
 from kairaweb.core.security import decode_session_token
 from kairaweb.core.settings import get_settings, validate_required_env
+# kairaweb.core.settings puts user_bot on sys.path.
+from payments.yookassa_client import close_session as close_yookassa_session  # (user_bot)
 
 
 logger = logging.getLogger(__name__)
@@ -89,6 +91,10 @@ def create_app() -> FastAPI:
         validate_required_env()
         logger.info("kairavpn_web_api startup ok env=%s", settings.web_env)
 
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        await close_yookassa_session()
+
     @app.get("/")
     async def index() -> dict[str, Any]:
         return {"service": "kairavpn-web-api", "status": "ok"}
@@ -15,12 +15,13 @@ from app.services.remnawave import vpn_service  # noqa: E402  (user_bot)
 from data import db_utils  # noqa: E402
 from handlers.utils import get_subscription_price  # noqa: E402  (user_bot)
 from handlers.payments import LTE_GB_PRICES  # noqa: E402  (user_bot)
-from payments.yookassa_client import create_payment, fetch_payment  # noqa: E402  (user_bot)
+from payments.ledger import record_payment  # noqa: E402  (user_bot)
+from payments.timing import payment_trace, stage  # noqa: E402  (user_bot)
+from payments.yookassa_client import create_payment_async, fetch_payment_async  # noqa: E402  (user_bot)
 
 
 logger = logging.getLogger(__name__)
 
-YOOKASSA_CALL_TIMEOUT_SECONDS = 15.0
 REMNAWAVE_EXTEND_TIMEOUT_SECONDS = 20.0
 
 
@@ -32,20 +33,6 @@ GIFT_TARIFFS: dict[int, dict[str, int]] = {
 }
 
 
-async def _create_payment_async(**kwargs):
-    return await asyncio.wait_for(
-        asyncio.to_thread(create_payment, **kwargs),
-        timeout=YOOKASSA_CALL_TIMEOUT_SECONDS,
-    )
-
-
-async def _fetch_payment_async(payment_id: str):
-    return await asyncio.wait_for(
-        asyncio.to_thread(fetch_payment, payment_id),
-        timeout=YOOKASSA_CALL_TIMEOUT_SECONDS,
-    )
-
-
 async def create_subscription_payment(
     *,
     telegram_id: int,
@@ -59,7 +46,7 @@ async def create_subscription_payment(
     amount = get_subscription_price(months, referred_people)
     days_to_extend = months * 30
     description = f"Оплата подписки на {months} мес."
-    payment = await _create_payment_async(
+    payment = await create_payment_async(
         amount=amount,
         description=description,
         return_url=return_url,
@@ -68,6 +55,7 @@ async def create_subscription_payment(
     )
     payment_id = str(payment.id)
     await asyncio.to_thread(db_utils.update_payment_status, payment_id, str(payment.status))
+    await record_payment(payment, "created", source="web")
     return {
         "payment_id": payment_id,
         "status": str(payment.status),
@@ -90,7 +78,7 @@ async def create_lte_payment(
     if amount is None:
         raise ValueError("Unknown LTE package")
     description = f"Покупка LTE трафика: {gb_amount} ГБ"
-    payment = await _create_payment_async(
+    payment = await create_payment_async(
         amount=amount,
         description=description,
         return_url=return_url,
@@ -103,6 +91,7 @@ async def create_lte_payment(
     )
     payment_id = str(payment.id)
     await asyncio.to_thread(db_utils.update_payment_status, payment_id, str(payment.status))
+    await record_payment(payment, "created", source="web")
     return {
         "payment_id": payment_id,
         "status": str(payment.status),
@@ -124,7 +113,7 @@ async def create_gift_payment(
     if plan is None:
         raise ValueError("Unknown gift plan")
     description = f"Подарочная подписка на {months} мес."
-    payment = await _create_payment_async(
+    payment = await create_payment_async(
         amount=plan["price"],
         description=description,
         return_url=return_url,
@@ -134,6 +123,7 @@ async def create_gift_payment(
     )
     payment_id = str(payment.id)
     await asyncio.to_thread(db_utils.update_payment_status, payment_id, str(payment.status))
+    await record_payment(payment, "created", source="web")
     return {
         "payment_id": payment_id,
         "status": str(payment.status),
@@ -148,7 +138,7 @@ async def create_gift_payment(
 
 async def fetch_payment_snapshot(payment_id: str) -> dict[str, Any]:
     local_status = await asyncio.to_thread(db_utils.get_payment_status, payment_id)
-    payment = await _fetch_payment_async(payment_id)
+    payment = await fetch_payment_async(payment_id)
     metadata = getattr(payment, "metadata", None) or {}
     confirmation = getattr(payment, "confirmation", None)
     confirmation_url = getattr(confirmation, "confirmation_url", None) if confirmation else None
@@ -162,10 +152,23 @@ async def fetch_payment_snapshot(payment_id: str) -> dict[str, Any]:
 
 
 async def process_webhook_success(payment_id: str) -> dict[str, Any]:
-    if (await asyncio.to_thread(db_utils.get_payment_status, payment_id)) == "succeeded":
-        return {"ok": True, "idempotent": True, "status": "succeeded"}
+    # Shares the claim with the bot webhook, so a payment is credited once
+    # no matter which notification path gets there first.
+    async with payment_trace("web", payment_id):
+        with stage("claim"):
+            claimed = await asyncio.to_thread(db_utils.claim_payment, payment_id)
+        if not claimed:
+            status = await asyncio.to_thread(db_utils.get_payment_status, payment_id)
+            return {"ok": True, "idempotent": True, "status": status or "processing"}
+        try:
+            return await _process_claimed_payment(payment_id)
+        finally:
+            await asyncio.to_thread(db_utils.release_payment_claim, payment_id)
 
-    payment = await _fetch_payment_async(payment_id)
+
+async def _process_claimed_payment(payment_id: str) -> dict[str, Any]:
+    with stage("yookassa_fetch"):
+        payment = await fetch_payment_async(payment_id)
     payment_status = str(getattr(payment, "status", "") or "")
     if payment_status != "succeeded":
         await asyncio.to_thread(
@@ -207,8 +210,13 @@ async def process_webhook_success(payment_id: str) -> dict[str, Any]:
                 db_utils.update_payment_status, payment_id, "processing_error"
             )
             raise ValueError("Invalid lte_gb metadata")
-        await asyncio.to_thread(db_utils.add_lte_paid_gb, telegram_id, lte_gb)
-        await asyncio.to_thread(db_utils.update_payment_status, payment_id, "succeeded")
+        with stage("lte_credit"):
+            await asyncio.to_thread(
+                db_utils.add_lte_paid_gb, telegram_id, lte_gb, payment_id=payment_id
+            )
+        with stage("db_status"):
+            await asyncio.to_thread(db_utils.update_payment_status, payment_id, "succeeded")
+            await record_payment(payment, "succeeded", source="web")
         return {
             "ok": True,
             "idempotent": False,
@@ -218,15 +226,19 @@ async def process_webhook_success(payment_id: str) -> dict[str, Any]:
         }
 
     if is_gift:
-        gift_code = await asyncio.to_thread(db_utils.generate_gift_code)
-        await asyncio.to_thread(
-            db_utils.create_gift_promo, gift_code, days_to_extend, telegram_id
-        )
-        try:
-            await asyncio.to_thread(db_utils.increment_gifted_subscriptions, telegram_id)
-        except Exception as exc:  # pragma: no cover
-            logger.error("Failed to increment gifted_subscriptions: %s", exc)
-        await asyncio.to_thread(db_utils.update_payment_status, payment_id, "succeeded")
+        with stage("gift_create"):
+            gift_code = await asyncio.to_thread(db_utils.generate_gift_code)
+            # Promo, creator counter and the credit marker in one transaction.
+            await asyncio.to_thread(
+                db_utils.create_gift_promo_once,
+                gift_code,
+                days_to_extend,
+                telegram_id,
+                payment_id=payment_id,
+            )
+        with stage("db_status"):
+            await asyncio.to_thread(db_utils.update_payment_status, payment_id, "succeeded")
+            await record_payment(payment, "succeeded", source="web")
         return {
             "ok": True,
             "idempotent": False,
@@ -237,14 +249,16 @@ async def process_webhook_success(payment_id: str) -> dict[str, Any]:
         }
 
     try:
-        result = await asyncio.wait_for(
-            asyncio.to_thread(
-                vpn_service.extend_subscription_by_telegram_id,
-                telegram_id,
-                days_to_extend,
-            ),
-            timeout=REMNAWAVE_EXTEND_TIMEOUT_SECONDS,
-        )
+        with stage("remnawave_extend"):
+            result = await asyncio.wait_for(
+                asyncio.to_thread(
+                    vpn_service.extend_subscription_by_telegram_id,
+                    telegram_id,
+                    days_to_extend,
+                    payment_id=payment_id,
+                ),
+                timeout=REMNAWAVE_EXTEND_TIMEOUT_SECONDS,
+            )
     except asyncio.TimeoutError as exc:
         await asyncio.to_thread(db_utils.update_payment_status, payment_id, "processing_error")
         raise ValueError("Remnawave extend timeout") from exc
@@ -254,15 +268,18 @@ async def process_webhook_success(payment_id: str) -> dict[str, Any]:
         raise ValueError(result)
 
     try:
-        user = await asyncio.to_thread(db_utils.get_user_by_id, telegram_id)
-        if user and user["referrer_tag"]:
-            await asyncio.to_thread(
-                db_utils.award_referral, user["referrer_tag"], telegram_id
-            )
+        with stage("referral_award"):
+            user = await asyncio.to_thread(db_utils.get_user_by_id, telegram_id)
+            if user and user["referrer_tag"]:
+                await asyncio.to_thread(
+                    db_utils.award_referral, user["referrer_tag"], telegram_id
+                )
     except Exception as exc:  # pragma: no cover
         logger.exception("Referral award failed: %s", exc)
 
-    await asyncio.to_thread(db_utils.update_payment_status, payment_id, "succeeded")
+    with stage("db_status"):
+        await asyncio.to_thread(db_utils.update_payment_status, payment_id, "succeeded")
+        await record_payment(payment, "succeeded", source="web")
     return {
         "ok": True,
         "idempotent": False,
@@ -11,13 +11,11 @@ from kairaweb.core.settings import ensure_user_bot_on_path
 
 ensure_user_bot_on_path()
 
-from app.services.remnawave import vpn_service  # noqa: E402  (user_bot)
 from data import db_utils  # noqa: E402
 from handlers.constants import SECONDS_IN_DAY, TRIAL_DAYS  # noqa: E402  (user_bot)
 
 
 logger = logging.getLogger(__name__)
-REMNAWAVE_EXTEND_TIMEOUT_SECONDS = 20.0
 
 
 def _row_get(row, key, default=0):
@@ -131,10 +129,7 @@ async def redeem_promo(telegram_id: int, code: str) -> dict[str, Any]:
         if await asyncio.to_thread(db_utils.has_any_usage, cleaned):
             raise PromoError("Этот подарочный промокод уже использован.")
         added_days = int(promo["value"])
-        result = await _extend_subscription_async(int(telegram_id), added_days)
-        if isinstance(result, str) and result.startswith("❌"):
-            raise PromoError(result)
-        await asyncio.to_thread(db_utils.save_promo_usage, cleaned, int(telegram_id))
+        await _queue_promo_extension(int(telegram_id), cleaned, added_days)
         return {"ok": True, "type": "gift", "added_days": added_days, "code": cleaned}
 
     if await asyncio.to_thread(db_utils.has_used_promo, cleaned, int(telegram_id)):
@@ -142,22 +137,23 @@ async def redeem_promo(telegram_id: int, code: str) -> dict[str, Any]:
 
     if promo["type"] == "days":
         added_days = int(promo["value"])
-        result = await _extend_subscription_async(int(telegram_id), added_days)
-        if isinstance(result, str) and result.startswith("❌"):
-            raise PromoError(result)
-        await asyncio.to_thread(db_utils.save_promo_usage, cleaned, int(telegram_id))
+        await _queue_promo_extension(int(telegram_id), cleaned, added_days)
         return {"ok": True, "type": "days", "added_days": added_days, "code": cleaned}
 
     raise PromoError(f"Тип промокода {promo['type']} пока не поддерживается.")
 
 
-async def _extend_subscription_async(telegram_id: int, days: int) -> str:
-    try:
-        return await asyncio.wait_for(
-            asyncio.to_thread(
-                vpn_service.extend_subscription_by_telegram_id, int(telegram_id), int(days)
-            ),
-            timeout=REMNAWAVE_EXTEND_TIMEOUT_SECONDS,
-        )
-    except asyncio.TimeoutError:
-        return f"❌ Таймаут продления подписки (>{REMNAWAVE_EXTEND_TIMEOUT_SECONDS}s)"
+async def _queue_promo_extension(telegram_id: int, code: str, days: int) -> None:
+    """
+    Record the usage and queue the extension for the webhook job workers in
+    one transaction; the panel is not called on the request path.
+    """
+    await asyncio.to_thread(
+        db_utils.save_promo_usage_with_job,
+        code,
+        telegram_id,
+        "subscription_extend",
+        {"telegram_id": telegram_id, "days": days, "code": code},
+        f"promo:{code}:{telegram_id}",
+    )
+    logger.info("Promo %s for %s queued: +%s days", code, telegram_id, days)
@@ -4,7 +4,7 @@ from __future__ import annotations
 
 import asyncio
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from kairaweb.core.settings import ensure_user_bot_on_path
@@ -60,6 +60,20 @@ def get_lte_remaining_bytes(telegram_id: int) -> int:
     )
 
 
+def get_lte_usage_series(telegram_id: int, days: int) -> list[dict[str, Any]]:
+    """Daily LTE usage for the last `days` days (zero-filled), oldest first."""
+    days = max(1, int(days))
+    today = datetime.now(timezone.utc).date()
+    start = today - timedelta(days=days - 1)
+    usage = dict(db_utils.get_lte_usage_daily(int(telegram_id), start.isoformat()))
+    series: list[dict[str, Any]] = []
+    for offset in range(days):
+        day = (start + timedelta(days=offset)).isoformat()
+        value = int(usage.get(day, 0))
+        series.append({"day": day, "bytes": value, "gb": format_gb_from_bytes(value)})
+    return series
+
+
 def format_gb_from_bytes(value: int) -> float:
     return round(max(0, int(value)) / (1024 ** 3), 2)
 